@@ -0,0 +1,149 @@
+from typing import List, Tuple
+
+import numpy as np
+
+SNAP_DISTANCE = 1.0  # A tween this close to its target on both axes has arrived
+
+
+class Tweens:
+    """Positions, targets and alpha of every sprite, kept in contiguous arrays
+
+    Each sprite owns a slot. Moves and fades in progress are flagged per slot
+    and counted, so a whole frame of animation is one vectorized step and
+    "everything has arrived" is a counter check.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.target_x = np.zeros(capacity)
+        self.target_y = np.zeros(capacity)
+        self.alpha = np.zeros(capacity, dtype=np.int16)
+        self.moving = np.zeros(capacity, dtype=bool)
+        self.fading = np.zeros(capacity, dtype=bool)
+        self.free: List[int] = list(range(capacity - 1, -1, -1))
+        self.active_moves = 0
+        self.active_fades = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.x)
+
+    def grow(self):
+        """Double the capacity, keeping every slot where it is"""
+        old = self.capacity
+        new = max(1, old * 2)
+        for name in ("x", "y", "target_x", "target_y", "alpha", "moving", "fading"):
+            array = getattr(self, name)
+            grown = np.zeros(new, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self.free.extend(range(new - 1, old - 1, -1))
+
+    def allocate(self, x: float, y: float, alpha: int = 255) -> int:
+        """Take a slot for a sprite resting at a position"""
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        self.x[slot] = self.target_x[slot] = x
+        self.y[slot] = self.target_y[slot] = y
+        self.alpha[slot] = alpha
+        return slot
+
+    def release(self, slot: int):
+        """Give a slot back, cancelling its tweens"""
+        self.stop_move(slot)
+        self.stop_fade(slot)
+        self.free.append(slot)
+
+    def clear(self):
+        """Release every slot"""
+        self.moving[:] = False
+        self.fading[:] = False
+        self.active_moves = 0
+        self.active_fades = 0
+        self.free = list(range(self.capacity - 1, -1, -1))
+
+    def at_target(self, slot: int) -> bool:
+        return (abs(self.x[slot] - self.target_x[slot]) < SNAP_DISTANCE
+                and abs(self.y[slot] - self.target_y[slot]) < SNAP_DISTANCE)
+
+    def move_to(self, slot: int, x: float, y: float):
+        """Start moving a sprite towards a target"""
+        self.target_x[slot] = x
+        self.target_y[slot] = y
+        if self.at_target(slot):
+            self.stop_move(slot)
+        elif not self.moving[slot]:
+            self.moving[slot] = True
+            self.active_moves += 1
+
+    def stop_move(self, slot: int):
+        if self.moving[slot]:
+            self.moving[slot] = False
+            self.active_moves -= 1
+
+    def fade_out(self, slot: int):
+        """Start fading a sprite to fully transparent"""
+        if not self.fading[slot] and self.alpha[slot] > 0:
+            self.fading[slot] = True
+            self.active_fades += 1
+
+    def stop_fade(self, slot: int):
+        if self.fading[slot]:
+            self.fading[slot] = False
+            self.active_fades -= 1
+
+    def step_moves(self, speed: float) -> bool:
+        """Move every sprite a fraction of the way to its target
+
+        Returns True, without moving anything, once all moves have arrived.
+        """
+        if self.active_moves == 0:
+            return True
+
+        # Whole-array passes; slots at rest have a zero distance left
+        dx = self.target_x - self.x
+        dy = self.target_y - self.y
+        moving = self.moving
+        arrived = (np.abs(dx) < SNAP_DISTANCE) & (np.abs(dy) < SNAP_DISTANCE) & moving
+        count = np.count_nonzero(arrived)
+        if count:
+            # Arrivals land exactly on their targets, so resting sprites never sit a fraction of a pixel off
+            np.copyto(self.x, self.target_x, where=arrived)
+            np.copyto(self.y, self.target_y, where=arrived)
+            moving &= ~arrived
+            self.active_moves -= count
+            if self.active_moves == 0:
+                return True
+
+        speed_by_slot = moving * speed
+        self.x += dx * speed_by_slot
+        self.y += dy * speed_by_slot
+        return False
+
+    def step_fades(self, step: int) -> bool:
+        """Lower the alpha of every fading sprite
+
+        Returns True, without changing anything, once all fades are done.
+        """
+        if self.active_fades == 0:
+            return True
+
+        fading = self.fading
+        done = (self.alpha <= 0) & fading
+        count = np.count_nonzero(done)
+        if count:
+            fading &= ~done
+            self.active_fades -= count
+            if self.active_fades == 0:
+                return True
+
+        alpha = self.alpha
+        alpha -= fading * np.int16(step)
+        np.maximum(alpha, 0, out=alpha)
+        return False
+
+    def frame(self) -> Tuple[List[int], List[int], List[int]]:
+        """Pixel x, pixel y and alpha of every slot as plain lists, for drawing"""
+        return self.x.astype(np.int64).tolist(), self.y.astype(np.int64).tolist(), self.alpha.tolist()
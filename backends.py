@@ -0,0 +1,10 @@
+from bitboard import BitBoard
+from engine import Board
+from numpy_board import NumpyBoard
+
+# Board backends by the names the command line tools and the server accept
+BACKENDS = {
+    "list": Board,
+    "numpy": NumpyBoard,
+    "bitboard": BitBoard,
+}
@@ -0,0 +1,140 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from engine import GRID_SIZE, MAX_FILL_ATTEMPTS, NUM_COLORS, POINTS_PER_CANDY, Move
+from numpy_board import EMPTY, compact_columns, legal_swaps, match_mask
+
+
+class BatchStep(NamedTuple):
+    """Per-board outcome of BatchEngine.step"""
+    valid: np.ndarray
+    score_delta: np.ndarray
+    cascades: np.ndarray
+    game_over: np.ndarray
+    legal_mask: np.ndarray
+
+
+class BatchEngine:
+    """Many boards stored as one array and stepped together
+
+    Moves are encoded as action indices: the first rows * (cols - 1) actions
+    swap (r, c) with (r, c + 1), the rest swap (r, c) with (r + 1, c).
+    """
+
+    def __init__(self, num_boards: int, rows: int = GRID_SIZE, cols: int = GRID_SIZE,
+                 num_colors: int = NUM_COLORS, seed: Optional[int] = None):
+        self.num_boards = num_boards
+        self.rows = rows
+        self.cols = cols
+        self.num_colors = num_colors
+        self.num_actions = rows * (cols - 1) + (rows - 1) * cols
+        self.rng = np.random.default_rng(seed)
+
+        self.cells = np.full((num_boards, rows, cols), EMPTY, dtype=np.int8)
+        self.scores = np.zeros(num_boards, dtype=np.int64)
+        self.game_over = np.zeros(num_boards, dtype=bool)
+        self.reset()
+
+    def reset(self, boards: Optional[np.ndarray] = None):
+        """Start new games on all boards, or only on the boards selected by a boolean mask"""
+        if boards is None:
+            boards = np.ones(self.num_boards, dtype=bool)
+
+        fresh = self.rng.integers(0, self.num_colors, (int(boards.sum()), self.rows, self.cols), dtype=np.int8)
+        for _ in range(MAX_FILL_ATTEMPTS):
+            # Re-roll matched cells until no board starts with a match
+            matched = match_mask(fresh)
+            while matched.any():
+                fresh[matched] = self.rng.integers(0, self.num_colors, int(matched.sum()), dtype=np.int8)
+                matched = match_mask(fresh)
+
+            # Then re-roll whole boards that start without a legal move, so no game is over before it begins
+            horizontal, vertical = legal_swaps(fresh)
+            stuck = ~(horizontal.any(axis=(1, 2)) | vertical.any(axis=(1, 2)))
+            if not stuck.any():
+                break
+            fresh[stuck] = self.rng.integers(0, self.num_colors, (int(stuck.sum()), self.rows, self.cols),
+                                             dtype=np.int8)
+        else:
+            raise ValueError(f"Could not generate {self.rows}x{self.cols} boards with a legal move")
+
+        self.cells[boards] = fresh
+        self.scores[boards] = 0
+        self.game_over[boards] = False
+
+    def action_to_move(self, action: int) -> Move:
+        """Decode an action index into a pair of cells"""
+        horizontal = self.rows * (self.cols - 1)
+        if action < horizontal:
+            row, col = divmod(action, self.cols - 1)
+            return (row, col), (row, col + 1)
+        row, col = divmod(action - horizontal, self.cols)
+        return (row, col), (row + 1, col)
+
+    def move_to_action(self, move: Move) -> int:
+        """Encode a pair of adjacent cells as an action index"""
+        (row1, col1), (row2, col2) = sorted(move)
+        if row1 == row2:
+            return row1 * (self.cols - 1) + col1
+        return self.rows * (self.cols - 1) + row1 * self.cols + col1
+
+    def decode_actions(self, actions: np.ndarray):
+        """Decode an array of action indices into row and column arrays of both cells"""
+        horizontal = self.rows * (self.cols - 1)
+        is_vertical = actions >= horizontal
+        row1 = np.where(is_vertical, (actions - horizontal) // self.cols, actions // (self.cols - 1))
+        col1 = np.where(is_vertical, (actions - horizontal) % self.cols, actions % (self.cols - 1))
+        return row1, col1, row1 + is_vertical, col1 + ~is_vertical
+
+    def legal_mask(self) -> np.ndarray:
+        """Boolean (num_boards, num_actions) mask of the moves that create a match"""
+        horizontal, vertical = legal_swaps(self.cells)
+        return np.concatenate(
+            [horizontal.reshape(self.num_boards, -1), vertical.reshape(self.num_boards, -1)], axis=1
+        )
+
+    def swap(self, boards: np.ndarray, row1, col1, row2, col2):
+        """Swap one pair of cells on each of the given boards"""
+        first = self.cells[boards, row1, col1]
+        self.cells[boards, row1, col1] = self.cells[boards, row2, col2]
+        self.cells[boards, row2, col2] = first
+
+    def step(self, actions: np.ndarray) -> BatchStep:
+        """Apply one move per board and resolve every cascade
+
+        Boards whose move makes no match, or whose game is already over, are
+        left unchanged and reported as not valid.
+        """
+        actions = np.asarray(actions)
+        boards = np.arange(self.num_boards)
+        row1, col1, row2, col2 = self.decode_actions(actions)
+
+        self.swap(boards, row1, col1, row2, col2)
+        matched = match_mask(self.cells)
+        valid = matched.any(axis=(1, 2)) & ~self.game_over
+
+        # Invalid swaps, swap back
+        invalid = ~valid
+        self.swap(boards[invalid], row1[invalid], col1[invalid], row2[invalid], col2[invalid])
+        matched &= valid[:, None, None]
+
+        score_delta = np.zeros(self.num_boards, dtype=np.int64)
+        cascades = np.zeros(self.num_boards, dtype=np.int64)
+        while matched.any():
+            cleared = matched.sum(axis=(1, 2))
+            score_delta += cleared * POINTS_PER_CANDY
+            cascades += cleared > 0
+
+            # Clear, let candies fall and refill every board at once
+            self.cells[matched] = EMPTY
+            self.cells = compact_columns(self.cells)
+            empty = self.cells == EMPTY
+            self.cells[empty] = self.rng.integers(0, self.num_colors, int(empty.sum()), dtype=np.int8)
+
+            matched = match_mask(self.cells)
+
+        self.scores += score_delta
+        legal = self.legal_mask()
+        self.game_over |= ~legal.any(axis=1)
+        return BatchStep(valid, score_delta, cascades, self.game_over.copy(), legal)
@@ -0,0 +1,278 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from backends import BACKENDS
+from engine import GameEngine
+
+ENGINE_SIZES = [8, 16, 64, 256]
+RENDER_SIZES = [8, 16]
+COLOR_COUNTS = [4, 6]
+RENDER_WIDTH = 560  # Grid width in pixels that render benchmarks scale their cell size to
+CASCADE_FRAME_LIMIT = 10000  # Frames before a swap-to-idle animation counts as stuck
+
+
+class Case(NamedTuple):
+    """One point of the sweep"""
+    rows: int
+    cols: int
+    colors: int
+    backend: str
+
+
+class Benchmark(NamedTuple):
+    """A hot path to time; setup builds the state once and returns the operation"""
+    setup: Callable[[Case, random.Random], Callable[[], object]]
+    render: bool
+
+
+def settled_engine(case: Case, rng: random.Random, track_moves: bool = False,
+                   special_candies: bool = False) -> GameEngine:
+    return GameEngine(case.rows, case.cols, case.colors, backend=BACKENDS[case.backend],
+                      track_moves=track_moves, seed=rng.getrandbits(64), special_candies=special_candies)
+
+
+def setup_init_grid(case: Case, rng: random.Random):
+    board = BACKENDS[case.backend](case.rows, case.cols, case.colors)
+    return lambda: board.fill(rng)
+
+
+def setup_find_matches(case: Case, rng: random.Random):
+    return settled_engine(case, rng).board.find_matches
+
+
+def setup_would_create_match(case: Case, rng: random.Random):
+    board = settled_engine(case, rng).board
+    cells = list(itertools.product(range(case.rows), range(case.cols)))
+    rng.shuffle(cells)
+    cycle = itertools.cycle(cells)
+    # One call per operation, walking the board in a fixed random order
+    return lambda: board.would_create_match(*next(cycle))
+
+
+def setup_has_valid_moves(case: Case, rng: random.Random):
+    return settled_engine(case, rng).board.has_valid_moves
+
+
+def setup_apply_gravity(case: Case, rng: random.Random):
+    board = settled_engine(case, rng).board
+    # A match-sized hole per 64 cells, in random columns
+    holes = []
+    for _ in range(max(1, case.rows * case.cols // 64)):
+        row, col = rng.randrange(case.rows - 2), rng.randrange(case.cols)
+        holes.extend((row + offset, col) for offset in range(3))
+
+    def run():
+        board.clear(holes)
+        board.apply_gravity(rng)
+    return run
+
+
+def setup_step(case: Case, rng: random.Random, special_candies: bool = False):
+    engine = settled_engine(case, rng, track_moves=True, special_candies=special_candies)
+
+    def run():
+        if engine.game_over:
+            engine.reset()
+        return engine.step(engine.legal_moves(limit=1)[0])
+    return run
+
+
+def setup_step_specials(case: Case, rng: random.Random):
+    return setup_step(case, rng, special_candies=True)
+
+
+def renderer(case: Case, rng: random.Random):
+    """Renderer on the dummy video driver, with the grid scaled to a fixed width"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import candy_crush
+
+    cell_size = max(8, RENDER_WIDTH // max(case.rows, case.cols))
+    engine = settled_engine(case, rng, track_moves=True)
+    return candy_crush.CandyCrush(engine, cell_size=cell_size)
+
+
+def setup_swap_to_idle(case: Case, rng: random.Random):
+    game = renderer(case, rng)
+
+    def run():
+        if game.game_over:
+            game.reset_game()
+        game.swap_candies_at(*game.engine.legal_moves(limit=1)[0])
+        for _ in range(CASCADE_FRAME_LIMIT):
+            game.update()
+            if game.animation_state == "idle":
+                return
+        raise RuntimeError("Cascade animation did not settle")
+    return run
+
+
+def setup_candy_draw(case: Case, rng: random.Random):
+    game = renderer(case, rng)
+    candy = game.grid[0][0]
+    return lambda: candy.draw(game.screen)
+
+
+def setup_draw_frame(case: Case, rng: random.Random):
+    game = renderer(case, rng)
+
+    def run():
+        game.full_redraw = True
+        game.draw()
+    return run
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "init_grid": Benchmark(setup_init_grid, False),
+    "find_matches": Benchmark(setup_find_matches, False),
+    "would_create_match": Benchmark(setup_would_create_match, False),
+    "has_valid_moves": Benchmark(setup_has_valid_moves, False),
+    "apply_gravity": Benchmark(setup_apply_gravity, False),
+    "step": Benchmark(setup_step, False),
+    "step_specials": Benchmark(setup_step_specials, False),
+    "swap_to_idle": Benchmark(setup_swap_to_idle, True),
+    "candy_draw": Benchmark(setup_candy_draw, True),
+    "draw_frame": Benchmark(setup_draw_frame, True),
+}
+
+
+def time_operation(run: Callable[[], object], min_time: float, repeat: int) -> float:
+    """Best seconds per call over repeat rounds, each at least min_time long"""
+    def timed(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        return time.perf_counter() - start
+
+    # Grow the batch until one round is long enough to time reliably
+    number = 1
+    elapsed = timed(number)
+    while elapsed < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+        elapsed = timed(number)
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        best = min(best, timed(number) / number)
+    return best
+
+
+def measure_allocations(run: Callable[[], object], calls: int = 20) -> Tuple[int, int]:
+    """Peak and retained bytes allocated by one call, averaged over a few calls"""
+    tracemalloc.start()
+    try:
+        peak = 0
+        start, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            run()
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - before)
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, (end - start) // calls
+
+
+def run_case(name: str, case: Case, seed: int, min_time: float, repeat: int) -> Dict:
+    rng = random.Random(f"{seed}:{name}:{case.rows}x{case.cols}:{case.colors}:{case.backend}")
+    run = BENCHMARKS[name].setup(case, rng)
+    run()  # Warm up caches such as the sprite cache
+    seconds = time_operation(run, min_time, repeat)
+    peak, retained = measure_allocations(run)
+    return {
+        "benchmark": name,
+        **case._asdict(),
+        "ops_per_sec": 1 / seconds,
+        "mean_us": seconds * 1e6,
+        "alloc_peak_bytes": peak,
+        "alloc_retained_bytes": retained,
+    }
+
+
+def result_key(result: Dict) -> Tuple:
+    return result["benchmark"], result["rows"], result["cols"], result["colors"], result["backend"]
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[Dict]:
+    """Annotate results with their speed relative to the baseline; return the regressions"""
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        result["baseline_ratio"] = result["ops_per_sec"] / old["ops_per_sec"]
+        if result["baseline_ratio"] < 1 - threshold:
+            regressions.append(result)
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time the engine and rendering hot paths")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=ENGINE_SIZES, help="square board sizes for the engine")
+    parser.add_argument("--render-sizes", nargs="+", type=int, default=RENDER_SIZES,
+                        help="square board sizes for the renderer")
+    parser.add_argument("--colors", nargs="+", type=int, default=COLOR_COUNTS, help="color counts to sweep")
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=["list"],
+                        help="board backends for the engine benchmarks")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing round")
+    parser.add_argument("--repeat", type=int, default=3, help="timing rounds; the fastest counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved earlier with --output")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction of ops/sec lost against the baseline that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.only or list(BENCHMARKS)
+
+    results = []
+    for name in names:
+        render = BENCHMARKS[name].render
+        sizes = args.render_sizes if render else args.sizes
+        # The renderer always uses list boards
+        backends = ["list"] if render else args.backends
+        for size, colors, backend in itertools.product(sizes, args.colors, backends):
+            result = run_case(name, Case(size, size, colors, backend), args.seed, args.min_time, args.repeat)
+            results.append(result)
+            print(f"{name:>18} {size:>4}x{size:<4} {colors} colors {backend:>8}: "
+                  f"{result['ops_per_sec']:>12.1f} ops/s {result['mean_us']:>12.2f} us "
+                  f"peak {result['alloc_peak_bytes']:>9} B retained {result['alloc_retained_bytes']:>7} B")
+
+    regressions: List[Dict] = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for result in regressions:
+            print(f"REGRESSION {result['benchmark']} {result['rows']}x{result['cols']} {result['colors']} colors "
+                  f"{result['backend']}: {result['baseline_ratio']:.2f}x baseline speed")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+
+    if args.output:
+        meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+import copy
+import functools
+import itertools
+from typing import Iterable, Iterator, List, Optional
+
+from engine import (EMPTY_BYTE, GRID_SIZE, NUM_COLORS, Move, Position, Region, Run, cell_in_run, fill_cells,
+                    runs_from_cells, swap_in_run)
+
+
+@functools.lru_cache(maxsize=None)
+def color_digits(color: int) -> bytes:
+    """Translation table turning one byte per cell into "1" for a color and "0" otherwise"""
+    return bytes(ord("1") if value == color else ord("0") for value in range(256))
+
+
+@functools.lru_cache(maxsize=None)
+def digit_colors(color: int) -> bytes:
+    """Translation table turning a binary digit string into color + 1 for "1" and 0 otherwise"""
+    return bytes.maketrans(b"01", bytes([0, color + 1]))
+
+
+def set_bits(bits: int) -> Iterator[int]:
+    """Indices of the set bits of a mask, lowest first"""
+    # One pass over the binary digits; clearing the low bit one at a time
+    # copies the whole int each step, which is quadratic on large boards
+    digits = format(bits, "b")[::-1]
+    index = digits.find("1")
+    while index >= 0:
+        yield index
+        index = digits.find("1", index + 1)
+
+
+# Turns color + 1 back into the color, and 0 into an empty cell
+OFFSET_COLORS = bytes([EMPTY_BYTE] + list(range(255)))
+
+
+class BitBoard:
+    """Board backend with one bit mask per candy color
+
+    Cell (row, col) is bit row * cols + col, so the default 8x8 board fits in
+    one 64-bit mask per color. Larger boards still work since Python ints grow.
+    A byte per cell shadows the masks, so reading a single cell, as the move
+    index does around every change, costs no scan over the colors.
+    """
+
+    def __init__(self, rows: int = GRID_SIZE, cols: int = GRID_SIZE, num_colors: int = NUM_COLORS):
+        self.rows = rows
+        self.cols = cols
+        self.num_colors = num_colors
+        self.masks: List[int] = [0] * num_colors
+        # Color of each cell row by row, EMPTY_BYTE where empty, kept in step with the masks
+        self.cells = bytearray([EMPTY_BYTE]) * (rows * cols)
+
+        self.full = (1 << (rows * cols)) - 1
+        # Column masks guard horizontal shifts against wrapping into the next row
+        first_col = sum(1 << (row * cols) for row in range(rows))
+        self.col_masks = [first_col << col for col in range(cols)]
+        self.not_first_col = self.full & ~self.col_masks[0]
+        self.not_last_col = self.full & ~self.col_masks[-1]
+        # Cells that can start a horizontal run of 3 (all but the last two columns)
+        self.run_starts = self.full
+        for col in range(max(0, cols - 2), cols):
+            self.run_starts &= ~self.col_masks[col]
+
+    def bit(self, row: int, col: int) -> int:
+        """Return the mask bit of a cell"""
+        return 1 << (row * self.cols + col)
+
+    def get(self, row: int, col: int) -> Optional[int]:
+        """Return the color index at a cell, or None if it is empty"""
+        color = self.cells[row * self.cols + col]
+        return None if color == EMPTY_BYTE else color
+
+    def occupied(self) -> int:
+        """Mask of all non-empty cells"""
+        occupied = 0
+        for mask in self.masks:
+            occupied |= mask
+        return occupied
+
+    def copy(self) -> "BitBoard":
+        """Return an independent copy of the board"""
+        board = copy.copy(self)
+        board.masks = list(self.masks)
+        board.cells = self.cells[:]
+        return board
+
+    def to_bytes(self) -> bytes:
+        """Return the colors row by row, one byte per cell"""
+        return bytes(self.cells)
+
+    def spread_masks(self, size: int) -> bytes:
+        """Colors of the first size cells, one byte per cell, read from the masks"""
+        # Spread each mask to one byte per cell holding color + 1, then merge
+        # them with a single integer OR since the masks never overlap
+        low = (1 << size) - 1
+        merged = 0
+        for color, mask in enumerate(self.masks):
+            mask &= low
+            if mask:
+                digits = format(mask, "b").zfill(size)[::-1].encode()
+                merged |= int.from_bytes(digits.translate(digit_colors(color)), "big")
+        return merged.to_bytes(size, "big").translate(OFFSET_COLORS)
+
+    def load_bytes(self, data: bytes):
+        """Set the masks from one byte per cell"""
+        # Bit i of a mask is cell i, so the digit string is read back to front
+        self.masks = [int(data.translate(color_digits(color))[::-1], 2) for color in range(self.num_colors)]
+        self.cells[:] = data
+
+    def load_grid(self, grid: List[List[Optional[int]]]):
+        """Set the masks from a nested list of color indices"""
+        self.load_bytes(b"".join(bytes(EMPTY_BYTE if color is None else color for color in line) for line in grid))
+
+    def to_grid(self) -> List[List[Optional[int]]]:
+        """Return the board as a nested list of color indices"""
+        return [[self.get(row, col) for col in range(self.cols)] for row in range(self.rows)]
+
+    def fill(self, rng, min_moves: int = 1):
+        """Fill the board with random colors, without any match and with at least min_moves legal moves"""
+        # Drawn into the byte shadow, then the masks are set from it
+        fill_cells(self.cells, self.rows, self.cols, self.num_colors, rng, min_moves)
+        self.load_bytes(self.cells)
+
+    def runs(self, mask: int) -> int:
+        """Mask of the cells of one color that sit in a run of 3 or more"""
+        cols = self.cols
+        horizontal = mask & (mask >> 1) & (mask >> 2) & self.run_starts
+        horizontal |= (horizontal << 1) | (horizontal << 2)
+        vertical = mask & (mask >> cols) & (mask >> 2 * cols)
+        vertical |= (vertical << cols) | (vertical << 2 * cols)
+        return horizontal | vertical
+
+    def match_bits(self) -> int:
+        """Mask of every matched cell on the board"""
+        matched = 0
+        for mask in self.masks:
+            matched |= self.runs(mask)
+        return matched
+
+    def cells_of(self, bits: int) -> List[Position]:
+        """Decode a mask into a list of cells"""
+        return [divmod(index, self.cols) for index in set_bits(bits)]
+
+    def would_create_match(self, row: int, col: int) -> bool:
+        """Check if the candy at this cell is part of a run of 3 or more"""
+        # Read from the shadow; shifting whole masks costs time in proportion to the board size
+        return cell_in_run(self.cells, self.rows, self.cols, row, col)
+
+    def find_matches(self, region: Optional[Region] = None) -> List[Position]:
+        """Find all matches on the board
+
+        A region is accepted for compatibility with Board but not used: the
+        whole-board scan is a handful of shifts per color already.
+        """
+        return self.cells_of(self.match_bits())
+
+    def find_runs(self, region: Optional[Region] = None) -> List[Run]:
+        """Find the runs behind find_matches, in one pass over the matched cells"""
+        return runs_from_cells(self.find_matches(region), self.get, region)
+
+    def move_targets(self, mask: int, occupied: int):
+        """Cells a candy of this color can be swapped into to complete a run
+
+        Returns four masks of target cells, for candies arriving from the
+        left, right, top and bottom neighbor respectively.
+        """
+        cols = self.cols
+        full = self.full
+        # Two same-colored candies lined up next to a target cell
+        pair_right = (mask >> 1) & (mask >> 2) & self.run_starts
+        pair_left = (mask << 1) & (mask << 2) & (self.run_starts << 2) & full
+        pair_middle = (mask << 1) & (mask >> 1) & self.not_first_col & self.not_last_col
+        pair_below = (mask >> cols) & (mask >> 2 * cols)
+        pair_above = (mask << cols) & (mask << 2 * cols) & full
+        pair_around = (mask << cols) & (mask >> cols) & full
+
+        # Targets must hold a candy of another color
+        targets = occupied & ~mask
+        vertical = pair_below | pair_above | pair_around
+        horizontal = pair_left | pair_right | pair_middle
+
+        from_left = (mask << 1) & self.not_first_col & targets & (pair_right | vertical)
+        from_right = (mask >> 1) & self.not_last_col & targets & (pair_left | vertical)
+        from_top = (mask << cols) & targets & (pair_below | horizontal)
+        from_bottom = (mask >> cols) & targets & (pair_above | horizontal)
+        return from_left, from_right, from_top, from_bottom
+
+    def swap_creates_match(self, pos1: Position, pos2: Position) -> bool:
+        """Check if swapping two cells would create a match, looking only at their rows and columns"""
+        # Only the shadow is swapped, since the check never reads the masks
+        return swap_in_run(self.cells, self.rows, self.cols, pos1, pos2)
+
+    def iter_moves(self) -> Iterator[Move]:
+        """Yield the swaps that create a match, in the order of legal_moves
+
+        The masks are built up front but the moves are decoded one by one,
+        so a caller can stop early without paying for the whole list.
+        """
+        cols = self.cols
+        occupied = self.occupied()
+        # Swaps keyed by their top or left cell
+        horizontal = 0
+        vertical = 0
+        for mask in self.masks:
+            from_left, from_right, from_top, from_bottom = self.move_targets(mask, occupied)
+            horizontal |= (from_left >> 1) | from_right
+            vertical |= (from_top >> cols) | from_bottom
+
+        # Walk the cells with a swap from the lowest bit up, which is row order.
+        # Digit strings rather than bit tests, since shifting a large mask
+        # once per move would copy it every time
+        size = self.rows * cols
+        horizontal_digits = format(horizontal, "b").zfill(size)[::-1]
+        vertical_digits = format(vertical, "b").zfill(size)[::-1]
+        for index in set_bits(horizontal | vertical):
+            row, col = divmod(index, cols)
+            if horizontal_digits[index] == "1":
+                yield (row, col), (row, col + 1)
+            if vertical_digits[index] == "1":
+                yield (row, col), (row + 1, col)
+
+    def legal_moves(self, limit: Optional[int] = None) -> List[Move]:
+        """List the swaps that create a match, stopping after limit moves if given
+
+        Moves come in the same order as Board.legal_moves: by top or left
+        cell in row order, the horizontal swap of a cell before its vertical
+        one. Every color is checked, so the first limit moves are the same on
+        every backend.
+        """
+        return list(itertools.islice(self.iter_moves(), limit))
+
+    def has_valid_moves(self) -> bool:
+        """Check if there are any valid moves left on the board"""
+        occupied = self.occupied()
+        for mask in self.masks:
+            if any(self.move_targets(mask, occupied)):
+                return True
+        return False
+
+    def swap(self, pos1: Position, pos2: Position):
+        """Swap the candies at two cells with XOR updates"""
+        index1 = pos1[0] * self.cols + pos1[1]
+        index2 = pos2[0] * self.cols + pos2[1]
+        cells = self.cells
+        color1 = cells[index1]
+        color2 = cells[index2]
+        if color1 == color2:
+            return
+        # Each color moves from its cell to the other one
+        both = (1 << index1) | (1 << index2)
+        if color1 != EMPTY_BYTE:
+            self.masks[color1] ^= both
+        if color2 != EMPTY_BYTE:
+            self.masks[color2] ^= both
+        cells[index1] = color2
+        cells[index2] = color1
+
+    def clear(self, cells: List[Position]):
+        """Empty the given cells"""
+        bits = 0
+        shadow = self.cells
+        cols = self.cols
+        for row, col in cells:
+            index = row * cols + col
+            bits |= 1 << index
+            shadow[index] = EMPTY_BYTE
+        keep = ~bits
+        self.masks = [mask & keep for mask in self.masks]
+
+    def apply_gravity(self, rng, columns: Optional[Iterable[int]] = None):
+        """Make candies fall into empty cells and refill each column from the top
+
+        columns is accepted for compatibility with Board; every column falls
+        in parallel here.
+        """
+        cols = self.cols
+        occupied = self.occupied()
+        holes = self.full & ~occupied
+
+        # Every candy with an empty cell below drops one row per pass
+        while True:
+            empty = self.full & ~occupied
+            falling = occupied & (empty >> cols)
+            if not falling:
+                break
+            for color, mask in enumerate(self.masks):
+                moving = mask & falling
+                if moving:
+                    self.masks[color] = mask ^ moving ^ (moving << cols)
+            occupied ^= falling ^ (falling << cols)
+
+        # Refill column by column, top to bottom, so a shared rng gives the same board as Board
+        empty = self.full & ~occupied
+        for col in range(cols):
+            row = 0
+            while row < self.rows and empty & self.bit(row, col):
+                self.masks[rng.randint(0, self.num_colors - 1)] |= self.bit(row, col)
+                row += 1
+
+        # Candies only moved at or above the lowest hole, so the shadow is
+        # read back from the masks down to that row
+        if holes:
+            size = (holes.bit_length() + cols - 1) // cols * cols
+            self.cells[:size] = self.spread_masks(size)
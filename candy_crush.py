@@ -1,24 +1,42 @@
-import pygame
-import random
+from __future__ import annotations
+
+import argparse
+import functools
 import sys
-from typing import List, Tuple, Optional
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Tuple, Optional
+
+from engine import (COLOR_BOMB, GRID_SIZE, STRIPED_COL, STRIPED_ROW, WRAPPED, BoardPool, GameEngine, Move,
+                    Resolution, Wave)
+from profiler import FrameProfiler
+from replay import Replay, ReplayRecorder, read_replays
+from solver import Solver
 
-# Initialize Pygame
-pygame.init()
+# pygame, and numpy through animation, are imported when the first renderer is created
+if TYPE_CHECKING:
+    import pygame
+
+    from animation import Tweens
 
 # Constants
 WINDOW_WIDTH = 600
 WINDOW_HEIGHT = 700
-GRID_SIZE = 8
 CELL_SIZE = 70
 GRID_OFFSET_X = 30
 GRID_OFFSET_Y = 100
+# Space right of and below the grid in the default 8x8 window
+GRID_MARGIN_RIGHT = WINDOW_WIDTH - GRID_OFFSET_X - GRID_SIZE * CELL_SIZE
+GRID_MARGIN_BOTTOM = WINDOW_HEIGHT - GRID_OFFSET_Y - GRID_SIZE * CELL_SIZE
+MIN_WINDOW_WIDTH = 420  # Room for the title and game over buttons
 FPS = 60
+HINT_TIME_BUDGET = 0.012  # Seconds of search per hint, leaving room in a 60 FPS frame
 
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 GRAY = (200, 200, 200)
+HINT_COLOR = (0, 190, 255)
 BG_COLOR = (240, 240, 250)
 
 # Candy colors
@@ -31,249 +49,289 @@ CANDY_COLORS = [
     (148, 0, 211),    # Purple
 ]
 
-class Candy:
-    def __init__(self, row: int, col: int, color_index: int):
-        self.row = row
-        self.col = col
-        self.color_index = color_index
-        self.x = col * CELL_SIZE + GRID_OFFSET_X
-        self.y = row * CELL_SIZE + GRID_OFFSET_Y
-        self.target_x = self.x
-        self.target_y = self.y
-        self.alpha = 255  # For fade animation
-
-    def update_position(self, speed: float = 0.3):
-        """Smooth animation to target position"""
-        dx = self.target_x - self.x
-        dy = self.target_y - self.y
-        self.x += dx * speed
-        self.y += dy * speed
 
-    def set_target(self, row: int, col: int):
-        """Set target position for animation"""
-        self.target_x = col * CELL_SIZE + GRID_OFFSET_X
-        self.target_y = row * CELL_SIZE + GRID_OFFSET_Y
+def init_pygame():
+    """Import pygame and start only the display and font modules
 
-    def is_at_target(self) -> bool:
-        """Check if candy reached target position"""
-        return abs(self.x - self.target_x) < 1 and abs(self.y - self.target_y) < 1
+    Importing pygame takes most of a cold start, so modules and tools that
+    never open a window do not pay for it. Audio, joystick and the other
+    subsystems pygame.init() would start are never needed.
+    """
+    global pygame
+    import pygame
+    pygame.display.init()
+    pygame.font.init()
 
-    def draw(self, screen: pygame.Surface):
-        """Draw the candy"""
-        color = CANDY_COLORS[self.color_index]
+
+@functools.lru_cache(maxsize=None)
+def get_font(size: int) -> pygame.font.Font:
+    """Load the default font at a size on first use"""
+    return pygame.font.Font(None, size)
+
+
+class SpriteCache:
+    """Pre-rendered candy sprites keyed by color, alpha and special kind"""
+
+    def __init__(self, cell_size: int = CELL_SIZE):
+        self.cell_size = cell_size
+        self.sprites: Dict[Tuple[int, int, int], pygame.Surface] = {}
+
+    def set_cell_size(self, cell_size: int):
+        """Evict every sprite when the cell size changes"""
+        if cell_size != self.cell_size:
+            self.cell_size = cell_size
+            self.sprites.clear()
+
+    def get(self, color_index: int, alpha: int, special: int = 0) -> pygame.Surface:
+        """Return the sprite for a candy, rendering it on first use"""
+        sprite = self.sprites.get((color_index, alpha, special))
+        if sprite is None:
+            sprite = self.render(color_index, alpha, special)
+            self.sprites[(color_index, alpha, special)] = sprite
+        return sprite
+
+    def render(self, color_index: int, alpha: int, special: int = 0) -> pygame.Surface:
+        """Draw one candy sprite"""
+        size = self.cell_size
+        color = CANDY_COLORS[color_index]
 
         # Create surface with alpha for fade effect
-        candy_surface = pygame.Surface((CELL_SIZE - 10, CELL_SIZE - 10), pygame.SRCALPHA)
-        candy_surface.fill((*color, self.alpha))
+        candy_surface = pygame.Surface((size - 10, size - 10), pygame.SRCALPHA)
+        candy_surface.fill((*color, alpha))
 
         # Draw circle
         pygame.draw.circle(
             candy_surface,
-            (*color, self.alpha),
-            (CELL_SIZE // 2 - 5, CELL_SIZE // 2 - 5),
-            CELL_SIZE // 2 - 10
+            (*color, alpha),
+            (size // 2 - 5, size // 2 - 5),
+            size // 2 - 10
         )
 
         # Add highlight for 3D effect
         pygame.draw.circle(
             candy_surface,
-            (255, 255, 255, self.alpha // 2),
-            (CELL_SIZE // 2 - 5 - 10, CELL_SIZE // 2 - 5 - 10),
-            CELL_SIZE // 6
+            (255, 255, 255, alpha // 2),
+            (size // 2 - 5 - 10, size // 2 - 5 - 10),
+            size // 6
         )
 
-        screen.blit(candy_surface, (int(self.x) + 5, int(self.y) + 5))
-
+        # Mark special candies: stripes across, a wrapper, or a bomb in the middle
+        inner = size - 10
+        mark = (255, 255, 255, alpha)
+        if special == STRIPED_ROW:
+            for y in range(inner // 4, inner, inner // 4):
+                pygame.draw.line(candy_surface, mark, (0, y), (inner - 1, y), 3)
+        elif special == STRIPED_COL:
+            for x in range(inner // 4, inner, inner // 4):
+                pygame.draw.line(candy_surface, mark, (x, 0), (x, inner - 1), 3)
+        elif special == WRAPPED:
+            pygame.draw.rect(candy_surface, mark, candy_surface.get_rect(), 5)
+        elif special == COLOR_BOMB:
+            pygame.draw.circle(candy_surface, (0, 0, 0, alpha), (inner // 2, inner // 2), inner // 4)
+            pygame.draw.circle(candy_surface, mark, (inner // 2, inner // 2), inner // 8)
 
-class CandyCrush:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-        pygame.display.set_caption("Candy Crush")
-        self.clock = pygame.time.Clock()
-        self.score = 0
-        self.selected_candy: Optional[Tuple[int, int]] = None
-        self.grid: List[List[Optional[Candy]]] = []
-        self.animation_state = "idle"  # idle, swapping, disappearing, falling, swapping_back
-        self.swap_candies: List[Candy] = []
-        self.disappearing_candies: List[Candy] = []
-        self.font = pygame.font.Font(None, 48)
-        self.small_font = pygame.font.Font(None, 32)
-        self.game_over = False
+        # Match the display pixel format once a window exists so blits stay fast
+        if pygame.display.get_surface() is not None:
+            candy_surface = candy_surface.convert_alpha()
+        return candy_surface
 
-        # Button rectangles for game over screen
-        self.restart_button = pygame.Rect(0, 0, 180, 50)
-        self.quit_button = pygame.Rect(0, 0, 180, 50)
 
-        self.init_grid()
+sprite_cache = SpriteCache()
 
-    def init_grid(self):
-        """Initialize game grid with random candies"""
-        self.grid = [[None for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                # Keep generating random colors until no match is created
-                while True:
-                    color_index = random.randint(0, len(CANDY_COLORS) - 1)
-                    self.grid[row][col] = Candy(row, col, color_index)
-
-                    # Check if this creates a match
-                    if not self.would_create_match(row, col):
-                        break
-
-    def reset_game(self):
-        """Reset the game to initial state"""
-        self.score = 0
-        self.selected_candy = None
-        self.animation_state = "idle"
-        self.swap_candies = []
-        self.disappearing_candies = []
-        self.game_over = False
-        self.init_grid()
 
-    def would_create_match(self, row: int, col: int) -> bool:
-        """Check if placing this candy would create a match"""
-        if not self.grid[row][col]:
-            return False
+class Candy:
+    """A candy sprite; its position, target and alpha live in a slot of a Tweens"""
+    __slots__ = ("row", "col", "color_index", "special", "cell_size", "tweens", "slot")
 
-        color = self.grid[row][col].color_index
-
-        # Check horizontal
-        count = 1
-        # Check left
-        c = col - 1
-        while c >= 0 and self.grid[row][c] and self.grid[row][c].color_index == color:
-            count += 1
-            c -= 1
-        # Check right
-        c = col + 1
-        while c < GRID_SIZE and self.grid[row][c] and self.grid[row][c].color_index == color:
-            count += 1
-            c += 1
-        if count >= 3:
-            return True
-
-        # Check vertical
-        count = 1
-        # Check up
-        r = row - 1
-        while r >= 0 and self.grid[r][col] and self.grid[r][col].color_index == color:
-            count += 1
-            r -= 1
-        # Check down
-        r = row + 1
-        while r < GRID_SIZE and self.grid[r][col] and self.grid[r][col].color_index == color:
-            count += 1
-            r += 1
-        if count >= 3:
-            return True
-
-        return False
-
-    def find_matches(self) -> List[Tuple[int, int]]:
-        """Find all matches on the board"""
-        matches = set()
-
-        # Check horizontal matches
-        for row in range(GRID_SIZE):
-            col = 0
-            while col < GRID_SIZE:
-                if not self.grid[row][col]:
-                    col += 1
-                    continue
-
-                color = self.grid[row][col].color_index
-                match_length = 1
-
-                # Count consecutive candies of same color
-                for c in range(col + 1, GRID_SIZE):
-                    if self.grid[row][c] and self.grid[row][c].color_index == color:
-                        match_length += 1
-                    else:
-                        break
+    def __init__(self, row: int, col: int, color_index: int, tweens: Tweens, cell_size: int = CELL_SIZE,
+                 y: Optional[float] = None, special: int = 0):
+        self.row = row
+        self.col = col
+        self.color_index = color_index
+        self.special = special  # Kind of special candy, 0 for a plain one
+        self.cell_size = cell_size
+        self.tweens = tweens
+        # Starts at rest in its cell, or at y when it is to fall in
+        self.slot = tweens.allocate(col * cell_size + GRID_OFFSET_X,
+                                    row * cell_size + GRID_OFFSET_Y if y is None else y)
 
-                if match_length >= 3:
-                    for c in range(col, col + match_length):
-                        matches.add((row, c))
+    @property
+    def x(self) -> float:
+        return float(self.tweens.x[self.slot])
 
-                col += 1
+    @property
+    def y(self) -> float:
+        return float(self.tweens.y[self.slot])
 
-        # Check vertical matches
-        for col in range(GRID_SIZE):
-            row = 0
-            while row < GRID_SIZE:
-                if not self.grid[row][col]:
-                    row += 1
-                    continue
+    @property
+    def alpha(self) -> int:
+        return int(self.tweens.alpha[self.slot])
 
-                color = self.grid[row][col].color_index
-                match_length = 1
+    def set_target(self, row: int, col: int):
+        """Set target position for animation"""
+        self.tweens.move_to(self.slot, col * self.cell_size + GRID_OFFSET_X, row * self.cell_size + GRID_OFFSET_Y)
 
-                # Count consecutive candies of same color
-                for r in range(row + 1, GRID_SIZE):
-                    if self.grid[r][col] and self.grid[r][col].color_index == color:
-                        match_length += 1
-                    else:
-                        break
+    def is_at_target(self) -> bool:
+        """Check if candy reached target position"""
+        return self.tweens.at_target(self.slot)
 
-                if match_length >= 3:
-                    for r in range(row, row + match_length):
-                        matches.add((r, col))
+    def fade_out(self):
+        """Start the fade animation"""
+        self.tweens.fade_out(self.slot)
 
-                row += 1
+    def release(self):
+        """Free the candy's animation slot once it is gone from the board"""
+        self.tweens.release(self.slot)
 
-        return list(matches)
+    def draw(self, screen: pygame.Surface):
+        """Draw the candy"""
+        screen.blit(sprite_cache.get(self.color_index, self.alpha, self.special), (int(self.x) + 5, int(self.y) + 5))
 
-    def has_valid_moves(self) -> bool:
-        """Check if there are any valid moves left on the board"""
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]  # right, down, left, up
 
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if not self.grid[row][col]:
-                    continue
+class CandyCrush:
+    def __init__(self, engine: Optional[GameEngine] = None, rows: int = GRID_SIZE, cols: int = GRID_SIZE,
+                 cell_size: int = CELL_SIZE, pool: Optional[BoardPool] = None, record_path: Optional[str] = None,
+                 profiler: Optional[FrameProfiler] = None, special_candies: bool = False):
+        if engine is None:
+            engine = GameEngine(rows, cols, num_colors=len(CANDY_COLORS), track_moves=True, pool=pool,
+                                special_candies=special_candies)
+        self.engine = engine
+        init_pygame()
+
+        # Window size follows the board dimensions
+        self.rows = engine.rows
+        self.cols = engine.cols
+        self.cell_size = cell_size
+        self.window_width = max(MIN_WINDOW_WIDTH, GRID_OFFSET_X + self.cols * cell_size + GRID_MARGIN_RIGHT)
+        self.window_height = GRID_OFFSET_Y + self.rows * cell_size + GRID_MARGIN_BOTTOM
+
+        self.screen = pygame.display.set_mode((self.window_width, self.window_height))
+        pygame.display.set_caption("Candy Crush")
+        sprite_cache.set_cell_size(cell_size)
+        self.clock = pygame.time.Clock()
+        self.selected_candy: Optional[Tuple[int, int]] = None
+        self.hint: Optional[Move] = None
+        self.solver: Optional[Solver] = None
+        self.grid: List[List[Optional[Candy]]] = []
+        # Positions and alpha of all candies, animated together
+        from animation import Tweens
+        self.tweens = Tweens(2 * self.rows * self.cols)
+        self.animation_state = "idle"  # idle, swapping, disappearing, falling, swapping_back
+        self.swap_candies: List[Candy] = []
+        self.disappearing_candies: List[Candy] = []
+        # The engine resolves a move as soon as it is made; its waves are then
+        # played back here, with their score shown as each wave clears
+        self.resolution: Optional[Resolution] = None
+        self.waves: Deque[Wave] = deque()
+        self.wave: Optional[Wave] = None
+        self.unshown_score = 0
+
+        # Replays: every seeded game is recorded, and finished games are
+        # appended to record_path when given
+        self.recorder = ReplayRecorder(engine) if engine.seed is not None else None
+        self.record_path = record_path
+        self.pending_move: Optional[Move] = None
+        self.move_score_start = 0
+        # Moves still to play back from a replay, with their recorded scores
+        self.playback: Deque[Tuple[Move, int]] = deque()
+        self.expected_score: Optional[int] = None
+        # The engine's own min_moves and special_candies, put back once the
+        # game started from a replay is over
+        self.own_settings: Optional[Tuple[int, bool]] = None
+
+        # Per-frame instrumentation; every hook is skipped when this is None
+        self.profiler = profiler
+        self.profile_panel: Optional[pygame.Surface] = None
 
-                # Try swapping with each adjacent cell
-                for dr, dc in directions:
-                    new_row, new_col = row + dr, col + dc
+        # Button rectangles for game over screen
+        self.restart_button = pygame.Rect(0, 0, 180, 50)
+        self.quit_button = pygame.Rect(0, 0, 180, 50)
 
-                    # Check if adjacent cell is valid
-                    if 0 <= new_row < GRID_SIZE and 0 <= new_col < GRID_SIZE:
-                        if not self.grid[new_row][new_col]:
-                            continue
+        # Dirty-region rendering state: what is on screen since the last draw
+        self.full_redraw = True
+        self.drawn_game_over = False
+        self.drawn_candies: Dict[Candy, Tuple[int, int, int, int]] = {}
+        self.drawn_selection: Optional[Tuple[int, int]] = None
+        self.drawn_hint: Optional[Move] = None
+        # Rendered by the first full redraw
+        self.background: Optional[pygame.Surface] = None
+        self.score_text: Optional[pygame.Surface] = None
+        self.score_text_value = self.score
 
-                        # Temporarily swap
-                        self.grid[row][col], self.grid[new_row][new_col] = \
-                            self.grid[new_row][new_col], self.grid[row][col]
+        self.init_grid()
 
-                        # Update positions temporarily
-                        self.grid[row][col].row, self.grid[row][col].col = row, col
-                        self.grid[new_row][new_col].row, self.grid[new_row][new_col].col = new_row, new_col
+    # Fonts load on first use, so a renderer that never draws text loads none
+    @property
+    def font(self) -> pygame.font.Font:
+        return get_font(48)
 
-                        # Check if this creates a match
-                        matches = self.find_matches()
+    @property
+    def small_font(self) -> pygame.font.Font:
+        return get_font(32)
 
-                        # Swap back
-                        self.grid[row][col], self.grid[new_row][new_col] = \
-                            self.grid[new_row][new_col], self.grid[row][col]
+    @property
+    def profile_font(self) -> pygame.font.Font:
+        return get_font(20)
 
-                        # Restore positions
-                        self.grid[row][col].row, self.grid[row][col].col = row, col
-                        self.grid[new_row][new_col].row, self.grid[new_row][new_col].col = new_row, new_col
+    @property
+    def score(self) -> int:
+        """Score as shown, leaving out the waves not played back yet"""
+        return self.engine.score - self.unshown_score
 
-                        if matches:
-                            return True
+    @property
+    def game_over(self) -> bool:
+        """Game over as shown, once the last move has been played back"""
+        return self.engine.game_over and self.resolution is None
 
-        return False
+    def init_grid(self):
+        """Create a candy sprite for every cell of the engine board"""
+        board = self.engine.board
+        specials = self.engine.specials
+        self.tweens.clear()
+        self.grid = [
+            [Candy(row, col, board.get(row, col), self.tweens, self.cell_size, special=specials.get((row, col), 0))
+             for col in range(self.cols)]
+            for row in range(self.rows)
+        ]
+
+    def reset_game(self, seed: Optional[int] = None):
+        """Reset the game to initial state, back on the engine's own settings after a replay"""
+        self.save_replay()
+        if self.own_settings is not None:
+            self.engine.min_moves, self.engine.special_candies = self.own_settings
+            self.own_settings = None
+        self.start_game(seed)
+
+    def start_game(self, seed: Optional[int] = None):
+        """Start a new game with the engine's current settings"""
+        self.engine.reset(seed)
+        if self.recorder is not None:
+            self.recorder.start()
+        self.playback.clear()
+        self.pending_move = None
+        self.selected_candy = None
+        self.hint = None
+        self.animation_state = "idle"
+        self.swap_candies = []
+        self.disappearing_candies = []
+        self.resolution = None
+        self.waves.clear()
+        self.wave = None
+        self.unshown_score = 0
+        self.init_grid()
+        self.full_redraw = True
 
     def swap_candies_at(self, pos1: Tuple[int, int], pos2: Tuple[int, int]):
-        """Swap two candies and start swap animation"""
+        """Resolve a swap in the engine and start its swap animation"""
         row1, col1 = pos1
         row2, col2 = pos2
 
         candy1 = self.grid[row1][col1]
         candy2 = self.grid[row2][col2]
 
+        self.move_score_start = self.score
+        self.resolve((pos1, pos2))
+
         # Swap in grid
         self.grid[row1][col1] = candy2
         self.grid[row2][col2] = candy1
@@ -288,13 +346,73 @@ class CandyCrush:
 
         self.swap_candies = [candy1, candy2]
         self.animation_state = "swapping"
+        self.hint = None
+        self.pending_move = (pos1, pos2)
+
+    def resolve(self, move: Move):
+        """Resolve a move and its whole cascade in the engine, timing it when profiling
+
+        The cascade and the game-over check are timed as separate metrics.
+        """
+        if self.profiler is None:
+            self.resolution = self.engine.resolve(move)
+        else:
+            start = time.perf_counter()
+            resolution = self.engine.resolve(move, detect_game_over=False)
+            resolved = time.perf_counter()
+            if resolution.valid:
+                resolution = resolution._replace(game_over=self.engine.check_game_over())
+                self.profiler.add("has_valid_moves", time.perf_counter() - resolved)
+            self.profiler.add("resolve", resolved - start)
+            self.resolution = resolution
+        self.waves.extend(self.resolution.waves)
+        self.unshown_score = self.resolution.score_delta
+
+    def finish_move(self):
+        """Record a move once its cascade has settled, and check it against the replay being played"""
+        score_delta = self.score - self.move_score_start
+        if self.profiler is not None:
+            self.profiler.end_move()
+        if self.recorder is not None:
+            self.recorder.record(self.pending_move, score_delta)
+        if self.expected_score is not None and score_delta != self.expected_score:
+            print(f"Replay mismatch: move {self.pending_move} scored {score_delta}, "
+                  f"recorded {self.expected_score}", file=sys.stderr)
+            self.playback.clear()
+        self.pending_move = None
+        self.expected_score = None
+
+    def save_replay(self):
+        """Append the current game to the record file, if it has any moves"""
+        if self.record_path is None or self.recorder is None or not self.recorder.moves:
+            return
+        with open(self.record_path, "ab") as f:
+            f.write(self.recorder.replay().to_bytes())
+        self.recorder.start()
+
+    def play_replay(self, replay: Replay):
+        """Start a replay's game and play its moves back at animation speed"""
+        if (replay.rows, replay.cols, replay.num_colors) != (self.rows, self.cols, self.engine.board.num_colors):
+            raise ValueError(f"Replay of a {replay.rows}x{replay.cols} board with {replay.num_colors} colors "
+                             f"does not fit this game")
+        # The game being left is saved with the settings it was played with
+        self.save_replay()
+        if self.own_settings is None:
+            self.own_settings = (self.engine.min_moves, self.engine.special_candies)
+        self.engine.min_moves = replay.min_moves
+        self.engine.special_candies = replay.special_candies
+        self.start_game(replay.seed)
+        self.playback.extend(zip(replay.moves, replay.scores))
+
+    def show_hint(self):
+        """Search for the best move and highlight it"""
+        if self.animation_state != "idle" or self.game_over:
+            return
 
-    def is_adjacent(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> bool:
-        """Check if two positions are adjacent"""
-        row1, col1 = pos1
-        row2, col2 = pos2
-        return (abs(row1 - row2) == 1 and col1 == col2) or \
-               (abs(col1 - col2) == 1 and row1 == row2)
+        if self.solver is None:
+            board = self.engine.board
+            self.solver = Solver(board.rows, board.cols, board.num_colors)
+        self.hint = self.solver.best_move(self.engine, time_budget=HINT_TIME_BUDGET)
 
     def handle_click(self, mouse_pos: Tuple[int, int]):
         """Handle mouse click on grid"""
@@ -302,75 +420,80 @@ class CandyCrush:
             return
 
         x, y = mouse_pos
-        col = (x - GRID_OFFSET_X) // CELL_SIZE
-        row = (y - GRID_OFFSET_Y) // CELL_SIZE
+        col = (x - GRID_OFFSET_X) // self.cell_size
+        row = (y - GRID_OFFSET_Y) // self.cell_size
 
-        if 0 <= row < GRID_SIZE and 0 <= col < GRID_SIZE:
+        if 0 <= row < self.rows and 0 <= col < self.cols:
             if self.selected_candy is None:
                 self.selected_candy = (row, col)
             else:
                 if self.selected_candy == (row, col):
                     self.selected_candy = None
-                elif self.is_adjacent(self.selected_candy, (row, col)):
+                elif self.engine.is_adjacent(self.selected_candy, (row, col)):
                     self.swap_candies_at(self.selected_candy, (row, col))
                     self.selected_candy = None
                 else:
                     self.selected_candy = (row, col)
 
-    def remove_matches(self):
-        """Remove matched candies and start disappearing animation"""
-        matches = self.find_matches()
-
-        if matches:
-            self.disappearing_candies = []
-            for row, col in matches:
-                if self.grid[row][col]:
-                    self.disappearing_candies.append(self.grid[row][col])
+    def remove_matches(self) -> bool:
+        """Start the disappearing animation of the next wave, if any is left"""
+        if not self.waves:
+            return False
 
-            self.animation_state = "disappearing"
-            self.score += len(matches) * 10
-            return True
-        return False
+        self.wave = wave = self.waves.popleft()
+        self.unshown_score -= wave.score
+        if self.profiler is not None:
+            self.profiler.count_wave(len(wave.cleared))
+        self.disappearing_candies = []
+        for row, col in wave.cleared:
+            candy = self.grid[row][col]
+            if candy:
+                candy.fade_out()
+                self.disappearing_candies.append(candy)
+        # Special candies made by the wave stay, changing their look
+        for row, col, kind in wave.specials:
+            self.grid[row][col].special = kind
+
+        self.animation_state = "disappearing"
+        return True
 
     def apply_gravity(self):
-        """Make candies fall down and generate new ones"""
+        """Make candies fall down and drop in the new ones, as the current wave says"""
         self.animation_state = "falling"
-
-        for col in range(GRID_SIZE):
-            # Count empty spaces from bottom
-            empty_count = 0
-            for row in range(GRID_SIZE - 1, -1, -1):
-                if self.grid[row][col] is None:
-                    empty_count += 1
-                elif empty_count > 0:
-                    # Move candy down
-                    candy = self.grid[row][col]
-                    self.grid[row + empty_count][col] = candy
-                    self.grid[row][col] = None
-                    candy.row = row + empty_count
-                    candy.set_target(row + empty_count, col)
-
-            # Generate new candies at top
-            for i in range(empty_count):
-                row = i
-                color_index = random.randint(0, len(CANDY_COLORS) - 1)
-                candy = Candy(row, col, color_index)
-                candy.y = -CELL_SIZE * (empty_count - i)
-                candy.target_y = row * CELL_SIZE + GRID_OFFSET_Y
-                self.grid[row][col] = candy
+        wave = self.wave
+        grid = self.grid
+
+        for col, from_row, to_row in wave.falls:
+            candy = grid[from_row][col]
+            grid[to_row][col] = candy
+            grid[from_row][col] = None
+            candy.row = to_row
+            candy.set_target(to_row, col)
+
+        # New candies start stacked above the grid, as many as their column got
+        spawned: Dict[int, int] = {}
+        for spawn in wave.spawns:
+            spawned[spawn.col] = spawned.get(spawn.col, 0) + 1
+        for row, col, color in wave.spawns:
+            candy = Candy(row, col, color, self.tweens, self.cell_size, y=-self.cell_size * (spawned[col] - row))
+            candy.set_target(row, col)
+            grid[row][col] = candy
+        self.wave = None
 
     def update(self):
         """Update game state and animations"""
+        if self.animation_state == "idle" and self.playback and not self.game_over:
+            move, self.expected_score = self.playback.popleft()
+            self.swap_candies_at(*move)
+
         if self.animation_state == "swapping":
-            all_at_target = all(candy.is_at_target() for candy in self.swap_candies)
+            # One step for every moving candy, or True once all have arrived
+            all_at_target = self.tweens.step_moves(0.3)
 
-            if not all_at_target:
-                for candy in self.swap_candies:
-                    candy.update_position(0.3)
-            else:
-                # Check if swap created matches
+            if all_at_target:
+                # Play the first wave of the cascade
                 if not self.remove_matches():
-                    # Invalid swap, swap back manually
+                    # Invalid swap, swap back manually; the engine never kept it
                     candy1, candy2 = self.swap_candies[0], self.swap_candies[1]
                     row1, col1 = candy1.row, candy1.col
                     row2, col2 = candy2.row, candy2.col
@@ -388,52 +511,38 @@ class CandyCrush:
                     candy2.set_target(row1, col1)
 
                     self.animation_state = "swapping_back"
+                    self.pending_move = None
                 # If matches found, remove_matches() already set state to "disappearing"
 
         elif self.animation_state == "swapping_back":
-            all_at_target = all(candy.is_at_target() for candy in self.swap_candies)
+            all_at_target = self.tweens.step_moves(0.3)
 
-            if not all_at_target:
-                for candy in self.swap_candies:
-                    candy.update_position(0.3)
-            else:
+            if all_at_target:
                 self.animation_state = "idle"
-                # Check if there are any valid moves left
-                if not self.game_over and not self.has_valid_moves():
-                    self.game_over = True
+                self.resolution = None
 
         elif self.animation_state == "disappearing":
-            all_disappeared = True
-            for candy in self.disappearing_candies:
-                if candy.alpha > 0:
-                    candy.alpha = max(0, candy.alpha - 15)
-                    all_disappeared = False
+            all_disappeared = self.tweens.step_fades(15)
 
             if all_disappeared:
                 # Remove candies from grid
                 for candy in self.disappearing_candies:
-                    if self.grid[candy.row][candy.col] == candy:
+                    if self.grid[candy.row][candy.col] is candy:
                         self.grid[candy.row][candy.col] = None
+                    candy.release()
 
                 self.disappearing_candies = []
                 self.apply_gravity()
 
         elif self.animation_state == "falling":
-            all_at_target = True
-            for row in range(GRID_SIZE):
-                for col in range(GRID_SIZE):
-                    if self.grid[row][col]:
-                        if not self.grid[row][col].is_at_target():
-                            self.grid[row][col].update_position(0.25)
-                            all_at_target = False
+            all_at_target = self.tweens.step_moves(0.25)
 
             if all_at_target:
-                # Check for new matches after falling
+                # Play the next wave, or finish the move after the last one
                 if not self.remove_matches():
                     self.animation_state = "idle"
-                    # Check if there are any valid moves left
-                    if not self.game_over and not self.has_valid_moves():
-                        self.game_over = True
+                    self.finish_move()
+                    self.resolution = None
 
     def draw_button(self, rect: pygame.Rect, text: str, mouse_pos: Tuple[int, int], color_type: str = "green"):
         """Draw a button with hover effect"""
@@ -456,93 +565,237 @@ class CandyCrush:
         text_rect = button_text.get_rect(center=rect.center)
         self.screen.blit(button_text, text_rect)
 
-    def draw(self):
-        """Draw the game"""
-        self.screen.fill(BG_COLOR)
+    def cell_rect(self, row: int, col: int) -> pygame.Rect:
+        """Screen rectangle of a grid cell"""
+        size = self.cell_size
+        return pygame.Rect(col * size + GRID_OFFSET_X, row * size + GRID_OFFSET_Y, size, size)
+
+    def visible_candies(self) -> List[Candy]:
+        """Candies currently on screen"""
+        return [candy for line in self.grid for candy in line if candy]
+
+    def collect_dirty_rects(self, positions) -> List[pygame.Rect]:
+        """Find the screen regions that changed since the last draw"""
+        dirty = []
+
+        # Candies that moved, faded, appeared or disappeared
+        xs, ys, alphas = positions
+        drawn = {}
+        for candy in self.visible_candies():
+            slot = candy.slot
+            state = (xs[slot], ys[slot], alphas[slot], candy.special)
+            drawn[candy] = state
+            previous = self.drawn_candies.get(candy)
+            if previous != state:
+                dirty.append(pygame.Rect(state[0], state[1], self.cell_size, self.cell_size))
+                if previous is not None:
+                    dirty.append(pygame.Rect(previous[0], previous[1], self.cell_size, self.cell_size))
+        for candy, previous in self.drawn_candies.items():
+            if candy not in drawn:
+                dirty.append(pygame.Rect(previous[0], previous[1], self.cell_size, self.cell_size))
+        self.drawn_candies = drawn
+
+        # Selection highlight
+        selection = self.selected_candy if self.animation_state == "idle" else None
+        if selection != self.drawn_selection:
+            for cell in (selection, self.drawn_selection):
+                if cell is not None:
+                    dirty.append(self.cell_rect(*cell))
+            self.drawn_selection = selection
+
+        # Hint highlight
+        hint = self.hint if self.animation_state == "idle" else None
+        if hint != self.drawn_hint:
+            for move in (hint, self.drawn_hint):
+                if move is not None:
+                    dirty.extend(self.cell_rect(*cell) for cell in move)
+            self.drawn_hint = hint
+
+        # Score text, re-rendered only when the score changes
+        if self.score_text is not None and self.score != self.score_text_value:
+            dirty.append(self.score_text.get_rect(topleft=(20, 60)))
+            self.score_text = self.small_font.render(f"Score: {self.score}", True, BLACK)
+            self.score_text_value = self.score
+            dirty.append(self.score_text.get_rect(topleft=(20, 60)))
+
+        screen_rect = self.screen.get_rect()
+        dirty = [rect.clip(screen_rect) for rect in dirty]
+        dirty = [rect for rect in dirty if rect.width and rect.height]
+
+        # Many small regions (e.g. a whole board falling) are cheaper as one
+        if len(dirty) > 16:
+            dirty = [dirty[0].unionall(dirty[1:])]
+        return dirty
+
+    def render_background(self) -> pygame.Surface:
+        """Render the static parts of the window: background, title and grid"""
+        background = pygame.Surface((self.window_width, self.window_height)).convert()
+        background.fill(BG_COLOR)
 
         # Draw title
         title = self.font.render("Candy Crush", True, BLACK)
-        self.screen.blit(title, (WINDOW_WIDTH // 2 - title.get_width() // 2, 20))
-
-        # Draw score
-        score_text = self.small_font.render(f"Score: {self.score}", True, BLACK)
-        self.screen.blit(score_text, (20, 60))
+        background.blit(title, (self.window_width // 2 - title.get_width() // 2, 20))
 
         # Draw grid background
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                x = col * CELL_SIZE + GRID_OFFSET_X
-                y = row * CELL_SIZE + GRID_OFFSET_Y
-                pygame.draw.rect(self.screen, GRAY, (x, y, CELL_SIZE, CELL_SIZE), 1)
+        for row in range(self.rows):
+            for col in range(self.cols):
+                pygame.draw.rect(background, GRAY, self.cell_rect(row, col), 1)
+
+        return background
+
+    def draw_scene(self, area: pygame.Rect, positions):
+        """Draw everything that overlaps an area of the window"""
+        if self.background is None:
+            self.background = self.render_background()
+            self.score_text = self.small_font.render(f"Score: {self.score}", True, BLACK)
+            self.score_text_value = self.score
+        self.screen.blit(self.background, area, area)
+
+        # Draw score
+        if area.colliderect(self.score_text.get_rect(topleft=(20, 60))):
+            self.screen.blit(self.score_text, (20, 60))
 
         # Highlight selected candy
         if self.selected_candy and self.animation_state == "idle":
-            row, col = self.selected_candy
-            x = col * CELL_SIZE + GRID_OFFSET_X
-            y = row * CELL_SIZE + GRID_OFFSET_Y
-            pygame.draw.rect(self.screen, (255, 215, 0), (x, y, CELL_SIZE, CELL_SIZE), 4)
-
-        # Draw candies
-        for row in range(GRID_SIZE):
-            for col in range(GRID_SIZE):
-                if self.grid[row][col]:
-                    self.grid[row][col].draw(self.screen)
-
-        # Draw game over screen
-        if self.game_over:
-            # Semi-transparent overlay
-            overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 180))
-            self.screen.blit(overlay, (0, 0))
-
-            # Game over text
-            game_over_text = self.font.render("GAME OVER!", True, WHITE)
-            self.screen.blit(
-                game_over_text,
-                (WINDOW_WIDTH // 2 - game_over_text.get_width() // 2, WINDOW_HEIGHT // 2 - 80)
-            )
-
-            # No moves left text
-            no_moves_text = self.small_font.render("No more valid moves!", True, WHITE)
-            self.screen.blit(
-                no_moves_text,
-                (WINDOW_WIDTH // 2 - no_moves_text.get_width() // 2, WINDOW_HEIGHT // 2 - 20)
-            )
-
-            # Final score
-            final_score_text = self.font.render(f"Final Score: {self.score}", True, (255, 215, 0))
-            self.screen.blit(
-                final_score_text,
-                (WINDOW_WIDTH // 2 - final_score_text.get_width() // 2, WINDOW_HEIGHT // 2 + 30)
-            )
-
-            # Position buttons
-            button_y = WINDOW_HEIGHT // 2 + 110
-            button_spacing = 20
-            total_button_width = self.restart_button.width * 2 + button_spacing
-            start_x = (WINDOW_WIDTH - total_button_width) // 2
-
-            self.restart_button.x = start_x
-            self.restart_button.y = button_y
-            self.quit_button.x = start_x + self.restart_button.width + button_spacing
-            self.quit_button.y = button_y
-
-            # Get mouse position
-            mouse_pos = pygame.mouse.get_pos()
-
-            # Draw buttons
-            self.draw_button(self.restart_button, "Restart", mouse_pos, "green")
-            self.draw_button(self.quit_button, "Quit", mouse_pos, "red")
-
-        pygame.display.flip()
+            pygame.draw.rect(self.screen, (255, 215, 0), self.cell_rect(*self.selected_candy), 4)
+
+        # Highlight hinted move
+        if self.hint and self.animation_state == "idle":
+            for cell in self.hint:
+                pygame.draw.rect(self.screen, HINT_COLOR, self.cell_rect(*cell), 4)
+
+        # Draw candies, reading every position from one snapshot of the tweens
+        xs, ys, alphas = positions
+        size = self.cell_size
+        for candy in self.visible_candies():
+            slot = candy.slot
+            x, y = xs[slot], ys[slot]
+            if area.colliderect((x, y, size, size)):
+                self.screen.blit(sprite_cache.get(candy.color_index, alphas[slot], candy.special), (x + 5, y + 5))
+
+    def draw_game_over(self):
+        """Draw the game over overlay and buttons"""
+        # Semi-transparent overlay
+        overlay = pygame.Surface((self.window_width, self.window_height), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))
+        self.screen.blit(overlay, (0, 0))
+
+        # Game over text
+        game_over_text = self.font.render("GAME OVER!", True, WHITE)
+        self.screen.blit(
+            game_over_text,
+            (self.window_width // 2 - game_over_text.get_width() // 2, self.window_height // 2 - 80)
+        )
+
+        # No moves left text
+        no_moves_text = self.small_font.render("No more valid moves!", True, WHITE)
+        self.screen.blit(
+            no_moves_text,
+            (self.window_width // 2 - no_moves_text.get_width() // 2, self.window_height // 2 - 20)
+        )
+
+        # Final score
+        final_score_text = self.font.render(f"Final Score: {self.score}", True, (255, 215, 0))
+        self.screen.blit(
+            final_score_text,
+            (self.window_width // 2 - final_score_text.get_width() // 2, self.window_height // 2 + 30)
+        )
+
+        # Position buttons
+        button_y = self.window_height // 2 + 110
+        button_spacing = 20
+        total_button_width = self.restart_button.width * 2 + button_spacing
+        start_x = (self.window_width - total_button_width) // 2
+
+        self.restart_button.x = start_x
+        self.restart_button.y = button_y
+        self.quit_button.x = start_x + self.restart_button.width + button_spacing
+        self.quit_button.y = button_y
+
+        # Get mouse position
+        mouse_pos = pygame.mouse.get_pos()
+
+        # Draw buttons
+        self.draw_button(self.restart_button, "Restart", mouse_pos, "green")
+        self.draw_button(self.quit_button, "Quit", mouse_pos, "red")
+
+    def draw(self):
+        """Draw the game, pushing only the regions that changed to the display"""
+        positions = self.tweens.frame()
+        rects = self.collect_dirty_rects(positions)
+
+        # The game over overlay covers the whole window, so entering or leaving it redraws everything
+        if self.game_over != self.drawn_game_over:
+            self.full_redraw = True
+            self.drawn_game_over = self.game_over
+
+        if self.full_redraw:
+            self.draw_scene(self.screen.get_rect(), positions)
+            if self.game_over:
+                self.draw_game_over()
+            if self.profiler is not None and self.profiler.overlay:
+                self.profile_panel = self.render_profile_panel()
+                self.screen.blit(self.profile_panel, (0, 0))
+            self.full_redraw = False
+            self.present()
+            return
+
+        if not rects or self.game_over:
+            return
+
+        for rect in rects:
+            self.screen.set_clip(rect)
+            self.draw_scene(rect, positions)
+            if self.profile_panel is not None:
+                self.screen.blit(self.profile_panel, (0, 0))
+        self.screen.set_clip(None)
+        self.present(rects)
+
+    def present(self, rects: Optional[List[pygame.Rect]] = None):
+        """Push the whole frame, or only the given regions, to the display"""
+        if self.profiler is not None:
+            self.profiler.lap("draw")
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+        if self.profiler is not None:
+            self.profiler.lap("flip")
+
+    def render_profile_panel(self) -> pygame.Surface:
+        """Render the profiler's rolling percentiles as a panel for the top left corner"""
+        font = self.profile_font
+        lines = ["p50 / p95 / p99 (ms)"] + self.profiler.overlay_lines()
+        height = font.get_linesize()
+        panel = pygame.Surface((260, height * len(lines) + 8), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            panel.blit(font.render(line, True, WHITE), (6, 4 + i * height))
+        return panel
+
+    def is_idle(self) -> bool:
+        """Check if nothing will change on screen until the next input event"""
+        return (self.animation_state == "idle" and not self.playback and not self.full_redraw
+                and self.game_over == self.drawn_game_over)
 
     def run(self):
         """Main game loop"""
+        profiler = self.profiler
         running = True
         while running:
-            for event in pygame.event.get():
+            # Block until input arrives instead of redrawing an unchanged screen
+            waited = [pygame.event.wait()] if self.is_idle() else []
+            if profiler is not None:
+                profiler.begin_frame()
+            events = waited + pygame.event.get()
+
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
+                elif event.type == pygame.MOUSEMOTION:
+                    # Button hover effects on the game over screen
+                    if self.game_over:
+                        self.full_redraw = True
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     mouse_pos = pygame.mouse.get_pos()
                     if self.game_over:
@@ -559,15 +812,64 @@ class CandyCrush:
                             self.reset_game()
                         elif event.key == pygame.K_ESCAPE:
                             running = False
+                    elif event.key == pygame.K_h:
+                        self.show_hint()
+
+            if profiler is None:
+                self.update()
+                self.draw()
+                self.clock.tick(FPS)
+                continue
 
+            profiler.lap("event")
+            state = self.animation_state
             self.update()
+            profiler.add("update." + state, profiler.lap("update"))
             self.draw()
+            profiler.lap("draw")
             self.clock.tick(FPS)
-
+            profiler.lap("tick")
+            profiler.end_frame(self.animation_state)
+            if profiler.overlay_due():
+                self.full_redraw = True
+
+        self.save_replay()
+        if profiler is not None:
+            profiler.close()
         pygame.quit()
         sys.exit()
 
 
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Play Candy Crush")
+    parser.add_argument("--rows", type=int, default=GRID_SIZE, help="board height in cells")
+    parser.add_argument("--cols", type=int, default=GRID_SIZE, help="board width in cells")
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE, help="cell size in pixels")
+    parser.add_argument("--record", help="append every finished game to this replay file")
+    parser.add_argument("--replay", help="play back a game from this replay file")
+    parser.add_argument("--game", type=int, default=0, help="which game of the replay file to play back")
+    parser.add_argument("--profile", help="append rolling frame timings to this JSONL file")
+    parser.add_argument("--profile-overlay", action="store_true", help="show rolling frame timings on screen")
+    parser.add_argument("--specials", action="store_true",
+                        help="make special candies from matches of four or more and crossing matches")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    game = CandyCrush()
+    args = parse_args()
+    replay = None
+    if args.replay:
+        with open(args.replay, "rb") as f:
+            replays = list(read_replays(f.read()))
+        replay = replays[args.game]
+        args.rows, args.cols = replay.rows, replay.cols
+
+    profiler = None
+    if args.profile or args.profile_overlay:
+        profiler = FrameProfiler(export_path=args.profile, overlay=args.profile_overlay)
+
+    game = CandyCrush(rows=args.rows, cols=args.cols, cell_size=args.cell_size, record_path=args.record,
+                      profiler=profiler, special_candies=args.specials)
+    if replay is not None:
+        game.play_replay(replay)
     game.run()
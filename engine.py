@@ -0,0 +1,1024 @@
+import copy
+import heapq
+import random
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# Constants
+GRID_SIZE = 8
+NUM_COLORS = 6
+POINTS_PER_CANDY = 10
+MAX_FILL_ATTEMPTS = 1000  # Boards generated before giving up on min_moves
+EMPTY_BYTE = 0xFF  # Empty cells in the one-byte-per-cell board format
+
+# Special candies, made from larger matches when special_candies is on. Each
+# keeps its color and sets off its effect when it is cleared
+STRIPED_ROW = 1  # Clears its whole row
+STRIPED_COL = 2  # Clears its whole column
+WRAPPED = 3  # Clears the 3x3 block around it
+COLOR_BOMB = 4  # Clears every candy of its color
+SPECIAL_KINDS = 4
+SPECIAL_BONUS = {STRIPED_ROW: 60, STRIPED_COL: 60, WRAPPED: 120, COLOR_BOMB: 200}  # Points for making one
+
+Position = Tuple[int, int]
+Move = Tuple[Position, Position]
+# Inclusive (top, bottom, left, right) bounds of a block of cells
+Region = Tuple[int, int, int, int]
+
+
+def new_seed() -> int:
+    """Draw a fresh 64-bit game seed"""
+    return random.getrandbits(64)
+
+
+class StepResult(NamedTuple):
+    """Outcome of resolving one move with GameEngine.step"""
+    valid: bool
+    score_delta: int
+    cascades: int
+    cleared: int
+    game_over: bool
+
+
+class Fall(NamedTuple):
+    """A candy dropping down its column to fill the cells cleared below it"""
+    col: int
+    from_row: int
+    to_row: int
+
+
+class Spawn(NamedTuple):
+    """A new candy entering a column from the top"""
+    row: int
+    col: int
+    color: int
+
+
+class SpecialCandy(NamedTuple):
+    """A special candy made by a wave, where its match left it"""
+    row: int
+    col: int
+    kind: int
+
+
+class Wave(NamedTuple):
+    """One wave of a cascade: the matches cleared, the score they earned and how the board settled
+
+    Falls are listed column by column, bottom up, so applying them in order
+    only ever moves a candy into a cell that is already empty. Special
+    candies made by the wave stay on the board, so they are not in cleared.
+    """
+    cleared: List[Position]
+    score: int
+    falls: List[Fall]
+    spawns: List[Spawn]
+    specials: List[SpecialCandy]
+
+
+class Resolution(NamedTuple):
+    """Outcome of resolving one move with GameEngine.resolve, with the timeline of its waves"""
+    valid: bool
+    score_delta: int
+    cascades: int
+    cleared: int
+    game_over: bool
+    waves: List[Wave]
+
+
+class Run(NamedTuple):
+    """A line of three or more candies of one color, from (row, col) rightwards or downwards"""
+    row: int
+    col: int
+    length: int
+    vertical: bool
+    color: int
+
+    def cells(self) -> List[Position]:
+        if self.vertical:
+            return [(self.row + i, self.col) for i in range(self.length)]
+        return [(self.row, self.col + i) for i in range(self.length)]
+
+
+class MatchGroup(NamedTuple):
+    """Runs joined by shared cells, such as the two arms of an L or a T"""
+    runs: List[Run]
+    cells: Set[Position]
+    intersections: List[Position]
+
+
+def runs_from_cells(cells: Iterable[Position], get, region: Optional[Region] = None) -> List[Run]:
+    """Recover the runs behind a list of matched cells, in one pass over them
+
+    Any three same-colored cells in a line are a match, so a line of matched
+    cells of one color is a run exactly when it is three or more long. Lets
+    a backend that only finds cells still answer find_runs. With a region,
+    runs that only cross the cells of runs overlapping it are left out, as
+    Board.find_runs would.
+    """
+    matched = set(cells)
+    top, bottom, left, right = region if region is not None else (0, float("inf"), 0, float("inf"))
+    runs = []
+    for row, col in matched:
+        color = get(row, col)
+        # Each run is followed from its first cell only
+        if top <= row <= bottom and ((row, col - 1) not in matched or get(row, col - 1) != color):
+            end = col + 1
+            while (row, end) in matched and get(row, end) == color:
+                end += 1
+            if end - col >= 3 and col <= right and end > left:
+                runs.append(Run(row, col, end - col, False, color))
+        if left <= col <= right and ((row - 1, col) not in matched or get(row - 1, col) != color):
+            end = row + 1
+            while (end, col) in matched and get(end, col) == color:
+                end += 1
+            if end - row >= 3 and row <= bottom and end > top:
+                runs.append(Run(row, col, end - row, True, color))
+    return runs
+
+
+def cell_in_run(cells, rows: int, cols: int, row: int, col: int) -> bool:
+    """Check if a cell of a row-by-row byte buffer is part of a run of 3 or more
+
+    Only the two cells on each side are read, so backends that keep their
+    colors in one flat buffer answer single-cell queries in constant time.
+    """
+    index = row * cols + col
+    color = cells[index]
+    if color == EMPTY_BYTE:
+        return False
+
+    left = col > 0 and cells[index - 1] == color
+    right = col < cols - 1 and cells[index + 1] == color
+    if (left and (right or (col > 1 and cells[index - 2] == color))) or \
+            (right and col < cols - 2 and cells[index + 2] == color):
+        return True
+
+    up = row > 0 and cells[index - cols] == color
+    down = row < rows - 1 and cells[index + cols] == color
+    return bool((up and (down or (row > 1 and cells[index - 2 * cols] == color))) or
+                (down and row < rows - 2 and cells[index + 2 * cols] == color))
+
+
+def swap_in_run(cells, rows: int, cols: int, pos1: Position, pos2: Position) -> bool:
+    """Check if swapping two cells of a row-by-row byte buffer would create a match
+
+    The buffer is swapped back before returning.
+    """
+    index1 = pos1[0] * cols + pos1[1]
+    index2 = pos2[0] * cols + pos2[1]
+    color1 = cells[index1]
+    color2 = cells[index2]
+    if color1 == EMPTY_BYTE or color2 == EMPTY_BYTE or color1 == color2:
+        return False
+
+    cells[index1], cells[index2] = color2, color1
+    found = cell_in_run(cells, rows, cols, *pos1) or cell_in_run(cells, rows, cols, *pos2)
+    cells[index1], cells[index2] = color1, color2
+    return found
+
+
+def has_moves(cells, rows: int, cols: int, count: int) -> bool:
+    """Check if at least count swaps of a row-by-row byte buffer create a match, stopping once found"""
+    found = 0
+    for row in range(rows):
+        for col in range(cols):
+            if col + 1 < cols and swap_in_run(cells, rows, cols, (row, col), (row, col + 1)):
+                found += 1
+            if row + 1 < rows and swap_in_run(cells, rows, cols, (row, col), (row + 1, col)):
+                found += 1
+            if found >= count:
+                return True
+    return False
+
+
+def fill_cells(cells, rows: int, cols: int, num_colors: int, rng, min_moves: int = 1):
+    """Fill a row-by-row buffer of one byte per cell with random colors, without any match and with at least
+    min_moves legal moves
+
+    Cells are filled left to right and top to bottom, so only the two cells
+    to the left and the two above can complete a run. Each cell draws from
+    the colors that complete neither, which needs no retries. Every backend
+    fills through here, straight into its storage or a scratch buffer, so a
+    seed gives the same board on all of them.
+    """
+    if num_colors < 3:
+        raise ValueError("At least 3 colors are needed to fill a board without matches")
+
+    randint = rng.randint
+    for _ in range(MAX_FILL_ATTEMPTS):
+        index = 0
+        for row in range(rows):
+            for col in range(cols):
+                # Colors that would complete a run with the left or upper pair, -1 for none
+                left = cells[index - 1] if col >= 2 and cells[index - 1] == cells[index - 2] else -1
+                up = cells[index - cols] if row >= 2 and cells[index - cols] == cells[index - 2 * cols] else -1
+                if up == left:
+                    up = -1
+                low, high = (left, up) if left < up else (up, left)
+
+                # Draw among the allowed colors, then skip over the blocked ones
+                color = randint(0, num_colors - 1 - (low >= 0) - (high >= 0))
+                if 0 <= low <= color:
+                    color += 1
+                if 0 <= high <= color:
+                    color += 1
+                cells[index] = color
+                index += 1
+
+        if min_moves <= 0 or has_moves(cells, rows, cols, min_moves):
+            return
+
+    raise ValueError(f"Could not generate a {rows}x{cols} board with {min_moves} legal moves")
+
+
+def group_runs(runs: List[Run]) -> List[MatchGroup]:
+    """Join runs that cross each other into groups, recording the cells they share
+
+    Only a horizontal and a vertical run can share a cell, so indexing the
+    cells of the horizontal runs finds every intersection in one pass over
+    the vertical ones. Runs are sorted first, so the groups do not depend on
+    the order a backend found them in.
+    """
+    runs = sorted(runs)
+    parent = list(range(len(runs)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    across: Dict[Position, int] = {}
+    for index, run in enumerate(runs):
+        if not run.vertical:
+            for cell in run.cells():
+                across[cell] = index
+
+    shared: List[Position] = []
+    for index, run in enumerate(runs):
+        if run.vertical:
+            for cell in run.cells():
+                other = across.get(cell)
+                if other is not None:
+                    parent[find(index)] = find(other)
+                    shared.append(cell)
+
+    groups: Dict[int, MatchGroup] = {}
+    for index, run in enumerate(runs):
+        root = find(index)
+        if root not in groups:
+            groups[root] = MatchGroup([], set(), [])
+        groups[root].runs.append(run)
+        groups[root].cells.update(run.cells())
+    for cell in shared:
+        groups[find(across[cell])].intersections.append(cell)
+    return list(groups.values())
+
+
+def special_for(group: MatchGroup) -> int:
+    """Kind of special candy a match group makes, or 0 for none"""
+    longest = max(run.length for run in group.runs)
+    if longest >= 5:
+        return COLOR_BOMB
+    if group.intersections:
+        return WRAPPED
+    if longest == 4:
+        # The stripes run across the match
+        return STRIPED_ROW if group.runs[0].vertical else STRIPED_COL
+    return 0
+
+
+def special_cell(group: MatchGroup, swapped: Iterable[Position]) -> Position:
+    """Where a group's special candy is made: the swapped cell, else where its runs cross, else its middle"""
+    for cell in swapped:
+        if cell in group.cells:
+            return cell
+    if group.intersections:
+        return group.intersections[0]
+    run = max(group.runs, key=lambda run: run.length)
+    return run.cells()[run.length // 2]
+
+
+class Board:
+    """Grid of candy color indices with the match and gravity rules"""
+
+    def __init__(self, rows: int = GRID_SIZE, cols: int = GRID_SIZE, num_colors: int = NUM_COLORS):
+        self.rows = rows
+        self.cols = cols
+        self.num_colors = num_colors
+        self.grid: List[List[Optional[int]]] = [[None for _ in range(cols)] for _ in range(rows)]
+
+    def get(self, row: int, col: int) -> Optional[int]:
+        """Return the color index at a cell, or None if it is empty"""
+        return self.grid[row][col]
+
+    def copy(self) -> "Board":
+        """Return an independent copy of the board"""
+        board = Board(self.rows, self.cols, self.num_colors)
+        board.grid = [line[:] for line in self.grid]
+        return board
+
+    def to_bytes(self) -> bytes:
+        """Return the colors row by row, one byte per cell"""
+        return b"".join(
+            bytes(line) if None not in line else bytes(EMPTY_BYTE if color is None else color for color in line)
+            for line in self.grid
+        )
+
+    def load_bytes(self, data: bytes):
+        """Set the colors from one byte per cell, reusing the row lists"""
+        cols = self.cols
+        has_empty = EMPTY_BYTE in data
+        for row, line in enumerate(self.grid):
+            line[:] = data[row * cols:(row + 1) * cols]
+            if has_empty and EMPTY_BYTE in line:
+                line[:] = [None if color == EMPTY_BYTE else color for color in line]
+
+    def fill(self, rng, min_moves: int = 1):
+        """Fill the board with random colors, without any match and with at least min_moves legal moves"""
+        # Drawn into one scratch buffer, then copied into the existing row lists
+        cells = bytearray(self.rows * self.cols)
+        fill_cells(cells, self.rows, self.cols, self.num_colors, rng, min_moves)
+        self.load_bytes(cells)
+
+    def would_create_match(self, row: int, col: int) -> bool:
+        """Check if the candy at this cell is part of a run of 3 or more"""
+        grid = self.grid
+        color = grid[row][col]
+        if color is None:
+            return False
+
+        # Check horizontal
+        count = 1
+        # Check left
+        c = col - 1
+        while c >= 0 and grid[row][c] == color:
+            count += 1
+            c -= 1
+        # Check right
+        c = col + 1
+        while c < self.cols and grid[row][c] == color:
+            count += 1
+            c += 1
+        if count >= 3:
+            return True
+
+        # Check vertical
+        count = 1
+        # Check up
+        r = row - 1
+        while r >= 0 and grid[r][col] == color:
+            count += 1
+            r -= 1
+        # Check down
+        r = row + 1
+        while r < self.rows and grid[r][col] == color:
+            count += 1
+            r += 1
+        if count >= 3:
+            return True
+
+        return False
+
+    def find_runs(self, region: Optional[Region] = None) -> List[Run]:
+        """Find every run on the board, or only the runs that overlap a region, in one linear scan
+
+        Runs crossing the edge of the region are followed to their ends, so a
+        run is either reported whole or not at all.
+        """
+        grid = self.grid
+        top, bottom, left, right = region if region is not None else (0, self.rows - 1, 0, self.cols - 1)
+        runs = []
+
+        # Check horizontal matches, one run at a time
+        for row in range(top, bottom + 1):
+            line = grid[row]
+            # Back up to the start of the run the region begins in
+            col = left
+            while col > 0 and line[col - 1] == line[left]:
+                col -= 1
+            while col <= right:
+                color = line[col]
+                end = col + 1
+                while end < self.cols and line[end] == color:
+                    end += 1
+                if color is not None and end - col >= 3:
+                    runs.append(Run(row, col, end - col, False, color))
+                col = end
+
+        # Check vertical matches the same way
+        for col in range(left, right + 1):
+            row = top
+            while row > 0 and grid[row - 1][col] == grid[top][col]:
+                row -= 1
+            while row <= bottom:
+                color = grid[row][col]
+                end = row + 1
+                while end < self.rows and grid[end][col] == color:
+                    end += 1
+                if color is not None and end - row >= 3:
+                    runs.append(Run(row, col, end - row, True, color))
+                row = end
+
+        return runs
+
+    def find_matches(self, region: Optional[Region] = None) -> List[Position]:
+        """Find all matched cells on the board, or only those of the runs that overlap a region"""
+        matches = set()
+        for run in self.find_runs(region):
+            matches.update(run.cells())
+        return list(matches)
+
+    def swap_creates_match(self, pos1: Position, pos2: Position) -> bool:
+        """Check if swapping two cells would create a match, looking only at their rows and columns"""
+        color1 = self.grid[pos1[0]][pos1[1]]
+        color2 = self.grid[pos2[0]][pos2[1]]
+        if color1 is None or color2 is None or color1 == color2:
+            return False
+
+        self.swap(pos1, pos2)
+        found = self.would_create_match(*pos1) or self.would_create_match(*pos2)
+        self.swap(pos1, pos2)
+        return found
+
+    def legal_moves(self, limit: Optional[int] = None) -> List[Move]:
+        """List the swaps that create a match, stopping after limit moves if given"""
+        moves = []
+        for row in range(self.rows):
+            for col in range(self.cols):
+                # Each swap is tried once, from its top or left cell
+                for other in ((row, col + 1), (row + 1, col)):
+                    if other[0] >= self.rows or other[1] >= self.cols:
+                        continue
+                    if self.swap_creates_match((row, col), other):
+                        moves.append(((row, col), other))
+                        if limit is not None and len(moves) >= limit:
+                            return moves
+        return moves
+
+    def has_valid_moves(self) -> bool:
+        """Check if there are any valid moves left on the board"""
+        return bool(self.legal_moves(limit=1))
+
+    def swap(self, pos1: Position, pos2: Position):
+        """Swap the candies at two cells"""
+        row1, col1 = pos1
+        row2, col2 = pos2
+        self.grid[row1][col1], self.grid[row2][col2] = self.grid[row2][col2], self.grid[row1][col1]
+
+    def clear(self, cells: List[Position]):
+        """Empty the given cells"""
+        for row, col in cells:
+            self.grid[row][col] = None
+
+    def apply_gravity(self, rng, columns: Optional[Iterable[int]] = None):
+        """Make candies fall into empty cells and refill each column from the top
+
+        columns, in increasing order, limits the work to the columns that have
+        empty cells; the others would be left unchanged anyway.
+        """
+        grid = self.grid
+
+        for col in (range(self.cols) if columns is None else columns):
+            # Count empty spaces from bottom
+            empty_count = 0
+            for row in range(self.rows - 1, -1, -1):
+                if grid[row][col] is None:
+                    empty_count += 1
+                elif empty_count > 0:
+                    # Move candy down
+                    grid[row + empty_count][col] = grid[row][col]
+                    grid[row][col] = None
+
+            # Generate new candies at top
+            for row in range(empty_count):
+                grid[row][col] = rng.randint(0, self.num_colors - 1)
+
+
+class PooledGame(NamedTuple):
+    """A pre-generated starting board with the seeded generator and min_moves that made it"""
+    seed: int
+    board: object
+    rng: random.Random
+    min_moves: int
+
+
+class BoardPool:
+    """Stock of pre-generated starting boards, so a new game skips generation
+
+    Each board is generated by its own random.Random, seeded from the pool's
+    rng, and is handed out together with that generator and the pool's
+    min_moves, so the game stays replayable from its seed and settings.
+    """
+
+    def __init__(self, rows: int = GRID_SIZE, cols: int = GRID_SIZE, num_colors: int = NUM_COLORS, size: int = 0,
+                 min_moves: int = 1, rng=None, backend=Board):
+        self.rows = rows
+        self.cols = cols
+        self.num_colors = num_colors
+        self.min_moves = min_moves
+        self.rng = rng if rng is not None else random
+        self.backend = backend
+        self.games: Deque[PooledGame] = deque()
+        self.extend(size)
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def generate(self) -> PooledGame:
+        """Generate one board outside the pool"""
+        seed = self.rng.getrandbits(64)
+        rng = random.Random(seed)
+        board = self.backend(self.rows, self.cols, self.num_colors)
+        board.fill(rng, self.min_moves)
+        return PooledGame(seed, board, rng, self.min_moves)
+
+    def extend(self, count: int):
+        """Generate count more boards into the pool"""
+        for _ in range(count):
+            self.games.append(self.generate())
+
+    def pop(self) -> PooledGame:
+        """Take the oldest pooled board, generating one if the pool is empty"""
+        return self.games.popleft() if self.games else self.generate()
+
+
+class MoveIndex:
+    """Set of the currently legal swaps, re-checked only around changed cells"""
+
+    def __init__(self, board):
+        self.board = board
+        self.moves: Set[Move] = set()
+        self.rebuild()
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def __contains__(self, move: Move) -> bool:
+        return tuple(sorted(move)) in self.moves
+
+    def copy(self, board) -> "MoveIndex":
+        """Return a copy of the index that tracks another board"""
+        index = MoveIndex.__new__(MoveIndex)
+        index.board = board
+        index.moves = set(self.moves)
+        return index
+
+    def rebuild(self):
+        """Recompute the index with a full board scan"""
+        self.moves = set(self.board.legal_moves())
+
+    def swaps_at(self, row: int, col: int) -> List[Move]:
+        """All swaps involving a cell, each stored from its top or left cell"""
+        swaps = []
+        if col + 1 < self.board.cols:
+            swaps.append(((row, col), (row, col + 1)))
+        if row + 1 < self.board.rows:
+            swaps.append(((row, col), (row + 1, col)))
+        if col > 0:
+            swaps.append(((row, col - 1), (row, col)))
+        if row > 0:
+            swaps.append(((row - 1, col), (row, col)))
+        return swaps
+
+    def update(self, cells: Iterable[Position]):
+        """Re-check every swap whose outcome can depend on one of the changed cells"""
+        rows, cols = self.board.rows, self.board.cols
+
+        # A swap only looks two cells along the row and column of each endpoint
+        endpoints = set()
+        for row, col in cells:
+            for d in range(-2, 3):
+                endpoints.add((row + d, col))
+                endpoints.add((row, col + d))
+
+        swaps = set()
+        for row, col in endpoints:
+            if 0 <= row < rows and 0 <= col < cols:
+                swaps.update(self.swaps_at(row, col))
+
+        for move in swaps:
+            if self.board.swap_creates_match(*move):
+                self.moves.add(move)
+            else:
+                self.moves.discard(move)
+
+
+class GameEngine:
+    """Headless game rules: board, swaps, cascades, scoring and game over"""
+
+    def __init__(self, rows: int = GRID_SIZE, cols: int = GRID_SIZE, num_colors: int = NUM_COLORS, rng=None,
+                 backend=Board, track_moves: bool = False, board=None, min_moves: int = 1,
+                 pool: Optional[BoardPool] = None, seed: Optional[int] = None, special_candies: bool = False):
+        # By default every game gets its own random.Random, seeded with seed or
+        # a fresh seed, so it can be replayed. Any object with randint() can be
+        # passed as rng instead; the caller then owns it across resets.
+        self.owns_rng = rng is None
+        self.rng = rng
+        self.seed: Optional[int] = None
+        if board is not None and rng is None:
+            self.seed = seed if seed is not None else new_seed()
+            self.rng = random.Random(self.seed)
+        # backend is a board class such as Board or numpy_board.NumpyBoard; an
+        # existing board can be passed instead to continue from its position
+        self.board = board if board is not None else backend(rows, cols, num_colors)
+        # New games start with at least min_moves legal moves, on a board
+        # taken from the pool when one is given; pooled games take the pool's
+        # min_moves, as that is what their board was generated with
+        if pool is not None and (pool.rows, pool.cols, pool.num_colors, pool.backend) != (
+                self.board.rows, self.board.cols, self.board.num_colors, type(self.board)):
+            raise ValueError(f"Pool of {pool.rows}x{pool.cols} {pool.backend.__name__} boards with "
+                             f"{pool.num_colors} colors does not fit a {self.board.rows}x{self.board.cols} "
+                             f"{type(self.board).__name__} with {self.board.num_colors} colors")
+        self.min_moves = min_moves
+        self.pool = pool
+        self.score = 0
+        self.game_over = False
+
+        # With track_moves, legal moves live in a MoveIndex that is refreshed
+        # lazily for the cells changed since the last query
+        self.track_moves = track_moves
+        self.move_index: Optional[MoveIndex] = None
+        self.changed_cells: Set[Position] = set()
+        self.cleared_cells: List[Position] = []
+        # Only runs overlapping this region are looked for; None means no
+        # cell has changed since the last scan
+        self.dirty_region: Optional[Region] = None
+
+        # With special_candies, a swap's matches of four or more and crossing
+        # matches leave a special candy behind. specials holds the kind of
+        # every special candy on the board by cell, and last_swap the swap
+        # whose matches are about to be cleared, as that is where they go
+        self.special_candies = special_candies
+        self.specials: Dict[Position, int] = {}
+        self.last_swap: Tuple[Position, ...] = ()
+        self.created: List[SpecialCandy] = []
+
+        if board is None:
+            self.reset(seed)
+        else:
+            self.start()
+
+    @property
+    def rows(self) -> int:
+        return self.board.rows
+
+    @property
+    def cols(self) -> int:
+        return self.board.cols
+
+    def reset(self, seed: Optional[int] = None):
+        """Start a new game on a freshly generated or pooled board
+
+        With its own generator, or when a seed is given, the game gets a new
+        random.Random seeded with seed or a fresh seed.
+        """
+        if self.pool is not None and seed is None:
+            self.seed, self.board, self.rng, self.min_moves = self.pool.pop()
+        else:
+            if seed is not None or self.owns_rng:
+                self.seed = seed if seed is not None else new_seed()
+                self.rng = random.Random(self.seed)
+            self.board.fill(self.rng, self.min_moves)
+        # Generated boards have no matches, so the first scan only covers the first swap
+        self.resume(0, False)
+
+    def start(self):
+        """Start a new game on a board from outside, such as one passed to the constructor"""
+        self.resume(0, False)
+        # The board may hold matches already, so the first scan covers all of it
+        self.dirty_region = (0, self.rows - 1, 0, self.cols - 1)
+
+    def resume(self, score: int, game_over: bool):
+        """Continue a game from a settled board, such as one loaded from a snapshot"""
+        self.score = score
+        self.game_over = game_over
+        self.changed_cells = set()
+        self.cleared_cells = []
+        self.dirty_region = None
+        self.specials = {}
+        self.last_swap = ()
+        if self.track_moves:
+            self.move_index = MoveIndex(self.board)
+
+    def copy(self, rng=None) -> "GameEngine":
+        """Return an independent copy of the game, optionally drawing refills from another rng
+
+        Without rng the copy gets its own generator in the same state, so
+        simulating on it never moves the original's refills forward.
+        """
+        clone = copy.copy(self)
+        clone.board = self.board.copy()
+        if rng is None and hasattr(self.rng, "getstate"):
+            rng = random.Random()
+            rng.setstate(self.rng.getstate())
+        if rng is not None:
+            clone.rng = rng
+        clone.changed_cells = set(self.changed_cells)
+        clone.cleared_cells = list(self.cleared_cells)
+        clone.specials = dict(self.specials)
+        if self.move_index is not None:
+            clone.move_index = self.move_index.copy(clone.board)
+        return clone
+
+    def is_adjacent(self, pos1: Position, pos2: Position) -> bool:
+        """Check if two positions are adjacent"""
+        row1, col1 = pos1
+        row2, col2 = pos2
+        return (abs(row1 - row2) == 1 and col1 == col2) or \
+               (abs(col1 - col2) == 1 and row1 == row2)
+
+    def mark_dirty(self, top: int, bottom: int, left: int, right: int):
+        """Grow the region the next match scan looks at to cover a block of changed cells"""
+        if self.dirty_region is not None:
+            old_top, old_bottom, old_left, old_right = self.dirty_region
+            top, bottom = min(top, old_top), max(bottom, old_bottom)
+            left, right = min(left, old_left), max(right, old_right)
+        self.dirty_region = (top, bottom, left, right)
+
+    def swap_cells(self, pos1: Position, pos2: Position):
+        """Swap the candies at two cells on the board, special candies included"""
+        self.board.swap(pos1, pos2)
+        specials = self.specials
+        if specials and (pos1 in specials or pos2 in specials):
+            kind1 = specials.pop(pos1, 0)
+            kind2 = specials.pop(pos2, 0)
+            if kind2:
+                specials[pos1] = kind2
+            if kind1:
+                specials[pos2] = kind1
+
+    def mark_swapped(self, pos1: Position, pos2: Position):
+        """Mark the two cells of a swap as changed"""
+        (row1, col1), (row2, col2) = pos1, pos2
+        self.mark_dirty(min(row1, row2), max(row1, row2), min(col1, col2), max(col1, col2))
+        self.last_swap = (pos1, pos2)
+
+    def remove_matches(self) -> List[Position]:
+        """Clear the matches in the dirty region, add their score and return the cleared cells"""
+        if self.dirty_region is None:
+            return []
+        if self.special_candies:
+            return self.remove_special_matches()
+
+        matches = self.board.find_matches(self.dirty_region)
+        self.dirty_region = None
+        if matches:
+            self.board.clear(matches)
+            self.score += len(matches) * POINTS_PER_CANDY
+            self.cleared_cells.extend(matches)
+        return matches
+
+    def remove_special_matches(self) -> List[Position]:
+        """Clear the matches in the dirty region like remove_matches, making and setting off special candies
+
+        Each group of crossing runs made by the swap makes at most one special
+        candy, which stays on the board in place of one of its cells. Special
+        candies caught in the clear go off together with everything they
+        reach, so a whole chain is cleared as one wave instead of one rescan
+        per link.
+
+        Matches that fall into place during the cascade make no special
+        candies. On a large board, refills after row-wide and color-wide
+        clears would otherwise make new specials faster than they go off, and
+        the cascade would never settle.
+        """
+        runs = self.board.find_runs(self.dirty_region)
+        swapped = self.last_swap
+        self.dirty_region = None
+        self.last_swap = ()
+        self.created = []
+        if not runs:
+            return []
+
+        cleared: Set[Position] = set()
+        made: Dict[Position, int] = {}
+        bonus = 0
+        for group in group_runs(runs):
+            cleared.update(group.cells)
+            kind = special_for(group) if swapped else 0
+            if kind:
+                made[special_cell(group, swapped)] = kind
+                bonus += SPECIAL_BONUS[kind]
+
+        self.set_off_specials(cleared)
+        # New special candies are made once the chain has gone off, so they survive it
+        for cell, kind in made.items():
+            cleared.discard(cell)
+            self.specials[cell] = kind
+            self.created.append(SpecialCandy(cell[0], cell[1], kind))
+
+        matches = list(cleared)
+        self.board.clear(matches)
+        self.score += len(matches) * POINTS_PER_CANDY + bonus
+        self.cleared_cells.extend(matches)
+        return matches
+
+    def set_off_specials(self, cleared: Set[Position]):
+        """Add to cleared every cell reached by the special candies in it, following chains in one sweep
+
+        Each special candy goes off once, and each color is swept by a color
+        bomb at most once, from an index of the board built on first use.
+        """
+        specials = self.specials
+        if not specials:
+            return
+        if len(specials) < len(cleared):
+            pending = [cell for cell in specials if cell in cleared]
+        else:
+            pending = [cell for cell in cleared if cell in specials]
+        rows, cols = self.rows, self.cols
+        by_color: Optional[Dict[int, List[Position]]] = None
+        swept: Set[int] = set()
+
+        while pending:
+            row, col = cell = pending.pop()
+            kind = specials.pop(cell, 0)
+            if kind == STRIPED_ROW:
+                reached = [(row, c) for c in range(cols)]
+            elif kind == STRIPED_COL:
+                reached = [(r, col) for r in range(rows)]
+            elif kind == WRAPPED:
+                reached = [(r, c) for r in range(max(row - 1, 0), min(row + 2, rows))
+                           for c in range(max(col - 1, 0), min(col + 2, cols))]
+            elif kind == COLOR_BOMB:
+                color = self.board.get(row, col)
+                if color in swept:
+                    continue
+                swept.add(color)
+                if by_color is None:
+                    by_color = self.cells_by_color()
+                reached = by_color.get(color, [])
+            else:
+                continue
+
+            for target in reached:
+                if target not in cleared:
+                    cleared.add(target)
+                    if target in specials:
+                        pending.append(target)
+
+    def cells_by_color(self) -> Dict[int, List[Position]]:
+        """Every cell of the board, grouped by color, from one read of its bytes"""
+        data = self.board.to_bytes()
+        cols = self.cols
+        cells: Dict[int, List[Position]] = {}
+        for color in range(self.board.num_colors):
+            found = cells[color] = []
+            index = data.find(color)
+            while index >= 0:
+                found.append(divmod(index, cols))
+                index = data.find(color, index + 1)
+        return cells
+
+    def drop_specials(self):
+        """Move the special candies down with the candies falling into the cleared cells"""
+        holes: Dict[int, List[int]] = {}
+        for row, col in self.cleared_cells:
+            holes.setdefault(col, []).append(row)
+        moved = {}
+        for (row, col), kind in self.specials.items():
+            below = holes.get(col)
+            moved[(row + sum(hole > row for hole in below) if below else row, col)] = kind
+        self.specials = moved
+
+    def apply_gravity(self):
+        """Let candies fall and refill the board"""
+        if not self.cleared_cells:
+            self.board.apply_gravity(self.rng)
+            return
+
+        if self.specials:
+            self.drop_specials()
+
+        # Gravity changes each affected column from the top down to its lowest cleared cell
+        lowest = {}
+        for row, col in self.cleared_cells:
+            lowest[col] = max(row, lowest.get(col, row))
+        self.board.apply_gravity(self.rng, sorted(lowest))
+        self.mark_dirty(0, max(lowest.values()), min(lowest), max(lowest))
+
+        if self.move_index is not None:
+            for col, bottom in lowest.items():
+                self.changed_cells.update((row, col) for row in range(bottom + 1))
+        self.cleared_cells = []
+
+    def settle(self) -> Tuple[List[Fall], List[Spawn]]:
+        """Apply gravity, returning the candies that fell and the ones spawned"""
+        holes: Dict[int, Set[int]] = {}
+        for row, col in self.cleared_cells:
+            holes.setdefault(col, set()).add(row)
+
+        falls = []
+        spawned = {}
+        for col in sorted(holes):
+            rows = holes[col]
+            empty_count = 0
+            for row in range(max(rows), -1, -1):
+                if row in rows:
+                    empty_count += 1
+                elif empty_count > 0:
+                    falls.append(Fall(col, row, row + empty_count))
+            spawned[col] = empty_count
+
+        self.apply_gravity()
+        get = self.board.get
+        spawns = [Spawn(row, col, get(row, col)) for col, count in spawned.items() for row in range(count)]
+        return falls, spawns
+
+    def refresh_moves(self):
+        """Bring the move index up to date with the cells changed since the last query"""
+        if self.changed_cells:
+            self.move_index.update(self.changed_cells)
+            self.changed_cells = set()
+
+    def legal_moves(self, limit: Optional[int] = None) -> List[Move]:
+        """List the swaps that would create a match"""
+        if self.move_index is None:
+            return self.board.legal_moves(limit)
+
+        self.refresh_moves()
+        if limit is None:
+            return sorted(self.move_index.moves)
+        return heapq.nsmallest(limit, self.move_index.moves)
+
+    def has_valid_moves(self) -> bool:
+        """Check if any swap would create a match"""
+        if self.move_index is None:
+            return self.board.has_valid_moves()
+
+        self.refresh_moves()
+        return len(self.move_index) > 0
+
+    def check_game_over(self) -> bool:
+        """Flag the game as over when no valid moves remain"""
+        if not self.game_over and not self.has_valid_moves():
+            self.game_over = True
+        return self.game_over
+
+    def cascade(self, move: Move, waves: Optional[List[Wave]] = None) -> Optional[Tuple[int, int, int]]:
+        """Swap two candies and clear matches until the board settles
+
+        Returns the score gained, the number of cascade steps and the cells
+        cleared, or None for a swap that makes no match, which is swapped
+        back. Each wave is appended to waves when a list is given; without
+        one the falls and spawns are not worked out at all.
+        """
+        pos1, pos2 = move
+        if not self.is_adjacent(pos1, pos2):
+            raise ValueError(f"Cells {pos1} and {pos2} are not adjacent")
+
+        self.swap_cells(pos1, pos2)
+        self.mark_swapped(pos1, pos2)
+        score_before = self.score
+        matches = self.remove_matches()
+
+        if not matches:
+            # Invalid swap, swap back; the board is unchanged
+            self.swap_cells(pos1, pos2)
+            return None
+
+        if self.move_index is not None:
+            self.changed_cells.update((pos1, pos2))
+
+        cascades = 0
+        cleared = 0
+        wave_start = score_before
+        while matches:
+            cascades += 1
+            cleared += len(matches)
+            if waves is None:
+                self.apply_gravity()
+            else:
+                created = self.created
+                falls, spawns = self.settle()
+                waves.append(Wave(matches, self.score - wave_start, falls, spawns, created))
+                wave_start = self.score
+            matches = self.remove_matches()
+        return self.score - score_before, cascades, cleared
+
+    def step(self, move: Move) -> StepResult:
+        """Resolve a move instantly, including the whole cascade"""
+        outcome = self.cascade(move)
+        if outcome is None:
+            return StepResult(False, 0, 0, 0, self.game_over)
+
+        self.check_game_over()
+        return StepResult(True, *outcome, self.game_over)
+
+    def resolve(self, move: Move, detect_game_over: bool = True) -> Resolution:
+        """Resolve a move instantly like step, also returning every wave of the cascade
+
+        The board ends in the same state as after step; the waves let a
+        renderer animate the cascade afterwards without touching the rules.
+        With detect_game_over False the caller runs check_game_over itself,
+        for instance to time it apart from the cascade.
+        """
+        waves: List[Wave] = []
+        outcome = self.cascade(move, waves)
+        if outcome is None:
+            return Resolution(False, 0, 0, 0, self.game_over, [])
+
+        if detect_game_over:
+            self.check_game_over()
+        return Resolution(True, *outcome, self.game_over, waves)
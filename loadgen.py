@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from engine import GRID_SIZE, NUM_COLORS, Board, Position
+from profiler import RollingStats
+from server import DEFAULT_HOST, DEFAULT_PORT, LINE_LIMIT, LineWriter
+
+LATENCY_WINDOW = 1_000_000  # Latency samples kept for the percentiles
+MOVE_CANDIDATES = 4  # Legal moves a simulated player picks from
+CONNECT_TIMEOUT = 10.0  # Seconds to wait for a spawned server to listen
+
+
+class ServerError(Exception):
+    """Raised when the server answers a request with an error"""
+
+
+class Connection:
+    """One TCP connection carrying the requests of many sessions, matched to replies by id"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.lines = LineWriter(writer)
+        self.ids = itertools.count()
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.reading = asyncio.create_task(self.read_replies())
+
+    @classmethod
+    async def open(cls, host: str, port: int) -> "Connection":
+        reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT * 64)
+        return cls(reader, writer)
+
+    async def request(self, **fields) -> Dict:
+        """Send a request and wait for its reply"""
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.lines.write(json.dumps({"id": request_id, **fields}, separators=(",", ":")).encode() + b"\n")
+        reply = await future
+        if "error" in reply:
+            raise ServerError(reply["error"])
+        return reply
+
+    async def read_replies(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            future = self.pending.pop(reply.get("id"), None)
+            if future is not None:
+                future.set_result(reply)
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("Server closed the connection"))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        await self.reading
+
+
+def swap_specials(specials: Dict[Position, int], pos1: Position, pos2: Position):
+    """Move the special candies of a copy of a board along with a swap"""
+    kind1 = specials.pop(pos1, 0)
+    kind2 = specials.pop(pos2, 0)
+    if kind2:
+        specials[pos1] = kind2
+    if kind1:
+        specials[pos2] = kind1
+
+
+def apply_waves(board: Board, waves: List, specials: Dict[Position, int]):
+    """Bring a copy of a board and its special candies up to date with the cascade waves of a swap reply"""
+    grid = board.grid
+    for cleared, _, falls, spawns, made in waves:
+        for row, col in cleared:
+            grid[row][col] = None
+        if specials:
+            for row, col in cleared:
+                specials.pop((row, col), None)
+        for row, col, kind in made:
+            specials[(row, col)] = kind
+        for col, from_row, to_row in falls:
+            grid[to_row][col] = grid[from_row][col]
+            grid[from_row][col] = None
+            if specials and (from_row, col) in specials:
+                specials[(to_row, col)] = specials.pop((from_row, col))
+        for row, col, color in spawns:
+            grid[row][col] = color
+
+
+class LoadStats:
+    """Moves, latencies and copies that fell out of step, over all sessions"""
+
+    def __init__(self):
+        self.latency = RollingStats(LATENCY_WINDOW)
+        self.moves = 0
+        self.games = 0
+        self.invalid = 0
+        self.out_of_step = 0
+        self.elapsed = 0.0
+
+
+async def run_session(connection: Connection, args: argparse.Namespace, rng: random.Random, stats: LoadStats,
+                      deadline: float):
+    """Play random legal moves in one session until the deadline, keeping a copy of its board"""
+    board = Board(args.rows, args.cols, args.colors)
+    specials: Dict[Position, int] = {}
+
+    reply = await connection.request(op="new", rows=args.rows, cols=args.cols, colors=args.colors,
+                                     backend=args.backend, seed=rng.getrandbits(64), specials=args.specials)
+    session = reply["session"]
+    board.load_bytes(bytes.fromhex(reply["board"]))
+
+    while time.perf_counter() < deadline:
+        moves = board.legal_moves(limit=MOVE_CANDIDATES)
+        if not moves:
+            reply = await connection.request(op="reset", session=session)
+            board.load_bytes(bytes.fromhex(reply["board"]))
+            specials.clear()
+            stats.games += 1
+            continue
+
+        move = rng.choice(moves)
+        start = time.perf_counter()
+        reply = await connection.request(op="swap", session=session, move=move)
+        stats.latency.add(time.perf_counter() - start)
+        stats.moves += 1
+
+        if not reply["valid"]:
+            stats.invalid += 1
+            continue
+        board.swap(*move)
+        swap_specials(specials, *move)
+        apply_waves(board, reply["waves"], specials)
+
+    # The copy kept from the streamed waves must match the server's board
+    reply = await connection.request(op="state", session=session)
+    if (bytes.fromhex(reply["board"]) != board.to_bytes()
+            or {(row, col): kind for row, col, kind in reply["specials"]} != specials):
+        stats.out_of_step += 1
+    await connection.request(op="close", session=session)
+
+
+async def wait_for_server(host: str, port: int):
+    """Wait until something listens on host and port"""
+    give_up = time.perf_counter() + CONNECT_TIMEOUT
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.perf_counter() > give_up:
+                raise
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        await writer.wait_closed()
+        return
+
+
+async def generate_load(args: argparse.Namespace) -> LoadStats:
+    connections = [await Connection.open(args.host, args.port) for _ in range(min(args.connections, args.sessions))]
+    stats = LoadStats()
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        run_session(connections[number % len(connections)], args, random.Random(rng.getrandbits(64)), stats,
+                    deadline)
+        for number in range(args.sessions)
+    ))
+    stats.elapsed = time.perf_counter() - start
+
+    for connection in connections:
+        await connection.close()
+    return stats
+
+
+def report(args: argparse.Namespace, stats: LoadStats) -> Dict:
+    latency = stats.latency.summary(1000.0)
+    return {
+        "sessions": args.sessions,
+        "connections": min(args.connections, args.sessions),
+        "board": f"{args.rows}x{args.cols}",
+        "backend": args.backend,
+        "specials": args.specials,
+        "seconds": stats.elapsed,
+        "moves": stats.moves,
+        "moves_per_sec": stats.moves / stats.elapsed,
+        "latency_ms": {key: value for key, value in latency.items() if key != "count"},
+        "games_restarted": stats.games,
+        "invalid_moves": stats.invalid,
+        "out_of_step": stats.out_of_step,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive many sessions of a game server with random legal moves")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=50, help="TCP connections the sessions share")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds each session keeps playing")
+    parser.add_argument("--rows", type=int, default=GRID_SIZE)
+    parser.add_argument("--cols", type=int, default=GRID_SIZE)
+    parser.add_argument("--colors", type=int, default=NUM_COLORS)
+    parser.add_argument("--backend", default="list", help="board backend the server uses")
+    parser.add_argument("--specials", action="store_true", help="play with special candies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn", action="store_true", help="start server.py in a subprocess for the run")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server: Optional[subprocess.Popen] = None
+    if args.spawn:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        server = subprocess.Popen([sys.executable, script, "--host", args.host, "--port", str(args.port)],
+                                  stdout=subprocess.DEVNULL)
+    try:
+        if server is not None:
+            asyncio.run(wait_for_server(args.host, args.port))
+        stats = asyncio.run(generate_load(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    result = report(args, stats)
+    latency = result["latency_ms"]
+    print(f"{result['sessions']} sessions on {result['connections']} connections, {result['board']} "
+          f"{result['backend']}: {result['moves']} moves in {result['seconds']:.1f} s, "
+          f"{result['moves_per_sec']:.0f} moves/s")
+    if latency:
+        print(f"latency ms: p50 {latency['p50']:.2f} p95 {latency['p95']:.2f} p99 {latency['p99']:.2f} "
+              f"max {latency['max']:.2f}")
+    print(f"{result['games_restarted']} games restarted, {result['invalid_moves']} invalid moves, "
+          f"{result['out_of_step']} boards out of step")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    return 1 if result["invalid_moves"] or result["out_of_step"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from engine import (EMPTY_BYTE, GRID_SIZE, NUM_COLORS, Move, Position, Region, Run, cell_in_run, fill_cells,
+                    runs_from_cells, swap_in_run)
+
+# Color value stored in empty cells
+EMPTY = -1
+
+
+def row_runs(cells: np.ndarray) -> np.ndarray:
+    """Mark every cell in a run of 3 or more along the last axis"""
+    mask = np.zeros(cells.shape, dtype=bool)
+
+    # A run of 3 starts wherever a cell equals its two right neighbors
+    left, middle, right = cells[..., :-2], cells[..., 1:-1], cells[..., 2:]
+    starts = (left >= 0) & (left == middle) & (middle == right)
+    mask[..., :-2] |= starts
+    mask[..., 1:-1] |= starts
+    mask[..., 2:] |= starts
+    return mask
+
+
+def match_mask(cells: np.ndarray) -> np.ndarray:
+    """Mark every cell in a horizontal or vertical run of 3 or more
+
+    Works on the last two axes, so a stack of boards can be checked at once.
+    """
+    return row_runs(cells) | row_runs(cells.swapaxes(-1, -2)).swapaxes(-1, -2)
+
+
+def band_runs(lines: np.ndarray, first: int, last: int, start: int, stop: int) -> List[Position]:
+    """Cells of the runs in lines first..last that overlap positions start..stop
+
+    Returns (line, position) pairs. Only a band two cells wider than the span
+    is checked, which holds 3 cells of every run through the span; runs cut
+    off at the band edges are then followed along their line.
+    """
+    length = lines.shape[1]
+    low, high = max(0, start - 2), min(length, stop + 3)
+    found = row_runs(lines[first:last + 1, low:high])
+    line_offsets, positions = np.nonzero(found)
+    cells = list(zip((line_offsets + first).tolist(), (positions + low).tolist()))
+
+    if low > 0:
+        for offset in np.nonzero(found[:, 0])[0].tolist():
+            line = lines[first + offset]
+            index = low - 1
+            while index >= 0 and line[index] == line[low]:
+                cells.append((first + offset, index))
+                index -= 1
+    if high < length:
+        for offset in np.nonzero(found[:, -1])[0].tolist():
+            line = lines[first + offset]
+            index = high
+            while index < length and line[index] == line[high - 1]:
+                cells.append((first + offset, index))
+                index += 1
+    return cells
+
+
+# Pairs of neighbor offsets that form a run of 3 with a cell, keyed by the
+# neighbor a swapped-in candy comes from. Pairs through that neighbor are left
+# out, since it holds the other candy after the swap.
+RUN_PAIRS = {
+    (0, -1): [((0, 1), (0, 2)), ((-1, 0), (-2, 0)), ((1, 0), (2, 0)), ((-1, 0), (1, 0))],
+    (0, 1): [((0, -1), (0, -2)), ((-1, 0), (-2, 0)), ((1, 0), (2, 0)), ((-1, 0), (1, 0))],
+    (-1, 0): [((1, 0), (2, 0)), ((0, -1), (0, -2)), ((0, 1), (0, 2)), ((0, -1), (0, 1))],
+    (1, 0): [((-1, 0), (-2, 0)), ((0, -1), (0, -2)), ((0, 1), (0, 2)), ((0, -1), (0, 1))],
+}
+
+
+def legal_swaps(cells: np.ndarray):
+    """Find every swap that completes a run, using the known 3-cell patterns
+
+    Returns (horizontal, vertical) boolean arrays, where horizontal[..., r, c]
+    is the swap of (r, c) with (r, c + 1) and vertical[..., r, c] the swap of
+    (r, c) with (r + 1, c). Works on the last two axes like match_mask.
+    """
+    rows, cols = cells.shape[-2:]
+    padding = [(0, 0)] * (cells.ndim - 2) + [(2, 2), (2, 2)]
+    padded = np.pad(cells, padding, constant_values=EMPTY)
+
+    def shifted(dr: int, dc: int) -> np.ndarray:
+        return padded[..., 2 + dr:2 + dr + rows, 2 + dc:2 + dc + cols]
+
+    def completes(source) -> np.ndarray:
+        # The candy arriving at each cell from its neighbor at offset source
+        color = shifted(*source)
+        found = np.zeros(cells.shape, dtype=bool)
+        for first, second in RUN_PAIRS[source]:
+            found |= (shifted(*first) == color) & (shifted(*second) == color)
+        return found & (color >= 0) & (cells >= 0) & (cells != color)
+
+    horizontal = completes((0, -1))[..., :, 1:] | completes((0, 1))[..., :, :-1]
+    vertical = completes((-1, 0))[..., 1:, :] | completes((1, 0))[..., :-1, :]
+    return horizontal, vertical
+
+
+def compact_columns(cells: np.ndarray) -> np.ndarray:
+    """Return a copy with every column's candies dropped below its empty cells
+
+    A stable sort on "is filled" keeps the candies of a column in order.
+    """
+    order = np.argsort(cells >= 0, axis=-2, kind="stable")
+    return np.take_along_axis(cells, order, axis=-2)
+
+
+class NumpyBoard:
+    """Board backend that keeps colors in an integer NumPy array
+
+    Whole-board work (find_matches, legal_moves, gravity) runs on the array.
+    Single-cell reads and swaps, which the engine and the move index make
+    one at a time, go through a flat byte view of the same memory instead,
+    since indexing an array element by element costs far more than a list.
+    The array is only ever written in place, so the view stays valid.
+
+    The whole-array calls have a fixed cost that list boards do not, so
+    this backend pays off from about 32x32 for full scans and gravity and
+    from about 128x128 for a whole engine step; use Board below that.
+    """
+
+    def __init__(self, rows: int = GRID_SIZE, cols: int = GRID_SIZE, num_colors: int = NUM_COLORS):
+        self.rows = rows
+        self.cols = cols
+        self.num_colors = num_colors
+        self.cells = np.full((rows, cols), EMPTY, dtype=np.int8)
+        # Unsigned, so empty cells read as EMPTY_BYTE like the byte format
+        self.flat = memoryview(self.cells.reshape(-1)).cast("B")
+
+    def get(self, row: int, col: int) -> Optional[int]:
+        """Return the color index at a cell, or None if it is empty"""
+        color = self.flat[row * self.cols + col]
+        return None if color == EMPTY_BYTE else color
+
+    def copy(self) -> "NumpyBoard":
+        """Return an independent copy of the board"""
+        board = NumpyBoard(self.rows, self.cols, self.num_colors)
+        board.cells[...] = self.cells
+        return board
+
+    def to_bytes(self) -> bytes:
+        """Return the colors row by row, one byte per cell"""
+        # EMPTY is -1, which is 0xFF as a byte like engine.EMPTY_BYTE
+        return self.cells.tobytes()
+
+    def load_bytes(self, data: bytes):
+        """Set the colors from one byte per cell, in place"""
+        self.cells[...] = np.frombuffer(data, dtype=np.int8).reshape(self.rows, self.cols)
+
+    def fill(self, rng, min_moves: int = 1):
+        """Fill the board with random colors, without any match and with at least min_moves legal moves"""
+        # Drawn straight into the array through its byte view
+        fill_cells(self.flat, self.rows, self.cols, self.num_colors, rng, min_moves)
+
+    def would_create_match(self, row: int, col: int) -> bool:
+        """Check if the candy at this cell is part of a run of 3 or more"""
+        return cell_in_run(self.flat, self.rows, self.cols, row, col)
+
+    def find_matches(self, region: Optional[Region] = None) -> List[Position]:
+        """Find all matches on the board, or only the runs that overlap a region"""
+        if region is None:
+            rows, cols = np.nonzero(match_mask(self.cells))
+            return list(zip(rows.tolist(), cols.tolist()))
+
+        top, bottom, left, right = region
+        matches = set(band_runs(self.cells, top, bottom, left, right))
+        matches.update((row, col) for col, row in band_runs(self.cells.T, left, right, top, bottom))
+        return list(matches)
+
+    def find_runs(self, region: Optional[Region] = None) -> List[Run]:
+        """Find the runs behind find_matches, in one pass over the matched cells"""
+        return runs_from_cells(self.find_matches(region), self.get, region)
+
+    def swap_creates_match(self, pos1: Position, pos2: Position) -> bool:
+        """Check if swapping two cells would create a match, looking only at their rows and columns"""
+        return swap_in_run(self.flat, self.rows, self.cols, pos1, pos2)
+
+    def legal_moves(self, limit: Optional[int] = None) -> List[Move]:
+        """List the swaps that create a match, stopping after limit moves if given"""
+        horizontal, vertical = legal_swaps(self.cells)
+        moves = []
+        for (row, col), dr, dc in sorted(
+            [(pos, 0, 1) for pos in zip(*np.nonzero(horizontal))]
+            + [(pos, 1, 0) for pos in zip(*np.nonzero(vertical))]
+        ):
+            row, col = int(row), int(col)
+            moves.append(((row, col), (row + dr, col + dc)))
+            if limit is not None and len(moves) >= limit:
+                break
+        return moves
+
+    def has_valid_moves(self) -> bool:
+        """Check if there are any valid moves left on the board"""
+        horizontal, vertical = legal_swaps(self.cells)
+        return bool(horizontal.any() or vertical.any())
+
+    def swap(self, pos1: Position, pos2: Position):
+        """Swap the candies at two cells"""
+        flat = self.flat
+        index1 = pos1[0] * self.cols + pos1[1]
+        index2 = pos2[0] * self.cols + pos2[1]
+        flat[index1], flat[index2] = flat[index2], flat[index1]
+
+    def clear(self, cells: List[Position]):
+        """Empty the given cells"""
+        if cells:
+            rows, cols = zip(*cells)
+            self.cells[list(rows), list(cols)] = EMPTY
+
+    def apply_gravity(self, rng, columns: Optional[Iterable[int]] = None):
+        """Make candies fall into empty cells and refill each column from the top
+
+        columns, in increasing order, limits the work to the columns that have
+        empty cells.
+        """
+        if columns is None:
+            self.cells[...] = compact_columns(self.cells)
+            cols, rows = np.nonzero(self.cells.T == EMPTY)
+        else:
+            columns = np.fromiter(columns, dtype=np.intp)
+            self.cells[:, columns] = compact_columns(self.cells[:, columns])
+            offsets, rows = np.nonzero(self.cells[:, columns].T == EMPTY)
+            cols = columns[offsets]
+
+        # Refill column by column, top to bottom, so a shared rng gives the same board as Board
+        if len(rows):
+            self.cells[rows, cols] = [rng.randint(0, self.num_colors - 1) for _ in range(len(rows))]
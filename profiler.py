@@ -0,0 +1,157 @@
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+# Frame phases in the order the main loop runs them
+PHASES = ["event", "update", "draw", "flip", "tick"]
+
+
+class RollingStats:
+    """The most recent samples of one metric, with percentiles over them"""
+
+    def __init__(self, window: int):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+
+    def summary(self, scale: float = 1.0) -> Dict[str, float]:
+        """Mean, p50, p95, p99 and max of the window, multiplied by scale"""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": self.count}
+
+        def percentile(fraction: float) -> float:
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * scale
+
+        return {
+            "count": self.count,
+            "mean": sum(ordered) / len(ordered) * scale,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": ordered[-1] * scale,
+        }
+
+
+class FrameProfiler:
+    """Opt-in per-frame timings and per-move cascade counts for CandyCrush
+
+    The renderer only calls into the profiler when one is attached, so a game
+    without one pays a None check per instrumented spot. Summaries cover the
+    last window samples of each metric and are appended to a JSONL file every
+    export_every frames, or shown on screen with overlay.
+    """
+
+    def __init__(self, window: int = 600, export_path: Optional[str] = None, export_every: int = 60,
+                 overlay: bool = False, overlay_every: int = 15):
+        self.window = window
+        self.export_every = export_every
+        self.overlay = overlay
+        self.overlay_every = overlay_every
+        self.export_file = open(export_path, "a") if export_path else None
+
+        self.metrics: Dict[str, RollingStats] = {}
+        self.frames = 0
+        self.exported_frames = 0
+        self.frame_start = self.lap_start = time.perf_counter()
+        self.phases: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+
+        # Wall time spent in each animation state, from entering it to leaving it
+        self.state: Optional[str] = None
+        self.state_start = self.frame_start
+
+        # Match waves and cleared candies of the move being resolved
+        self.move_cascades = 0
+        self.move_cleared = 0
+
+    def add(self, name: str, value: float):
+        """Add a sample to a metric"""
+        stats = self.metrics.get(name)
+        if stats is None:
+            stats = self.metrics[name] = RollingStats(self.window)
+        stats.add(value)
+
+    def begin_frame(self):
+        self.frame_start = self.lap_start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    def lap(self, phase: str) -> float:
+        """Charge the time since the previous lap to a phase of the current frame"""
+        now = time.perf_counter()
+        elapsed = now - self.lap_start
+        self.lap_start = now
+        self.phases[phase] += elapsed
+        return elapsed
+
+    def end_frame(self, state: str):
+        """Record the frame's phases and total, and the animation state it ended in"""
+        now = time.perf_counter()
+        for phase, seconds in self.phases.items():
+            self.add(phase, seconds)
+        self.add("frame", now - self.frame_start)
+        self.frames += 1
+
+        if state != self.state:
+            if self.state is not None:
+                self.add("state_time." + self.state, now - self.state_start)
+            self.state = state
+            self.state_start = now
+
+        if self.export_file is not None and self.frames - self.exported_frames >= self.export_every:
+            self.export()
+
+    def overlay_due(self) -> bool:
+        """Check if the on-screen overlay should be refreshed after this frame"""
+        return self.overlay and self.frames % self.overlay_every == 0
+
+    def count_wave(self, cleared: int):
+        """Count one wave of matches of the current move"""
+        self.move_cascades += 1
+        self.move_cleared += cleared
+
+    def end_move(self):
+        """Record the cascades and cleared candies of a move that has settled"""
+        self.add("cascades_per_move", self.move_cascades)
+        self.add("cleared_per_move", self.move_cleared)
+        self.move_cascades = 0
+        self.move_cleared = 0
+
+    def summary(self) -> Dict:
+        """Rolling statistics of every metric; times are in milliseconds"""
+        counts = ("cascades_per_move", "cleared_per_move")
+        return {
+            "time": time.time(),
+            "frames": self.frames,
+            "metrics": {
+                name: stats.summary(1.0 if name in counts else 1000.0)
+                for name, stats in sorted(self.metrics.items())
+            },
+        }
+
+    def export(self):
+        """Append the current summary as one JSON line"""
+        self.export_file.write(json.dumps(self.summary()) + "\n")
+        self.export_file.flush()
+        self.exported_frames = self.frames
+
+    def overlay_lines(self) -> List[str]:
+        """Short text lines with the p50/p95/p99 of the main metrics"""
+        lines = []
+        for name in ["frame"] + PHASES + ["resolve", "has_valid_moves", "cascades_per_move", "cleared_per_move"]:
+            stats = self.metrics.get(name)
+            if stats is None or not stats.samples:
+                continue
+            summary = stats.summary(1.0 if name.endswith("_per_move") else 1000.0)
+            lines.append(f"{name}: {summary['p50']:.2f} / {summary['p95']:.2f} / {summary['p99']:.2f}")
+        return lines
+
+    def close(self):
+        if self.export_file is not None:
+            if self.frames > self.exported_frames:
+                self.export()
+            self.export_file.close()
+            self.export_file = None
@@ -0,0 +1,201 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Union
+
+from replay import Replay, play, read_replays
+
+DEFAULT_SEGMENT_MOVES = 20
+
+# Per-process state, set up once by init_worker
+_config: Dict = {}
+
+
+class Segment(NamedTuple):
+    """A run of a replay's moves, rendered by one worker"""
+    index: int
+    start: int
+    end: int
+
+
+class SegmentResult(NamedTuple):
+    index: int
+    frames: int
+    width: int
+    height: int
+
+
+class RenderResult(NamedTuple):
+    """Frames written by render and their size in pixels"""
+    frames: int
+    width: int
+    height: int
+
+
+def init_worker(config: Dict):
+    """Store the render settings in a worker process, before pygame is imported"""
+    global _config
+    _config = config
+    # Frames are only ever read back from the offscreen display surface
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    # SDL would turn SIGTERM into a quit event, and Pool.terminate() would then wait forever
+    os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+
+
+def split(start: int, end: int, size: int) -> List[Segment]:
+    """Cut moves start to end into segments of size moves; an empty range still renders its opening frame"""
+    return [Segment(index, first, min(first + size, end))
+            for index, first in enumerate(range(start, max(end, start + 1), size))]
+
+
+def segment_engine(replay: Replay, start: int):
+    """Headless engine at the position just before move start"""
+    return play(replay._replace(moves=replay.moves[:start], scores=replay.scores[:start]))
+
+
+def png_path(directory: str, segment: int, frame: int) -> str:
+    return os.path.join(directory, f"segment{segment:05d}_{frame:06d}.png")
+
+
+def raw_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"segment{segment:05d}.rgb")
+
+
+def render_segment(segment: Segment) -> SegmentResult:
+    """Animate one segment's moves as fast as possible, writing every frame"""
+    import candy_crush
+
+    replay = _config["replay"]
+    directory = _config["directory"]
+    game = candy_crush.CandyCrush(segment_engine(replay, segment.start), cell_size=_config["cell_size"])
+    pygame = candy_crush.pygame
+    screen = game.screen
+
+    raw = open(raw_path(directory, segment.index), "wb") if _config["format"] == "raw" else None
+    frames = 0
+
+    def capture():
+        nonlocal frames
+        if raw is None:
+            pygame.image.save(screen, png_path(directory, segment.index, frames))
+        else:
+            raw.write(pygame.image.tobytes(screen, "RGB"))
+        frames += 1
+
+    game.draw()
+    if segment.start == 0:
+        # The opening board; later segments start where the previous one settled
+        capture()
+
+    # The same update/draw loop as CandyCrush.run, without events or the clock
+    game.playback.extend(zip(replay.moves[segment.start:segment.end], replay.scores[segment.start:segment.end]))
+    while game.animation_state != "idle" or (game.playback and not game.game_over):
+        game.update()
+        game.draw()
+        capture()
+
+    if raw is not None:
+        raw.close()
+    return SegmentResult(segment.index, frames, screen.get_width(), screen.get_height())
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Render a recorded game's animation offline, as fast as possible")
+    parser.add_argument("replays", help="file of replays written by write_replays")
+    parser.add_argument("--game", type=int, default=0, help="which game of the replay file to render")
+    parser.add_argument("--start", type=int, default=0, help="first move to render")
+    parser.add_argument("--end", type=int, help="move to stop before (default: the last)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--png", metavar="DIR", help="write frame_000000.png, ... to this directory")
+    output.add_argument("--raw", metavar="FILE", help="write raw RGB24 frames to this file, or - for stdout")
+    parser.add_argument("--cell-size", type=int, help="cell size in pixels (default: the game's)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="worker processes")
+    parser.add_argument("--segment-moves", type=int, default=DEFAULT_SEGMENT_MOVES, help="moves per worker task")
+    return parser.parse_args(argv)
+
+
+def render(replay: Replay, output: Union[str, BinaryIO], format: str = "raw", workers: Optional[int] = None,
+           cell_size: Optional[int] = None, start: int = 0, end: Optional[int] = None,
+           segment_moves: int = DEFAULT_SEGMENT_MOVES) -> RenderResult:
+    """Render moves start to end of a replay, in segments spread over a pool of worker processes
+
+    With format "png", output is a directory that gets frame_000000.png, ...;
+    with "raw", it is a file name or a binary file that gets RGB24 frames.
+    workers defaults to one per CPU; the frames are the same for any count.
+    """
+    import candy_crush
+
+    if format not in ("png", "raw"):
+        raise ValueError(f"Unknown format {format!r}")
+    end = len(replay.moves) if end is None else min(end, len(replay.moves))
+    segments = split(start, end, segment_moves)
+
+    total = 0
+    size = (0, 0)
+    with tempfile.TemporaryDirectory() as scratch:
+        if format == "png":
+            os.makedirs(output, exist_ok=True)
+        config = {
+            "replay": replay,
+            "cell_size": cell_size or candy_crush.CELL_SIZE,
+            "format": format,
+            "directory": output if format == "png" else scratch,
+        }
+        stream = None
+        if format == "raw":
+            stream = open(output, "wb") if isinstance(output, (str, os.PathLike)) else output
+
+        try:
+            with multiprocessing.Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+                # imap keeps segment order, so each one is appended as soon as those before it are done
+                for result in pool.imap(render_segment, segments):
+                    if stream is None:
+                        for frame in range(result.frames):
+                            os.replace(png_path(output, result.index, frame),
+                                       os.path.join(output, f"frame_{total + frame:06d}.png"))
+                    else:
+                        path = raw_path(scratch, result.index)
+                        with open(path, "rb") as segment_file:
+                            shutil.copyfileobj(segment_file, stream)
+                        os.remove(path)
+                    total += result.frames
+                    size = (result.width, result.height)
+        finally:
+            if stream is not None and stream is not output:
+                stream.close()
+
+    return RenderResult(total, *size)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import candy_crush
+
+    with open(args.replays, "rb") as f:
+        replay = list(read_replays(f.read()))[args.game]
+    end = len(replay.moves) if args.end is None else min(args.end, len(replay.moves))
+
+    started = time.perf_counter()
+    if args.png:
+        output, output_format = args.png, "png"
+    else:
+        output, output_format = sys.stdout.buffer if args.raw == "-" else args.raw, "raw"
+    total, width, height = render(replay, output, output_format, workers=args.workers, cell_size=args.cell_size,
+                                  start=args.start, end=end, segment_moves=args.segment_moves)
+
+    seconds = time.perf_counter() - started
+    print(f"{total} frames of {width}x{height} for moves {args.start} to {end} in {seconds:.1f} s "
+          f"({total / seconds:.0f} frames/s, {total / candy_crush.FPS / seconds:.1f}x real time)", file=sys.stderr)
+    if args.raw:
+        print(f"encode with: ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {candy_crush.FPS} "
+              f"-i {args.raw} out.mp4", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import argparse
+import struct
+import sys
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
+from engine import Board, GameEngine, Move
+
+# Game settings at the start of every replay:
+# rows, cols, num_colors, min_moves, seed, number of moves
+HEADER = struct.Struct("<HHBBQI")
+SPECIALS_FLAG = 0x80  # High bit of the min_moves byte, set for games with special candies
+
+
+def write_varint(out: bytearray, value: int):
+    """Append an unsigned integer in 7-bit groups, low group first"""
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset: int) -> Tuple[int, int]:
+    """Read an integer written by write_varint, returning it and the next offset"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ReplayMismatch(Exception):
+    """Raised when a replayed move does not score what was recorded"""
+
+
+class Replay(NamedTuple):
+    """Everything needed to play a game again: its settings, seed and moves
+
+    Each move is stored with the score it earned, so playback can check that
+    the engine still resolves it the same way.
+    """
+    rows: int
+    cols: int
+    num_colors: int
+    min_moves: int
+    seed: int
+    moves: List[Move]
+    scores: List[int]
+    special_candies: bool = False
+
+    def to_bytes(self) -> bytes:
+        """Encode as a header followed by a varint swap code and score per move"""
+        if self.min_moves >= SPECIALS_FLAG:
+            raise ValueError(f"Replays store min_moves below {SPECIALS_FLAG}, not {self.min_moves}")
+        flags = SPECIALS_FLAG if self.special_candies else 0
+        out = bytearray(HEADER.pack(self.rows, self.cols, self.num_colors, self.min_moves | flags, self.seed,
+                                    len(self.moves)))
+        for ((row1, col1), (row2, col2)), score in zip(self.moves, self.scores):
+            # A swap is its top or left cell plus one bit for vertical
+            row, col = min(row1, row2), min(col1, col2)
+            write_varint(out, (row * self.cols + col) * 2 + (row1 != row2))
+            write_varint(out, score)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data, offset: int = 0) -> Tuple["Replay", int]:
+        """Decode one replay starting at offset, returning it and the offset after it"""
+        rows, cols, num_colors, min_moves, seed, count = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        moves = []
+        scores = []
+        for _ in range(count):
+            code, offset = read_varint(data, offset)
+            score, offset = read_varint(data, offset)
+            cell, vertical = divmod(code, 2)
+            row, col = divmod(cell, cols)
+            moves.append(((row, col), (row + 1, col) if vertical else (row, col + 1)))
+            scores.append(score)
+        return cls(rows, cols, num_colors, min_moves & ~SPECIALS_FLAG, seed, moves, scores,
+                   bool(min_moves & SPECIALS_FLAG)), offset
+
+
+class ReplayRecorder:
+    """Collects the moves of the current game of an engine"""
+
+    def __init__(self, engine: GameEngine):
+        self.engine = engine
+        self.start()
+
+    def start(self):
+        """Begin recording the game the engine has just started"""
+        if self.engine.seed is None:
+            raise ValueError("Only games with their own seeded generator can be recorded")
+        self.seed = self.engine.seed
+        self.moves: List[Move] = []
+        self.scores: List[int] = []
+
+    def record(self, move: Move, score_delta: int):
+        """Add a valid move and the score its whole cascade earned"""
+        self.moves.append(move)
+        self.scores.append(score_delta)
+
+    def step(self, move: Move):
+        """Play a move on the engine and record it if it was valid"""
+        result = self.engine.step(move)
+        if result.valid:
+            self.record(move, result.score_delta)
+        return result
+
+    def replay(self) -> Replay:
+        """Return the moves so far as a replay"""
+        engine = self.engine
+        return Replay(engine.rows, engine.cols, engine.board.num_colors, engine.min_moves, self.seed,
+                      list(self.moves), list(self.scores), engine.special_candies)
+
+
+def replay_engine(replay: Replay, backend=Board) -> GameEngine:
+    """New engine at the starting position of a replay"""
+    return GameEngine(replay.rows, replay.cols, replay.num_colors, backend=backend,
+                      min_moves=replay.min_moves, seed=replay.seed, special_candies=replay.special_candies)
+
+
+def play(replay: Replay, backend=Board, engine: Optional[GameEngine] = None) -> GameEngine:
+    """Fast-forward a replay headlessly, checking every move's score, and return the final game"""
+    if engine is None:
+        engine = replay_engine(replay, backend)
+    for number, (move, expected) in enumerate(zip(replay.moves, replay.scores)):
+        result = engine.step(move)
+        if not result.valid or result.score_delta != expected:
+            raise ReplayMismatch(f"Move {number} {move} scored {result.score_delta} "
+                                 f"(valid {result.valid}), recorded {expected}")
+    return engine
+
+
+def write_replays(output: BinaryIO, replays):
+    """Write replays back to back; a corpus file is just their concatenation"""
+    for replay in replays:
+        output.write(replay.to_bytes())
+
+
+def read_replays(data) -> Iterator[Replay]:
+    """Decode every replay in a buffer written by write_replays"""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        replay, offset = Replay.from_bytes(view, offset)
+        yield replay
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fast-forward recorded games and check their scores")
+    parser.add_argument("replays", help="file of replays written by write_replays")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.replays, "rb") as f:
+        data = f.read()
+
+    games = 0
+    mismatches = 0
+    for replay in read_replays(data):
+        games += 1
+        try:
+            play(replay)
+        except ReplayMismatch as error:
+            mismatches += 1
+            print(f"game {games - 1} (seed {replay.seed}): {error}")
+
+    print(f"{games} games replayed, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
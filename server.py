@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import functools
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from backends import BACKENDS
+from engine import GRID_SIZE, NUM_COLORS, GameEngine, Move
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+EXECUTOR_CELLS = 4096  # Boards with at least this many cells are worked on off the event loop
+TRACKED_CELLS = 4096  # Boards with at least this many cells keep an incremental index of legal moves
+MAX_CELLS = 2048 * 2048  # Largest board a session may ask for
+MIN_COLORS = 3  # Fewer colors cannot fill a board without matches
+MAX_COLORS = 127  # Color indices must fit NumpyBoard's int8 cells and stay clear of the empty byte
+LINE_LIMIT = 1 << 16  # Longest request line accepted
+SESSION_OPS = {"swap", "reset", "state", "close"}
+
+
+class ProtocolError(Exception):
+    """Raised for a request the server cannot act on; sent back to the client as an error"""
+
+
+class LineWriter:
+    """Queues lines for a stream and sends them in one write per event loop iteration
+
+    With many requests in flight on a connection, this turns a send() system
+    call per line into one per batch.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.lines: List[bytes] = []
+
+    def write(self, line: bytes):
+        if not self.lines:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.lines.append(line)
+
+    def flush(self):
+        if self.lines and not self.writer.is_closing():
+            self.writer.writelines(self.lines)
+        self.lines = []
+
+    async def drain(self):
+        await self.writer.drain()
+
+
+class Session:
+    """One game hosted by the server"""
+
+    def __init__(self, engine: GameEngine):
+        self.engine = engine
+        # Requests for a session are served one at a time, in order
+        self.lock = asyncio.Lock()
+
+
+def encode_board(engine: GameEngine) -> str:
+    """Board cells row by row as hex, one byte per cell and ff for empty"""
+    return engine.board.to_bytes().hex()
+
+
+def encode_specials(engine: GameEngine) -> List[List[int]]:
+    """Special candies on the board as [row, col, kind], in row order"""
+    return [[row, col, kind] for (row, col), kind in sorted(engine.specials.items())]
+
+
+def parse_move(engine: GameEngine, value) -> Move:
+    """Read a swap given as [[row, col], [row, col]] and check it lies on the board"""
+    try:
+        (row1, col1), (row2, col2) = value
+        move = ((int(row1), int(col1)), (int(row2), int(col2)))
+    except (TypeError, ValueError, OverflowError):
+        raise ProtocolError(f"Malformed move {value!r}")
+    for row, col in move:
+        if not (0 <= row < engine.rows and 0 <= col < engine.cols):
+            raise ProtocolError(f"Cell {(row, col)} is outside the board")
+    return move
+
+
+def parse_int(request: Dict, key: str, default: Optional[int] = None) -> Optional[int]:
+    """Read an optional integer field of a request"""
+    value = request.get(key)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        # int() of a float too large for JSON numbers to round trip, such as 1e400, overflows
+        raise ProtocolError(f"Malformed {key} {value!r}")
+
+
+def parse_seed(request: Dict) -> Optional[int]:
+    return parse_int(request, "seed")
+
+
+class GameServer:
+    """Hosts many independent games, driven by newline-delimited JSON requests
+
+    Every request is an object with an "op" and an optional "id" that is
+    echoed in its reply, so a client can keep many requests in flight on one
+    connection and for many sessions at once. Ops:
+
+    - new: start a session ("rows", "cols", "colors", "backend", "seed" and
+      "specials", to play with special candies, are optional); replies with
+      its "session" id, "seed" and "board"
+    - swap: play "move" in "session"; replies with "valid", "score",
+      "score_delta", "game_over" and the cascade "waves", each as
+      [cleared cells, score, falls as [col, from_row, to_row], spawns as
+      [row, col, color], special candies made as [row, col, kind]], which is
+      enough to keep a copy of the board in step
+    - reset: start a new game in "session", optionally from "seed"
+    - state: the "score", "game_over", "seed", "board" and "specials", as
+      [row, col, kind], of "session"
+    - close: end "session"; sessions also end when their connection closes
+
+    Failed requests get an "error" message instead. Moves on boards of at
+    least executor_cells cells run on worker threads, so large boards do not
+    stall the other sessions.
+    """
+
+    def __init__(self, executor_cells: int = EXECUTOR_CELLS, workers: Optional[int] = None):
+        self.executor_cells = executor_cells
+        self.executor = ThreadPoolExecutor(workers)
+        self.sessions: Dict[int, Session] = {}
+        self.next_session = 0
+        self.moves = 0
+
+    async def run(self, cells: int, function, *args):
+        """Call function, on a worker thread when it works on a large board"""
+        if cells < self.executor_cells:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve the requests of one client until it disconnects"""
+        owned: Set[int] = set()
+        tasks: Set[asyncio.Task] = set()
+        lines = LineWriter(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                # Requests run concurrently; each session's lock keeps its own in order
+                task = asyncio.create_task(self.respond(line, lines, owned))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            lines.flush()
+            writer.close()
+
+    async def respond(self, line: bytes, writer: LineWriter, owned: Set[int]):
+        """Handle one request line and write its reply"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ProtocolError("A request must be a JSON object")
+            request_id = request.get("id")
+            reply = await self.handle(request, owned)
+        except (ProtocolError, TypeError, ValueError, OverflowError) as error:
+            reply = {"error": str(error)}
+        except Exception as error:
+            # Anything else is a server bug, but the client still gets its one reply
+            reply = {"error": f"Internal error: {type(error).__name__}: {error}"}
+        reply["id"] = request_id
+        writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def handle(self, request: Dict, owned: Set[int]) -> Dict:
+        op = request.get("op")
+        if op == "new":
+            return await self.new_session(request, owned)
+        if op not in SESSION_OPS:
+            raise ProtocolError(f"Unknown op {op!r}")
+
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise ProtocolError(f"Unknown session {request.get('session')!r}")
+        engine = session.engine
+        cells = engine.rows * engine.cols
+
+        async with session.lock:
+            if op == "swap":
+                move = parse_move(engine, request.get("move"))
+                result = await self.run(cells, engine.resolve, move)
+                self.moves += 1
+                return {"valid": result.valid, "score": engine.score, "score_delta": result.score_delta,
+                        "game_over": result.game_over, "waves": result.waves}
+            if op == "reset":
+                await self.run(cells, engine.reset, parse_seed(request))
+                return {"seed": engine.seed, "board": encode_board(engine)}
+            if op == "state":
+                return {"score": engine.score, "game_over": engine.game_over, "seed": engine.seed,
+                        "board": encode_board(engine), "specials": encode_specials(engine)}
+            # close
+            self.sessions.pop(request["session"], None)
+            owned.discard(request["session"])
+            return {}
+
+    async def new_session(self, request: Dict, owned: Set[int]) -> Dict:
+        """Start a game with the settings of a new request"""
+        rows = parse_int(request, "rows", GRID_SIZE)
+        cols = parse_int(request, "cols", GRID_SIZE)
+        colors = parse_int(request, "colors", NUM_COLORS)
+        backend = BACKENDS.get(request.get("backend", "list"))
+        if backend is None:
+            raise ProtocolError(f"Unknown backend {request.get('backend')!r}")
+        if rows < 1 or cols < 1 or rows * cols > MAX_CELLS:
+            raise ProtocolError(f"Boards must have 1 to {MAX_CELLS} cells")
+        if not MIN_COLORS <= colors <= MAX_COLORS:
+            raise ProtocolError(f"Boards must have {MIN_COLORS} to {MAX_COLORS} colors")
+
+        create = functools.partial(GameEngine, rows, cols, colors, backend=backend,
+                                   track_moves=rows * cols >= TRACKED_CELLS, seed=parse_seed(request),
+                                   special_candies=bool(request.get("specials", False)))
+        engine = await self.run(rows * cols, create)
+        session_id = self.next_session
+        self.next_session += 1
+        # Registered only once its reply is built, so a failure leaves no session behind
+        reply = {"session": session_id, "seed": engine.seed, "board": encode_board(engine)}
+        self.sessions[session_id] = Session(engine)
+        owned.add(session_id)
+        return reply
+
+
+async def serve(server: GameServer, host: str, port: int):
+    listener = await asyncio.start_server(server.handle_connection, host, port, limit=LINE_LIMIT)
+    print(f"Serving on {host}:{port}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Host many game sessions over TCP with a JSON-lines protocol")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--executor-cells", type=int, default=EXECUTOR_CELLS,
+                        help="boards with at least this many cells are worked on in threads")
+    parser.add_argument("--workers", type=int, help="worker threads for large boards")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = GameServer(args.executor_cells, args.workers)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import math
+import mmap
+import re
+import struct
+from typing import Tuple
+
+from engine import EMPTY_BYTE, SPECIAL_KINDS, GameEngine
+
+# Board shape at the start of every snapshot and snapshot file:
+# rows, cols, num_colors, flags
+HEADER = struct.Struct("<HHBB")
+# Game state at the start of every position: score, game over
+RECORD = struct.Struct("<qB")
+# Mersenne Twister state of random.Random: 625 words and the cached gauss value
+RNG_STATE = struct.Struct("<625Id")
+
+HAS_RNG = 1  # Header flag: every position stores the rng state after its cells
+HAS_SPECIALS = 2  # Header flag: every position stores the special candy kind of each cell after its cells
+PACKED_COLORS = 7  # Boards with up to this many colors use 3 bits per cell
+
+# One byte per cell to octal digits and back, with empty cells as digit 7
+TO_OCTAL = bytes(ord("7") if value == EMPTY_BYTE else ord("0") + value % 8 for value in range(256))
+FROM_OCTAL = bytes.maketrans(b"01234567", bytes([0, 1, 2, 3, 4, 5, 6, EMPTY_BYTE]))
+
+
+def cell_bytes(rows: int, cols: int, num_colors: int) -> int:
+    """Size of the packed cells of one board"""
+    if num_colors <= PACKED_COLORS:
+        return math.ceil(rows * cols * 3 / 8)
+    return rows * cols
+
+
+def pack_cells(data: bytes, num_colors: int) -> bytes:
+    """Pack one byte per cell into 3 bits per cell when the colors fit"""
+    if num_colors > PACKED_COLORS:
+        return data
+    # Read as octal digits, one per cell, the cells become one integer
+    value = int(data.translate(TO_OCTAL), 8) if data else 0
+    return value.to_bytes(math.ceil(len(data) * 3 / 8), "big")
+
+
+def unpack_cells(packed, size: int, num_colors: int) -> bytes:
+    """Return one byte per cell from packed cells"""
+    if num_colors > PACKED_COLORS:
+        return bytes(packed)
+    digits = format(int.from_bytes(packed, "big"), "o").zfill(size).encode()
+    return digits.translate(FROM_OCTAL)
+
+
+def position_size(rows: int, cols: int, num_colors: int, include_rng: bool, include_specials: bool = False) -> int:
+    """Size of one position: game state, packed cells and optionally the special candies and rng state"""
+    return (RECORD.size + cell_bytes(rows, cols, num_colors)
+            + (cell_bytes(rows, cols, SPECIAL_KINDS + 1) if include_specials else 0)
+            + (RNG_STATE.size if include_rng else 0))
+
+
+def header_flags(include_rng: bool, include_specials: bool) -> int:
+    return (HAS_RNG if include_rng else 0) | (HAS_SPECIALS if include_specials else 0)
+
+
+def pack_position(engine: GameEngine, include_rng: bool, include_specials: bool = False) -> bytes:
+    """Pack the game state and board of an engine, without a header"""
+    board = engine.board
+    parts = [RECORD.pack(engine.score, engine.game_over), pack_cells(board.to_bytes(), board.num_colors)]
+    if include_specials:
+        # Special candy kinds are packed like a second board, with 0 for plain candies
+        kinds = bytearray(board.rows * board.cols)
+        for (row, col), kind in engine.specials.items():
+            kinds[row * board.cols + col] = kind
+        parts.append(pack_cells(bytes(kinds), SPECIAL_KINDS + 1))
+    if include_rng:
+        if not hasattr(engine.rng, "getstate"):
+            raise ValueError("The engine's rng has no getstate() to snapshot")
+        _, words, gauss = engine.rng.getstate()
+        parts.append(RNG_STATE.pack(*words, math.nan if gauss is None else gauss))
+    return b"".join(parts)
+
+
+def unpack_position(engine: GameEngine, view: memoryview, include_rng: bool, include_specials: bool = False):
+    """Load a position packed by pack_position into an engine"""
+    board = engine.board
+    size = board.rows * board.cols
+    score, game_over = RECORD.unpack_from(view)
+    start = RECORD.size
+    end = start + cell_bytes(board.rows, board.cols, board.num_colors)
+    board.load_bytes(unpack_cells(view[start:end], size, board.num_colors))
+
+    kinds = None
+    if include_specials:
+        if not engine.special_candies:
+            raise ValueError("Snapshot with special candies cannot be restored into a game without them")
+        start = end
+        end = start + cell_bytes(board.rows, board.cols, SPECIAL_KINDS + 1)
+        kinds = unpack_cells(view[start:end], size, SPECIAL_KINDS + 1)
+
+    if include_rng:
+        state = RNG_STATE.unpack_from(view, end)
+        gauss = None if math.isnan(state[-1]) else state[-1]
+        engine.rng.setstate((3, state[:-1], gauss))
+
+    engine.resume(score, bool(game_over))
+    if kinds is not None:
+        # Only the few special candies are visited, not every cell
+        engine.specials = {divmod(found.start(), board.cols): kinds[found.start()]
+                           for found in re.finditer(rb"[^\x00]", kinds)}
+
+
+def snapshot(engine: GameEngine, include_rng: bool = False) -> bytes:
+    """Pack a settled game into a compact snapshot
+
+    Cells take 3 bits each for up to 7 colors and one byte otherwise. The rng
+    state adds 2.5 KB, so it is left out unless refills must replay exactly.
+    Games with special candies also store each cell's kind in 3 bits.
+    """
+    board = engine.board
+    include_specials = engine.special_candies
+    header = HEADER.pack(board.rows, board.cols, board.num_colors, header_flags(include_rng, include_specials))
+    return header + pack_position(engine, include_rng, include_specials)
+
+
+def read_header(data) -> Tuple[int, int, int, bool, bool]:
+    """Return rows, cols, num_colors and whether the rng state and special candies are included"""
+    rows, cols, num_colors, flags = HEADER.unpack_from(data)
+    return rows, cols, num_colors, bool(flags & HAS_RNG), bool(flags & HAS_SPECIALS)
+
+
+def check_shape(engine: GameEngine, rows: int, cols: int, num_colors: int):
+    """Refuse to restore a snapshot into a board of another shape"""
+    board = engine.board
+    if (board.rows, board.cols, board.num_colors) != (rows, cols, num_colors):
+        raise ValueError(f"Snapshot of a {rows}x{cols} board with {num_colors} colors does not fit a "
+                         f"{board.rows}x{board.cols} board with {board.num_colors} colors")
+
+
+def restore(engine: GameEngine, data):
+    """Load a snapshot from bytes, a bytearray or a memoryview into an engine"""
+    view = memoryview(data)
+    rows, cols, num_colors, include_rng, include_specials = read_header(view)
+    check_shape(engine, rows, cols, num_colors)
+    unpack_position(engine, view[HEADER.size:], include_rng, include_specials)
+
+
+class SnapshotWriter:
+    """Append positions of same-shaped boards to a file, after one shared header"""
+
+    def __init__(self, path: str, rows: int, cols: int, num_colors: int, include_rng: bool = False,
+                 include_specials: bool = False):
+        self.shape = (rows, cols, num_colors)
+        self.include_rng = include_rng
+        self.include_specials = include_specials
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(rows, cols, num_colors, header_flags(include_rng, include_specials)))
+
+    def append(self, engine: GameEngine):
+        """Write the current position of a game"""
+        check_shape(engine, *self.shape)
+        self.file.write(pack_position(engine, self.include_rng, self.include_specials))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SnapshotFile:
+    """Read-only snapshot file mapped into memory, so positions load on demand
+
+    Positions have a fixed size, so indexing is a slice of the map and files
+    far larger than memory can be scanned.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.rows, self.cols, self.num_colors, self.include_rng, self.include_specials = read_header(self.view)
+        self.position_size = position_size(self.rows, self.cols, self.num_colors, self.include_rng,
+                                           self.include_specials)
+
+    def __len__(self) -> int:
+        return (len(self.view) - HEADER.size) // self.position_size
+
+    def __getitem__(self, index: int) -> memoryview:
+        """Packed position without a header; no bytes are copied"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("snapshot index out of range")
+        start = HEADER.size + index * self.position_size
+        return self.view[start:start + self.position_size]
+
+    def restore(self, engine: GameEngine, index: int):
+        """Load the position at an index into an engine"""
+        check_shape(engine, self.rows, self.cols, self.num_colors)
+        unpack_position(engine, self[index], self.include_rng, self.include_specials)
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> "SnapshotFile":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
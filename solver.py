@@ -0,0 +1,176 @@
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from bitboard import BitBoard
+from engine import GameEngine, Move, Position
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out
+
+    ranked holds the moves of the interrupted ranking that were fully
+    valued before it ran out, best first.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.ranked: List[Tuple[Move, float]] = []
+
+
+class BoardHasher:
+    """Deterministic 64-bit hashes of bitboards and their special candies
+
+    Hashes the color masks directly, which is a few machine words per 64
+    cells, where a per-cell Zobrist hash had to look up every cell's color.
+    Int and tuple hashes are not randomized per process, so the refills they
+    seed are the same on every run.
+    """
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+
+    def hash(self, board: BitBoard, specials: Optional[Dict[Position, int]] = None) -> int:
+        """Hash the color masks of a board, and its special candies if any"""
+        return hash((self.seed, tuple(board.masks), tuple(sorted(specials.items())) if specials else ()))
+
+
+class TranspositionTable:
+    """Bounded LRU cache of search results keyed by board hash and depth"""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Tuple[int, int]) -> Optional[float]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[int, int], value: float):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class Solver:
+    """Ranks legal swaps by expected score, simulating full cascades to a fixed depth
+
+    Refills during the simulation come from rngs seeded by the board hash and
+    the move, so a position always leads to the same outcome and sibling
+    branches can share transposition table entries. With samples > 1 each
+    move is averaged over that many refill seeds.
+    """
+
+    def __init__(self, rows: int, cols: int, num_colors: int, samples: int = 1,
+                 max_entries: int = 100000, seed: int = 0):
+        self.hasher = BoardHasher(seed)
+        self.table = TranspositionTable(max_entries)
+        self.samples = samples
+        self.deadline: Optional[float] = None
+
+    def search_engine(self, engine: GameEngine) -> GameEngine:
+        """Copy a game onto a bitboard without move tracking, which is the fastest to simulate"""
+        board = engine.board
+        bitboard = BitBoard(board.rows, board.cols, board.num_colors)
+        bitboard.load_bytes(board.to_bytes())
+        # Special candies go along, so their blasts and bonuses count
+        search = GameEngine(board=bitboard, special_candies=engine.special_candies)
+        search.specials = dict(engine.specials)
+        return search
+
+    def check_deadline(self):
+        """Raise SearchTimeout once the time budget has run out"""
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def outcome(self, engine: GameEngine, board_hash: int, move: Move, sample: int) -> Tuple[int, GameEngine]:
+        """Resolve a move on a copy of the game with deterministic refills"""
+        (row1, col1), (row2, col2) = move
+        move_code = ((row1 * engine.cols + col1) * engine.rows + row2) * engine.cols + col2
+        future = engine.copy(rng=random.Random(board_hash ^ (move_code << 8) ^ sample))
+        return future.step(move).score_delta, future
+
+    def value(self, engine: GameEngine, depth: int) -> float:
+        """Best expected score reachable from a position within depth moves"""
+        if depth == 0:
+            return 0.0
+        self.check_deadline()
+
+        board_hash = self.hasher.hash(engine.board, engine.specials)
+        cached = self.table.get((board_hash, depth))
+        if cached is not None:
+            return cached
+
+        best = 0.0
+        for move in engine.board.iter_moves():
+            best = max(best, self.move_value(engine, board_hash, move, depth))
+
+        self.table.put((board_hash, depth), best)
+        return best
+
+    def move_value(self, engine: GameEngine, board_hash: int, move: Move, depth: int) -> float:
+        """Expected score of playing a move now and then the best line for depth - 1 more moves"""
+        total = 0.0
+        for sample in range(self.samples):
+            # Checked per outcome, as value() never looks at the clock at depth 1
+            self.check_deadline()
+            score, future = self.outcome(engine, board_hash, move, sample)
+            total += score + self.value(future, depth - 1)
+        return total / self.samples
+
+    def rank_moves(self, engine: GameEngine, depth: int = 2) -> List[Tuple[Move, float]]:
+        """Return every legal move with its expected score, best first"""
+        if not isinstance(engine.board, BitBoard) or engine.move_index is not None:
+            engine = self.search_engine(engine)
+
+        board_hash = self.hasher.hash(engine.board, engine.specials)
+        ranked = []
+        try:
+            # Moves are decoded lazily, so a large board is not listed in full
+            # before the first one is valued
+            for move in engine.board.iter_moves():
+                self.check_deadline()
+                ranked.append((move, self.move_value(engine, board_hash, move, depth)))
+        except SearchTimeout as timeout:
+            timeout.ranked = sorted(ranked, key=lambda item: item[1], reverse=True)
+            raise
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked
+
+    def best_move(self, engine: GameEngine, max_depth: int = 3,
+                  time_budget: Optional[float] = None) -> Optional[Move]:
+        """Search deeper and deeper until max_depth or the time budget in seconds runs out"""
+        self.deadline = None if time_budget is None else time.perf_counter() + time_budget
+        engine = self.search_engine(engine)
+        best = None
+        try:
+            for depth in range(1, max_depth + 1):
+                ranked = self.rank_moves(engine, depth)
+                if not ranked:
+                    break
+                best = ranked[0][0]
+        except SearchTimeout as timeout:
+            # Keep the answer from the deepest search that finished, or else
+            # the best move the interrupted one got to
+            if best is None and timeout.ranked:
+                best = timeout.ranked[0][0]
+        finally:
+            self.deadline = None
+
+        if best is None:
+            # Not even depth 1 finished in time; fall back to any legal move
+            moves = engine.legal_moves(limit=1)
+            best = moves[0] if moves else None
+        return best
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+# Each scenario runs in a fresh interpreter, timing its own phases; argv[1] is
+# the wall clock time the parent started it at
+SCENARIOS = {
+    # Headless tools that only want the rules
+    "rules": """
+import json, sys, time
+started = time.time()
+import engine
+imported = time.time()
+engine.GameEngine()
+created = time.time()
+print(json.dumps({"interpreter": started - float(sys.argv[1]), "import": imported - started,
+                  "setup": created - imported, "first_frame": 0.0}))
+""",
+    # The game: import, open the window and present the first frame
+    "game": """
+import json, sys, time
+started = time.time()
+import candy_crush
+imported = time.time()
+game = candy_crush.CandyCrush()
+created = time.time()
+game.draw()
+drawn = time.time()
+print(json.dumps({"interpreter": started - float(sys.argv[1]), "import": imported - started,
+                  "setup": created - imported, "first_frame": drawn - created}))
+""",
+}
+PHASES = ["interpreter", "import", "setup", "first_frame"]
+
+
+def run_once(scenario: str, env: Dict[str, str]) -> Dict[str, float]:
+    """Start one interpreter for a scenario and return its phase times in seconds"""
+    spawned = time.time()
+    output = subprocess.run([sys.executable, "-c", SCENARIOS[scenario], repr(spawned)], env=env, check=True,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    times = json.loads(output.strip().splitlines()[-1])
+    times["total"] = time.time() - spawned
+    return times
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Min and median of every phase, in milliseconds"""
+    return {
+        phase: {
+            "min_ms": min(run[phase] for run in runs) * 1000,
+            "median_ms": statistics.median(run[phase] for run in runs) * 1000,
+        }
+        for phase in PHASES + ["total"]
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time cold starts: interpreter, imports, setup and first frame")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per scenario")
+    parser.add_argument("--window", action="store_true", help="open a real window instead of the dummy driver")
+    parser.add_argument("--max-ms", type=float, help="fail when a scenario's median total exceeds this")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = dict(os.environ)
+    if not args.window:
+        env["SDL_VIDEODRIVER"] = "dummy"
+    env["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+    report = {}
+    slow = []
+    for scenario in args.scenarios:
+        summary = report[scenario] = summarize([run_once(scenario, env) for _ in range(args.runs)])
+        print(f"{scenario}: " + ", ".join(
+            f"{phase} {summary[phase]['median_ms']:.1f} ms" for phase in PHASES + ["total"]
+        ) + f" (median of {args.runs})")
+        if args.max_ms is not None and summary["total"]["median_ms"] > args.max_ms:
+            slow.append(scenario)
+
+    for scenario in slow:
+        print(f"SLOW {scenario}: {report[scenario]['total']['median_ms']:.1f} ms > {args.max_ms} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import importlib
+import random
+from typing import Callable, Dict, Optional
+
+from engine import POINTS_PER_CANDY, GameEngine, Move
+
+# A strategy picks the next move for a game, or None to give up
+Strategy = Callable[[GameEngine, random.Random], Optional[Move]]
+
+
+def immediate_score(engine: GameEngine, move: Move) -> int:
+    """Score of the first wave a move clears, ignoring cascades"""
+    board = engine.board
+    board.swap(*move)
+    cleared = len(board.find_matches())
+    board.swap(*move)
+    return cleared * POINTS_PER_CANDY
+
+
+def random_strategy(engine: GameEngine, rng: random.Random) -> Optional[Move]:
+    """Play a uniformly random legal move"""
+    moves = engine.legal_moves()
+    return rng.choice(moves) if moves else None
+
+
+def greedy_strategy(engine: GameEngine, rng: random.Random) -> Optional[Move]:
+    """Play the legal move that clears the most candies right away"""
+    best_moves = []
+    best_score = -1
+    for move in engine.legal_moves():
+        score = immediate_score(engine, move)
+        if score > best_score:
+            best_moves = [move]
+            best_score = score
+        elif score == best_score:
+            best_moves.append(move)
+    return rng.choice(best_moves) if best_moves else None
+
+
+def lookahead_strategy(engine: GameEngine, rng: random.Random, samples: int = 2) -> Optional[Move]:
+    """Play the move with the best sampled cascade score plus the best greedy follow-up"""
+    best_move = None
+    best_value = -1.0
+    for move in engine.legal_moves():
+        total = 0
+        for _ in range(samples):
+            # Simulate on a copy whose refills come from a fresh sample
+            future = engine.copy(rng=random.Random(rng.getrandbits(64)))
+            total += future.step(move).score_delta
+            follow_ups = future.legal_moves()
+            if follow_ups:
+                total += max(immediate_score(future, follow_up) for follow_up in follow_ups)
+        value = total / samples
+        if value > best_value:
+            best_move = move
+            best_value = value
+    return best_move
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    "random": random_strategy,
+    "greedy": greedy_strategy,
+    "lookahead": lookahead_strategy,
+}
+
+
+def load_strategy(name: str) -> Strategy:
+    """Look up a built-in strategy, or import one given as module:function"""
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    if ":" not in name:
+        raise ValueError(f"Unknown strategy {name!r}, expected one of {sorted(STRATEGIES)} or module:function")
+
+    module_name, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
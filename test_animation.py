@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from animation import SNAP_DISTANCE, Tweens
+
+
+class Sprite:
+    """One sprite tweened the way a candy used to animate itself"""
+
+    def __init__(self, x: float, y: float, target_x: float, target_y: float, alpha: int = 255):
+        self.x, self.y, self.target_x, self.target_y, self.alpha = x, y, target_x, target_y, alpha
+
+    def at_target(self) -> bool:
+        return abs(self.x - self.target_x) < SNAP_DISTANCE and abs(self.y - self.target_y) < SNAP_DISTANCE
+
+    def update_position(self, speed: float):
+        self.x += (self.target_x - self.x) * speed
+        self.y += (self.target_y - self.y) * speed
+
+
+def test_moves_follow_per_sprite_tweening_and_land_on_target():
+    rng = random.Random(10)
+    # Few slots to start with, so the arrays grow while sprites are added
+    tweens = Tweens(capacity=2)
+    sprites = {}
+    for _ in range(50):
+        sprite = Sprite(*(rng.uniform(-100, 600) for _ in range(4)))
+        slot = tweens.allocate(sprite.x, sprite.y)
+        tweens.move_to(slot, sprite.target_x, sprite.target_y)
+        sprites[slot] = sprite
+
+    for _ in range(200):
+        done = tweens.step_moves(0.3)
+        expected = all(sprite.at_target() for sprite in sprites.values())
+        for slot, sprite in sprites.items():
+            if sprite.at_target():
+                assert (tweens.x[slot], tweens.y[slot]) == (sprite.target_x, sprite.target_y)
+            else:
+                sprite.update_position(0.3)
+                assert tweens.x[slot] == pytest.approx(sprite.x) and tweens.y[slot] == pytest.approx(sprite.y)
+        assert done == expected
+        if done:
+            break
+    assert done and tweens.active_moves == 0
+
+
+def test_fades_end_a_frame_after_every_sprite_is_transparent():
+    tweens = Tweens()
+    slots = [tweens.allocate(0, 0, alpha) for alpha in (255, 100, 7)]
+    for slot in slots:
+        tweens.fade_out(slot)
+    transparent = tweens.allocate(0, 0, 0)
+    tweens.fade_out(transparent)
+    assert tweens.active_fades == 3
+
+    frames = 0
+    while not tweens.step_fades(15):
+        frames += 1
+    # 255 / 15 frames to reach zero, then one to notice
+    assert frames == 17
+    assert tweens.alpha[slots].tolist() == [0, 0, 0]
+
+
+def test_released_slots_are_reused_and_cancel_their_tweens():
+    tweens = Tweens(capacity=1)
+    first = tweens.allocate(0, 0)
+    second = tweens.allocate(5, 5)
+    assert tweens.capacity == 2 and (tweens.x[first], tweens.x[second]) == (0, 5)
+
+    tweens.move_to(first, 100, 100)
+    tweens.fade_out(first)
+    tweens.release(first)
+    assert tweens.active_moves == tweens.active_fades == 0
+    assert tweens.allocate(1, 1) == first
+
+    tweens.clear()
+    assert sorted(tweens.free) == [0, 1]
@@ -0,0 +1,67 @@
+import numpy as np
+
+from batch import BatchEngine
+from engine import POINTS_PER_CANDY, Board
+from numpy_board import match_mask
+
+
+def board_of(batch: BatchEngine, index: int) -> Board:
+    board = Board(batch.rows, batch.cols, batch.num_colors)
+    board.load_bytes(batch.cells[index].astype(np.uint8).tobytes())
+    return board
+
+
+def test_legal_mask_lists_the_legal_moves_of_every_board():
+    batch = BatchEngine(64, 6, 7, 4, seed=1)
+    for _ in range(10):
+        legal = batch.legal_mask()
+        for index in range(batch.num_boards):
+            moves = [batch.action_to_move(action) for action in np.flatnonzero(legal[index])]
+            assert sorted(moves) == sorted(board_of(batch, index).legal_moves())
+        assert all(batch.move_to_action(batch.action_to_move(action)) == action
+                   for action in range(batch.num_actions))
+
+        # Move on to other positions, playing a legal move where there is one
+        actions = np.where(legal.any(axis=1), legal.argmax(axis=1), 0)
+        batch.step(actions)
+
+
+def test_invalid_actions_leave_boards_unchanged():
+    batch = BatchEngine(64, 6, 7, 4, seed=2)
+    legal = batch.legal_mask()
+    # The first illegal action of each board; every board has some
+    actions = (~legal).argmax(axis=1)
+    before = batch.cells.copy()
+    batch.game_over[:8] = True
+    actions[:8] = legal[:8].argmax(axis=1)
+
+    result = batch.step(actions)
+    assert not result.valid.any()
+    assert (result.score_delta == 0).all() and (result.cascades == 0).all()
+    assert (batch.cells == before).all()
+    assert (batch.scores == 0).all()
+
+
+def test_valid_actions_score_every_cleared_candy():
+    batch = BatchEngine(64, 6, 7, 4, seed=3)
+    legal = batch.legal_mask()
+    playable = legal.any(axis=1)
+    result = batch.step(legal.argmax(axis=1))
+
+    assert (result.valid == playable).all()
+    assert (result.score_delta[playable] >= 3 * POINTS_PER_CANDY).all()
+    assert (result.score_delta % POINTS_PER_CANDY == 0).all()
+    assert (batch.scores == result.score_delta).all()
+    assert (result.game_over == ~result.legal_mask.any(axis=1)).all()
+
+
+def test_new_games_start_with_a_legal_move():
+    # Small boards without a legal move are common, so some get re-rolled
+    batch = BatchEngine(256, 3, 4, 6, seed=4)
+    assert batch.legal_mask().any(axis=1).all()
+    assert not match_mask(batch.cells).any()
+
+    batch.game_over[::2] = True
+    batch.reset(batch.game_over)
+    assert batch.legal_mask().any(axis=1).all()
+    assert not batch.game_over.any()
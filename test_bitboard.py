@@ -0,0 +1,45 @@
+import random
+
+from bitboard import BitBoard
+from engine import Board, GameEngine
+from test_engine import SEEDS, play_random, random_board
+
+
+def bitboard_copy(board: Board) -> BitBoard:
+    other = BitBoard(board.rows, board.cols, board.num_colors)
+    other.load_bytes(board.to_bytes())
+    return other
+
+
+def test_bitboard_round_trips_bytes_and_grids():
+    rng = random.Random(3)
+    for _ in range(100):
+        board = random_board(rng, rng.randint(1, 12), rng.randint(1, 12), rng.randint(3, 8))
+        board.clear([(row, col) for row in range(board.rows) for col in range(board.cols) if rng.random() < 0.2])
+        other = bitboard_copy(board)
+
+        assert other.to_bytes() == board.to_bytes()
+        assert other.to_grid() == board.grid
+        assert all(other.get(row, col) == board.get(row, col)
+                   for row in range(board.rows) for col in range(board.cols))
+        grid_loaded = BitBoard(board.rows, board.cols, board.num_colors)
+        grid_loaded.load_grid(board.grid)
+        assert grid_loaded.masks == other.masks
+
+
+def test_bitboard_finds_the_same_matches():
+    rng = random.Random(1)
+    for _ in range(200):
+        board = random_board(rng, rng.randint(1, 10), rng.randint(1, 10), rng.randint(3, 5))
+        other = bitboard_copy(board)
+        assert sorted(other.find_matches()) == sorted(board.find_matches())
+        assert all(other.would_create_match(row, col) == board.would_create_match(row, col)
+                   for row in range(board.rows) for col in range(board.cols))
+
+
+def test_bitboard_plays_the_same_games():
+    for seed in SEEDS:
+        games = [GameEngine(9, 9, 5, backend=backend, seed=seed) for backend in (Board, BitBoard)]
+        results = [play_random(engine, random.Random(seed)) for engine in games]
+        assert results[0] == results[1]
+        assert games[0].board.to_bytes() == games[1].board.to_bytes()
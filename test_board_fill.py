@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from backends import BACKENDS
+from engine import BoardPool, GameEngine
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_fill_makes_boards_without_matches_and_with_enough_moves(backend):
+    rng = random.Random(5)
+    for _ in range(100):
+        rows, cols = rng.randint(3, 12), rng.randint(3, 12)
+        min_moves = rng.randint(0, 4)
+        board = BACKENDS[backend](rows, cols, rng.randint(3, 7))
+        board.fill(rng, min_moves)
+
+        assert not board.find_matches()
+        assert len(board.legal_moves()) >= min_moves
+        assert all(board.get(row, col) is not None for row in range(rows) for col in range(cols))
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_fill_draws_the_same_board_on_every_backend(backend):
+    for seed in range(20):
+        expected = BACKENDS["list"](9, 7, 5)
+        expected.fill(random.Random(seed), 3)
+        board = BACKENDS[backend](9, 7, 5)
+        board.fill(random.Random(seed), 3)
+        assert board.to_bytes() == expected.to_bytes()
+
+
+def test_fill_gives_up_on_impossible_move_counts():
+    board = BACKENDS["list"](3, 3, 3)
+    with pytest.raises(ValueError):
+        board.fill(random.Random(0), 100)
+    with pytest.raises(ValueError):
+        BACKENDS["list"](4, 4, 2).fill(random.Random(0))
+
+
+def test_pooled_games_replay_from_their_seed():
+    pool = BoardPool(8, 8, 6, size=4, min_moves=3, rng=random.Random(6))
+    engine = GameEngine(8, 8, 6, pool=pool)
+    for _ in range(6):
+        replayed = GameEngine(8, 8, 6, seed=engine.seed, min_moves=engine.min_moves)
+        assert engine.min_moves == 3
+        assert engine.board.to_bytes() == replayed.board.to_bytes()
+        assert len(engine.legal_moves()) >= 3 and not engine.board.find_matches()
+        engine.reset()
+    assert len(pool) == 0
+
+    with pytest.raises(ValueError):
+        GameEngine(9, 9, 6, pool=pool)
+
+
+def test_fill_writes_into_the_existing_storage():
+    board = BACKENDS["list"](6, 6, 5)
+    rows = [id(line) for line in board.grid]
+    board.fill(random.Random(7), 2)
+    board.fill(random.Random(8), 2)
+    assert [id(line) for line in board.grid] == rows
+
+    for backend in ("numpy", "bitboard"):
+        board = BACKENDS[backend](6, 6, 5)
+        cells = board.cells
+        board.fill(random.Random(7), 2)
+        assert board.cells is cells
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from engine import POINTS_PER_CANDY, Board, GameEngine
+
+SEEDS = range(8)
+MOVES = 40
+
+
+def random_board(rng: random.Random, rows: int, cols: int, num_colors: int) -> Board:
+    """A board of random colors, matches included"""
+    board = Board(rows, cols, num_colors)
+    board.grid = [[rng.randrange(num_colors) for _ in range(cols)] for _ in range(rows)]
+    return board
+
+
+def play_random(engine: GameEngine, rng: random.Random, moves: int = MOVES, resolve: bool = False):
+    """Play random legal moves, returning every step's outcome"""
+    results = []
+    for _ in range(moves):
+        if engine.game_over:
+            break
+        move = rng.choice(engine.legal_moves())
+        result = engine.resolve(move) if resolve else engine.step(move)
+        results.append(tuple(result)[:5])
+    return results
+
+
+def test_seeded_games_are_reproducible():
+    for seed in SEEDS:
+        games = [GameEngine(8, 8, 6, seed=seed) for _ in range(2)]
+        assert games[0].board.to_bytes() == games[1].board.to_bytes()
+        assert play_random(games[0], random.Random(seed)) == play_random(games[1], random.Random(seed))
+
+
+def test_invalid_swaps_leave_the_game_unchanged():
+    engine = GameEngine(8, 8, 6, seed=1)
+    before = engine.board.to_bytes()
+    legal = set(engine.legal_moves())
+    for row in range(8):
+        for col in range(7):
+            move = ((row, col), (row, col + 1))
+            if move not in legal:
+                assert not engine.step(move).valid
+                assert engine.board.to_bytes() == before
+    assert engine.score == 0
+
+    with pytest.raises(ValueError):
+        engine.step(((0, 0), (1, 1)))
+
+
+def test_steps_score_every_cleared_candy_and_settle_the_board():
+    for seed in SEEDS:
+        engine = GameEngine(8, 8, 6, seed=seed)
+        rng = random.Random(seed)
+        for _ in range(MOVES):
+            if engine.game_over:
+                break
+            result = engine.step(rng.choice(engine.legal_moves()))
+            assert result.valid and result.cascades >= 1
+            assert result.score_delta == result.cleared * POINTS_PER_CANDY
+            assert not engine.board.find_matches()
+            assert all(None not in line for line in engine.board.grid)
+        assert engine.game_over == (not engine.board.has_valid_moves())
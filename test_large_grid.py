@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from backends import BACKENDS
+from engine import Board, GameEngine
+from test_engine import MOVES, SEEDS, play_random
+
+
+class FullScanEngine(GameEngine):
+    """Engine that looks for matches on the whole board after every change"""
+
+    def mark_dirty(self, top: int, bottom: int, left: int, right: int):
+        super().mark_dirty(0, self.rows - 1, 0, self.cols - 1)
+
+
+@pytest.mark.parametrize("special_candies", [False, True])
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_scoped_scans_play_the_same_games_as_full_scans(backend, special_candies):
+    for seed in SEEDS[:4]:
+        games = [engine_type(24, 17, 5, backend=BACKENDS[backend], seed=seed, special_candies=special_candies)
+                 for engine_type in (GameEngine, FullScanEngine)]
+        results = [play_random(engine, random.Random(seed), moves=MOVES) for engine in games]
+        assert results[0] == results[1]
+        assert games[0].board.to_bytes() == games[1].board.to_bytes()
+
+
+def test_new_games_only_scan_around_their_first_swap():
+    engine = GameEngine(64, 64, 6, seed=16)
+    assert engine.dirty_region is None
+    engine.reset()
+    assert engine.dirty_region is None
+
+
+def test_boards_from_outside_are_scanned_in_full_first():
+    board = Board(6, 6, 4)
+    board.fill(random.Random(17), 1)
+    # A match far from the swap that will be played
+    board.grid[5][:3] = [3, 3, 3]
+    engine = GameEngine(board=board, seed=17)
+    move = next(move for move in engine.legal_moves() if move[0][0] < 3 and move[1][0] < 3)
+
+    result = engine.step(move)
+    assert result.valid
+    assert not engine.board.find_matches()
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from backends import BACKENDS
+from test_engine import random_board
+
+
+def brute_force_moves(board):
+    """Every swap of two different candies that puts one of them in a run, by trying it"""
+    moves = []
+    for row in range(board.rows):
+        for col in range(board.cols):
+            for other in ((row, col + 1), (row + 1, col)):
+                if other[0] >= board.rows or other[1] >= board.cols:
+                    continue
+                move = ((row, col), other)
+                if None in (board.get(*move[0]), board.get(*other)) or board.get(*move[0]) == board.get(*other):
+                    continue
+                trial = board.copy()
+                trial.swap(*move)
+                if set(move) & set(trial.find_matches()):
+                    moves.append(move)
+    return moves
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_legal_moves_are_the_swaps_that_make_a_match(backend):
+    rng = random.Random(4)
+    for _ in range(200):
+        board = random_board(rng, rng.randint(1, 10), rng.randint(1, 10), rng.randint(3, 5))
+        board.clear([(row, col) for row in range(board.rows) for col in range(board.cols) if rng.random() < 0.1])
+        other = BACKENDS[backend](board.rows, board.cols, board.num_colors)
+        other.load_bytes(board.to_bytes())
+        expected = brute_force_moves(board)
+
+        # Same moves in the same order, so limited lists agree too
+        for limit in (None, 1, 3):
+            assert other.legal_moves(limit) == expected[:limit]
+        assert other.has_valid_moves() == bool(expected)
+        assert all(other.swap_creates_match(*move) for move in expected)
+        assert other.to_bytes() == board.to_bytes()
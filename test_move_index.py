@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from backends import BACKENDS
+from engine import GameEngine
+from test_engine import MOVES, SEEDS
+
+
+@pytest.mark.parametrize("special_candies", [False, True])
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_move_index_matches_full_rescan(backend, special_candies):
+    for seed in SEEDS:
+        tracked = GameEngine(9, 9, 5, backend=BACKENDS[backend], seed=seed, track_moves=True,
+                             special_candies=special_candies)
+        rng = random.Random(seed)
+        for _ in range(MOVES):
+            assert tracked.legal_moves() == tracked.board.legal_moves()
+            assert tracked.legal_moves(limit=2) == tracked.board.legal_moves(limit=2)
+            if tracked.game_over:
+                break
+            tracked.step(rng.choice(tracked.legal_moves()))
+        assert tracked.game_over == (not tracked.board.has_valid_moves())
+
+
+def test_move_index_of_a_copy_follows_its_own_board():
+    original = GameEngine(9, 9, 5, seed=2, track_moves=True)
+    before = original.legal_moves()
+    clone = original.copy()
+    rng = random.Random(2)
+    for _ in range(5):
+        if not clone.game_over:
+            clone.step(rng.choice(clone.legal_moves()))
+
+    assert clone.legal_moves() == clone.board.legal_moves()
+    assert original.legal_moves() == before == original.board.legal_moves()
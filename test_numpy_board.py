@@ -0,0 +1,65 @@
+import random
+
+from engine import Board, GameEngine
+from numpy_board import NumpyBoard
+from test_engine import SEEDS, play_random, random_board
+
+
+def numpy_copy(board: Board) -> NumpyBoard:
+    other = NumpyBoard(board.rows, board.cols, board.num_colors)
+    other.load_bytes(board.to_bytes())
+    return other
+
+
+def test_numpy_board_finds_the_same_matches():
+    rng = random.Random(1)
+    for _ in range(200):
+        rows, cols = rng.randint(1, 10), rng.randint(1, 10)
+        board = random_board(rng, rows, cols, rng.randint(3, 5))
+        other = numpy_copy(board)
+
+        assert sorted(other.find_matches()) == sorted(board.find_matches())
+        top, left = rng.randrange(rows), rng.randrange(cols)
+        region = (top, rng.randint(top, rows - 1), left, rng.randint(left, cols - 1))
+        assert sorted(other.find_matches(region)) == sorted(board.find_matches(region))
+
+
+def test_numpy_board_refills_like_board():
+    rng = random.Random(2)
+    for seed in range(100):
+        board = random_board(rng, rng.randint(1, 10), rng.randint(1, 10), 5)
+        board.clear([(row, col) for row in range(board.rows) for col in range(board.cols) if rng.random() < 0.3])
+        other = numpy_copy(board)
+        columns = sorted({col for line in board.grid for col, color in enumerate(line) if color is None})
+
+        board.apply_gravity(random.Random(seed), columns)
+        # Every column, or only the ones with holes, gives the same board
+        other.apply_gravity(random.Random(seed), columns if seed % 2 else None)
+        assert other.to_bytes() == board.to_bytes()
+
+
+def test_numpy_board_plays_the_same_games():
+    for seed in SEEDS:
+        games = [GameEngine(9, 9, 5, backend=backend, seed=seed) for backend in (Board, NumpyBoard)]
+        results = [play_random(engine, random.Random(seed)) for engine in games]
+        assert results[0] == results[1]
+        assert games[0].board.to_bytes() == games[1].board.to_bytes()
+
+
+def test_cell_queries_follow_every_change_to_the_array():
+    rng = random.Random(3)
+    board = NumpyBoard(6, 7, 4)
+    board.fill(random.Random(3), 1)
+    for _ in range(20):
+        board.clear([(rng.randrange(6), rng.randrange(7)) for _ in range(5)])
+        board.apply_gravity(rng)
+        board = board.copy()
+        expected = Board(6, 7, 4)
+        expected.load_bytes(board.to_bytes())
+
+        cells = [(row, col) for row in range(6) for col in range(7)]
+        assert [board.get(*cell) for cell in cells] == [expected.get(*cell) for cell in cells]
+        assert [board.would_create_match(*cell) for cell in cells] == \
+            [expected.would_create_match(*cell) for cell in cells]
+        assert board.legal_moves() == expected.legal_moves()
+        assert all(board.swap_creates_match(*move) for move in board.legal_moves())
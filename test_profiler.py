@@ -0,0 +1,52 @@
+import json
+
+from profiler import PHASES, FrameProfiler, RollingStats
+
+
+def test_rolling_stats_keep_the_last_window():
+    stats = RollingStats(window=100)
+    for value in range(1000):
+        stats.add(value)
+
+    summary = stats.summary(scale=2.0)
+    assert summary["count"] == 1000
+    assert summary["max"] == 999 * 2.0
+    assert summary["p50"] == 950 * 2.0
+    assert summary["mean"] == sum(range(900, 1000)) / 100 * 2.0
+    assert RollingStats(10).summary() == {"count": 0}
+
+
+def test_frames_moves_and_states_are_recorded_and_exported(tmp_path):
+    path = tmp_path / "profile.jsonl"
+    profiler = FrameProfiler(export_path=str(path), export_every=4)
+    for frame in range(10):
+        profiler.begin_frame()
+        for phase in PHASES:
+            profiler.lap(phase)
+        profiler.end_frame("idle" if frame < 5 else "falling")
+    profiler.count_wave(3)
+    profiler.count_wave(5)
+    profiler.end_move()
+    profiler.close()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    # Every 4 frames, and the rest when closed
+    assert [line["frames"] for line in lines] == [4, 8, 10]
+    metrics = lines[-1]["metrics"]
+    assert all(metrics[phase]["count"] == 10 for phase in PHASES + ["frame"])
+    assert metrics["state_time.idle"]["count"] == 1
+    assert metrics["cascades_per_move"]["max"] == 2
+    assert metrics["cleared_per_move"]["max"] == 8
+    assert profiler.move_cascades == profiler.move_cleared == 0
+
+
+def test_overlay_lines_cover_the_recorded_metrics():
+    profiler = FrameProfiler(overlay=True, overlay_every=2)
+    assert profiler.overlay_lines() == []
+    profiler.begin_frame()
+    profiler.end_frame("idle")
+    assert not profiler.overlay_due()
+    profiler.begin_frame()
+    profiler.end_frame("idle")
+    assert profiler.overlay_due()
+    assert [line.split(":")[0] for line in profiler.overlay_lines()] == ["frame"] + PHASES
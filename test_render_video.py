@@ -0,0 +1,34 @@
+import io
+import random
+
+from engine import GameEngine
+from render_video import render, split
+from replay import ReplayRecorder
+
+
+def recorded_game(moves: int = 6):
+    engine = GameEngine(6, 6, 5, seed=15)
+    recorder = ReplayRecorder(engine)
+    rng = random.Random(15)
+    while len(recorder.moves) < moves and not engine.game_over:
+        recorder.step(rng.choice(engine.legal_moves()))
+    return recorder.replay()
+
+
+def test_segments_cover_the_moves_in_order():
+    assert split(0, 5, 2) == [(0, 0, 2), (1, 2, 4), (2, 4, 5)]
+    assert split(3, 3, 2) == [(0, 3, 3)]
+
+
+def test_frames_are_the_same_for_any_number_of_workers(tmp_path):
+    replay = recorded_game()
+    outputs = []
+    for workers in (1, 3):
+        stream = io.BytesIO()
+        result = render(replay, stream, "raw", workers=workers, cell_size=12, segment_moves=2)
+        outputs.append(stream.getvalue())
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0]) == result.frames * result.width * result.height * 3
+
+    pngs = render(replay, str(tmp_path / "frames"), "png", workers=2, cell_size=12, start=2, end=4, segment_moves=1)
+    assert len(list((tmp_path / "frames").iterdir())) == pngs.frames > 0
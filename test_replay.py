@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from backends import BACKENDS
+from engine import BoardPool, GameEngine
+from replay import Replay, ReplayMismatch, ReplayRecorder, play, read_replays, write_replays
+from test_engine import MOVES, SEEDS
+
+
+@pytest.mark.parametrize("special_candies", [False, True])
+def test_replay_round_trip_reproduces_the_game(special_candies, tmp_path):
+    replays = []
+    finals = []
+    for seed in SEEDS:
+        engine = GameEngine(8, 8, 6, seed=seed, min_moves=2, special_candies=special_candies)
+        recorder = ReplayRecorder(engine)
+        rng = random.Random(seed)
+        for _ in range(MOVES):
+            if engine.game_over:
+                break
+            recorder.step(rng.choice(engine.legal_moves()))
+        replays.append(recorder.replay())
+        finals.append(engine.board.to_bytes())
+
+    path = tmp_path / "games.rpl"
+    with open(path, "wb") as f:
+        write_replays(f, replays)
+    loaded = list(read_replays(path.read_bytes()))
+    assert loaded == replays
+    for replay, final in zip(loaded, finals):
+        for backend in BACKENDS.values():
+            assert play(replay, backend).board.to_bytes() == final
+
+
+def test_replay_header_keeps_settings():
+    replay = Replay(8, 9, 5, 3, 12345, [((0, 0), (0, 1))], [30], True)
+    assert Replay.from_bytes(replay.to_bytes())[0] == replay
+
+
+def test_pooled_games_record_the_pool_settings():
+    pool = BoardPool(8, 8, 6, size=2, min_moves=4, rng=random.Random(8))
+    engine = GameEngine(8, 8, 6, pool=pool)
+    recorder = ReplayRecorder(engine)
+    rng = random.Random(8)
+    for _ in range(10):
+        recorder.step(rng.choice(engine.legal_moves()))
+
+    replay = recorder.replay()
+    assert replay.min_moves == 4
+    assert play(replay).board.to_bytes() == engine.board.to_bytes()
+
+
+def test_replays_that_went_astray_are_reported():
+    engine = GameEngine(8, 8, 6, seed=9)
+    recorder = ReplayRecorder(engine)
+    recorder.step(engine.legal_moves()[0])
+    replay = recorder.replay()
+
+    with pytest.raises(ReplayMismatch):
+        play(replay._replace(scores=[replay.scores[0] + 10]))
+    with pytest.raises(ValueError):
+        ReplayRecorder(GameEngine(8, 8, 6, rng=random.Random(9)))
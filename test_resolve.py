@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from engine import GameEngine
+from test_engine import MOVES, SEEDS
+
+
+@pytest.mark.parametrize("special_candies", [False, True])
+def test_resolve_matches_step_and_its_waves_rebuild_the_board(special_candies):
+    for seed in SEEDS:
+        stepped = GameEngine(9, 9, 5, seed=seed, special_candies=special_candies)
+        resolved = GameEngine(9, 9, 5, seed=seed, special_candies=special_candies)
+        rng = random.Random(seed)
+        for _ in range(MOVES):
+            if resolved.game_over:
+                break
+            move = rng.choice(resolved.legal_moves())
+            before = resolved.board.copy()
+            resolution = resolved.resolve(move)
+            assert tuple(stepped.step(move)) == tuple(resolution)[:5]
+
+            if resolution.valid:
+                before.swap(*move)
+                for wave in resolution.waves:
+                    before.clear(wave.cleared)
+                    for col, from_row, to_row in wave.falls:
+                        before.grid[to_row][col] = before.grid[from_row][col]
+                        before.grid[from_row][col] = None
+                    for row, col, color in wave.spawns:
+                        before.grid[row][col] = color
+            assert before.to_bytes() == resolved.board.to_bytes() == stepped.board.to_bytes()
+            assert stepped.specials == resolved.specials
+
+
+def test_invalid_resolutions_have_no_waves():
+    engine = GameEngine(8, 8, 6, seed=11)
+    legal = set(engine.legal_moves())
+    move = next(((row, col), (row, col + 1)) for row in range(8) for col in range(7)
+                if ((row, col), (row, col + 1)) not in legal)
+    before = engine.board.to_bytes()
+
+    resolution = engine.resolve(move)
+    assert not resolution.valid and resolution.waves == []
+    assert engine.board.to_bytes() == before
+
+
+def test_the_game_over_check_can_be_left_to_the_caller():
+    for seed in SEEDS:
+        checked = GameEngine(5, 5, 4, seed=seed, track_moves=True)
+        deferred = GameEngine(5, 5, 4, seed=seed, track_moves=True)
+        rng = random.Random(seed)
+        for _ in range(MOVES):
+            if checked.game_over:
+                break
+            move = rng.choice(checked.legal_moves())
+            expected = checked.resolve(move)
+            resolution = deferred.resolve(move, detect_game_over=False)
+            assert not deferred.game_over
+            assert resolution._replace(game_over=deferred.check_game_over()) == expected
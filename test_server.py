@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from engine import Board, GameEngine
+from server import LINE_LIMIT, GameServer
+
+
+async def exchange(server: GameServer, requests):
+    """Send request lines to a running server on one connection and return the replies by id"""
+    listener = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0, limit=LINE_LIMIT)
+    port = listener.sockets[0].getsockname()[1]
+    async with listener:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=LINE_LIMIT)
+        replies = []
+        for request in requests:
+            line = request if isinstance(request, bytes) else json.dumps(request).encode()
+            writer.write(line + b"\n")
+            await writer.drain()
+            # A request left without a reply fails the test instead of hanging it
+            replies.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+        writer.close()
+        await writer.wait_closed()
+    return replies
+
+
+def talk(requests, server=None):
+    return asyncio.run(exchange(server if server is not None else GameServer(), requests))
+
+
+def test_a_client_copy_of_the_board_stays_in_step():
+    # The moves of the game the server will host, played out locally first
+    local = GameEngine(7, 9, 5, seed=12, special_candies=True)
+    start = local.board.to_bytes()
+    moves = []
+    while not local.game_over and len(moves) < 10:
+        moves.append(local.legal_moves()[0])
+        local.step(moves[-1])
+
+    server = GameServer()
+    replies = talk([{"op": "new", "id": "new", "rows": 7, "cols": 9, "colors": 5, "seed": 12, "specials": True}]
+                   + [{"op": "swap", "id": index, "session": 0, "move": move} for index, move in enumerate(moves)]
+                   + [{"op": "state", "session": 0}], server)
+    first, swaps, state = replies[0], replies[1:-1], replies[-1]
+    assert (first["id"], first["session"], first["seed"]) == ("new", 0, 12)
+    assert bytes.fromhex(first["board"]) == start
+
+    # A client keeps its own copy of the board from the waves alone
+    board = Board(7, 9, 5)
+    board.load_bytes(start)
+    for index, (reply, move) in enumerate(zip(swaps, moves)):
+        assert reply["id"] == index and reply["valid"]
+        board.swap(*move)
+        for cleared, score, falls, spawns, specials in reply["waves"]:
+            board.clear([tuple(cell) for cell in cleared])
+            for col, from_row, to_row in falls:
+                board.grid[to_row][col], board.grid[from_row][col] = board.grid[from_row][col], None
+            for row, col, color in spawns:
+                board.grid[row][col] = color
+
+    assert bytes.fromhex(state["board"]) == board.to_bytes() == local.board.to_bytes()
+    assert state["score"] == local.score
+    assert state["specials"] == [[row, col, kind] for (row, col), kind in sorted(local.specials.items())]
+    # Sessions end with their connection
+    assert server.sessions == {}
+
+
+def test_bad_requests_get_one_error_reply_each():
+    requests = [
+        b"not json",
+        b"[1, 2]",
+        {"op": "fly", "id": 1},
+        {"op": "state", "id": 2, "session": 99},
+        {"op": "new", "id": 3, "rows": 0},
+        {"op": "new", "id": 4, "colors": 2},
+        {"op": "new", "id": 5, "backend": "abacus"},
+        {"op": "new", "id": 6, "rows": "many"},
+        b'{"op": "new", "id": 7, "rows": 1e400}',
+        b'{"op": "new", "id": 8, "seed": -1e400}',
+        {"op": "new", "id": 9, "seed": 1},
+        {"op": "swap", "id": 10, "session": 0, "move": [[0, 0]]},
+        {"op": "swap", "id": 11, "session": 0, "move": [[0, 0], [0, 8]]},
+        {"op": "swap", "id": 12, "session": 0, "move": [[0, 0], [2, 2]]},
+        b'{"op": "swap", "id": 13, "session": 0, "move": [[0, 1e400], [0, 1]]}',
+        {"op": "close", "id": 14, "session": 0},
+        {"op": "state", "id": 15, "session": 0},
+    ]
+    replies = talk(requests)
+
+    assert [reply["id"] for reply in replies] == [None, None] + list(range(1, 16))
+    assert [("error" in reply) for reply in replies] == [True] * 10 + [False] + [True] * 4 + [False, True]
+
+
+def test_unexpected_failures_still_get_a_reply(monkeypatch):
+    def fail(engine, move):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(GameEngine, "resolve", fail)
+    replies = talk([{"op": "new", "id": 1}, {"op": "swap", "id": 2, "session": 0, "move": [[0, 0], [0, 1]]},
+                    {"op": "state", "id": 3, "session": 0}])
+
+    assert [reply["id"] for reply in replies] == [1, 2, 3]
+    assert "RuntimeError" in replies[1]["error"]
+    assert "error" not in replies[2]
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from backends import BACKENDS
+from engine import EMPTY_BYTE, GameEngine
+from snapshot import SnapshotFile, SnapshotWriter, pack_cells, restore, snapshot, unpack_cells
+from test_engine import SEEDS, play_random
+
+
+@pytest.mark.parametrize("num_colors", [3, 7, 20])
+def test_cells_pack_and_unpack(num_colors):
+    rng = random.Random(num_colors)
+    for size in range(1, 40):
+        data = bytes(EMPTY_BYTE if rng.random() < 0.1 else rng.randrange(num_colors) for _ in range(size))
+        assert unpack_cells(pack_cells(data, num_colors), size, num_colors) == data
+
+
+@pytest.mark.parametrize("special_candies", [False, True])
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_snapshot_round_trip_continues_the_same_game(backend, special_candies):
+    for seed in SEEDS:
+        original = GameEngine(8, 8, 6, backend=BACKENDS[backend], seed=seed, special_candies=special_candies)
+        play_random(original, random.Random(seed), moves=10)
+        restored = GameEngine(8, 8, 6, seed=0, special_candies=special_candies)
+        restore(restored, snapshot(original, include_rng=True))
+
+        assert restored.board.to_bytes() == original.board.to_bytes()
+        assert (restored.score, restored.game_over, restored.specials) == \
+               (original.score, original.game_over, original.specials)
+        rng = random.Random(seed)
+        assert play_random(restored, rng) == play_random(original, random.Random(seed))
+
+
+def test_snapshot_file_restores_every_position(tmp_path):
+    path = str(tmp_path / "positions.bin")
+    games = []
+    with SnapshotWriter(path, 8, 8, 6) as writer:
+        for seed in SEEDS:
+            engine = GameEngine(8, 8, 6, seed=seed)
+            play_random(engine, random.Random(seed), moves=5)
+            writer.append(engine)
+            games.append(engine)
+
+    with SnapshotFile(path) as snapshots:
+        assert len(snapshots) == len(games)
+        for index, original in enumerate(games):
+            engine = GameEngine(8, 8, 6, seed=0)
+            snapshots.restore(engine, index)
+            assert engine.board.to_bytes() == original.board.to_bytes()
+            assert engine.score == original.score
+
+
+def test_snapshots_only_restore_into_boards_of_their_shape():
+    data = snapshot(GameEngine(8, 8, 6, seed=1))
+    for shape in [(8, 9, 6), (9, 8, 6), (8, 8, 5)]:
+        with pytest.raises(ValueError):
+            restore(GameEngine(*shape, seed=1), data)
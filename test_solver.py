@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from backends import BACKENDS
+from engine import GameEngine
+from solver import Solver
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_best_move_is_deterministic_and_leaves_the_game_alone(backend):
+    for seed in range(4):
+        engine = GameEngine(8, 8, 6, backend=BACKENDS[backend], seed=seed, special_candies=True)
+        before = engine.board.to_bytes()
+        moves = [Solver(8, 8, 6).best_move(engine, max_depth=2) for _ in range(2)]
+        list_engine = GameEngine(8, 8, 6, seed=seed, special_candies=True)
+
+        assert moves[0] == moves[1] == Solver(8, 8, 6).best_move(list_engine, max_depth=2)
+        assert moves[0] in engine.legal_moves()
+        assert engine.board.to_bytes() == before
+
+
+def hint_times(engine: GameEngine, budget: float, tries: int = 3):
+    """Seconds taken by best_move under a time budget, sorted, with the moves it returned"""
+    times = []
+    moves = set()
+    for _ in range(tries):
+        solver = Solver(engine.rows, engine.cols, engine.board.num_colors)
+        start = time.perf_counter()
+        moves.add(solver.best_move(engine, max_depth=3, time_budget=budget))
+        times.append(time.perf_counter() - start)
+    return sorted(times), moves
+
+
+@pytest.mark.parametrize("special_candies", [False, True])
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_best_move_keeps_to_its_time_budget(backend, special_candies):
+    budget = 0.012
+    engine = GameEngine(64, 64, 6, backend=BACKENDS[backend], seed=1, track_moves=True,
+                        special_candies=special_candies)
+    times, moves = hint_times(engine, budget)
+
+    assert moves <= set(engine.legal_moves())
+    # One outcome may still be running when the deadline passes, and the
+    # median leaves out a scheduler hiccup
+    assert times[1] < budget * 1.5
+
+
+def test_best_move_keeps_to_its_time_budget_on_huge_boards():
+    budget = 0.012
+    engine = GameEngine(256, 256, 6, backend=BACKENDS["bitboard"], seed=1)
+    times, moves = hint_times(engine, budget)
+
+    assert moves <= set(engine.legal_moves())
+    assert times[1] < budget * 1.5
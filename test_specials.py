@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from backends import BACKENDS
+from engine import (COLOR_BOMB, POINTS_PER_CANDY, SPECIAL_BONUS, STRIPED_COL, STRIPED_ROW, WRAPPED, Board,
+                    GameEngine, SpecialCandy)
+from test_engine import SEEDS, play_random, random_board
+
+# A new color for the match under test, on a background that has no runs
+MATCH = 6
+
+
+def board_with(cells) -> Board:
+    """7x7 board without runs, except where cells puts the match color"""
+    board = Board(7, 7, 7)
+    board.grid = [[(row + 2 * col) % 6 for col in range(7)] for row in range(7)]
+    for row, col in cells:
+        board.grid[row][col] = MATCH
+    return board
+
+
+@pytest.mark.parametrize("backend", ["numpy", "bitboard"])
+def test_backends_find_the_same_runs(backend):
+    rng = random.Random(1)
+    for _ in range(200):
+        rows, cols = rng.randint(1, 10), rng.randint(1, 10)
+        board = random_board(rng, rows, cols, rng.randint(3, 5))
+        other = BACKENDS[backend](rows, cols, board.num_colors)
+        other.load_bytes(board.to_bytes())
+
+        assert sorted(other.find_runs()) == sorted(board.find_runs())
+
+
+@pytest.mark.parametrize("backend", ["numpy", "bitboard"])
+def test_backends_play_identical_games_with_special_candies(backend):
+    for seed in SEEDS:
+        games = [GameEngine(9, 9, 5, backend=BACKENDS[name], seed=seed, special_candies=True)
+                 for name in ("list", backend)]
+        results = [play_random(engine, random.Random(seed)) for engine in games]
+        assert results[0] == results[1]
+        assert games[0].board.to_bytes() == games[1].board.to_bytes()
+        assert games[0].specials == games[1].specials
+
+
+@pytest.mark.parametrize("cells, kind", [
+    ([(3, 1), (3, 3)], 0),
+    ([(3, 0), (3, 1), (3, 3)], STRIPED_COL),
+    ([(4, 2), (5, 2), (6, 2)], STRIPED_ROW),
+    ([(3, 0), (3, 1), (3, 3), (3, 4)], COLOR_BOMB),
+    ([(3, 0), (3, 1), (4, 2), (5, 2)], WRAPPED),
+])
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_the_swap_makes_a_special_candy_where_it_moved(backend, cells, kind):
+    # Moving the match color from (2, 2) down to (3, 2) completes the match
+    board = board_with(cells + [(2, 2)])
+    other = BACKENDS[backend](7, 7, 7)
+    other.load_bytes(board.to_bytes())
+    engine = GameEngine(board=other, seed=13, special_candies=True)
+
+    first = engine.resolve(((2, 2), (3, 2))).waves[0]
+    if kind:
+        # The special candy takes the place of one matched candy
+        assert first.specials == [SpecialCandy(3, 2, kind)]
+        assert first.score == len(cells) * POINTS_PER_CANDY + SPECIAL_BONUS[kind]
+        assert (3, 2) not in first.cleared
+    else:
+        assert first.specials == []
+        assert first.score == 3 * POINTS_PER_CANDY
+
+
+def test_special_candies_set_each_other_off_in_one_wave():
+    board = board_with([(3, 0), (3, 1), (2, 2)])
+    engine = GameEngine(board=board, seed=14, special_candies=True)
+    # A striped candy in the run reaches a wrapped candy at the bottom of its column
+    engine.specials = {(3, 1): STRIPED_COL, (6, 1): WRAPPED}
+
+    first = engine.resolve(((2, 2), (3, 2))).waves[0]
+    cleared = set(first.cleared)
+    assert cleared == ({(row, 1) for row in range(7)} | {(3, 0), (3, 2)}
+                       | {(row, col) for row in (5, 6) for col in (0, 1, 2)})
+    assert first.score == len(cleared) * POINTS_PER_CANDY
@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+import tournament
+
+
+@pytest.mark.parametrize("output_format", ["jsonl", "csv"])
+def test_results_do_not_depend_on_the_worker_count(tmp_path, capsys, output_format):
+    outputs = []
+    for workers in (1, 3):
+        output = tmp_path / f"results-{workers}.{output_format}"
+        summary = tmp_path / f"summary-{workers}.json"
+        tournament.main(["--strategies", "random", "greedy", "--games", "6", "--seed", "7",
+                         "--max-moves", "25", "--workers", str(workers),
+                         "--output", str(output), "--summary", str(summary)])
+        summary_data = json.loads(summary.read_text())
+        outputs.append((output.read_bytes(), summary_data["strategies"]))
+    capsys.readouterr()
+
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0][0].splitlines()) == 12 + (output_format == "csv")
@@ -0,0 +1,177 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import random
+import statistics
+import sys
+from typing import Dict, List, Optional
+
+from backends import BACKENDS
+from engine import GRID_SIZE, NUM_COLORS, GameEngine
+from strategies import STRATEGIES, load_strategy
+
+RESULT_FIELDS = ["strategy", "game", "score", "moves", "game_over", "cleared", "cascades", "max_cascade"]
+
+# Per-process state, set up once by init_worker and reused for every game
+_config: Dict = {}
+_engine: Optional[GameEngine] = None
+_strategies: Dict = {}
+
+
+def init_worker(config: Dict):
+    """Store the tournament settings in a worker process"""
+    global _config, _engine
+    _config = config
+    _engine = None
+    _strategies.clear()
+
+
+def game_rng(seed: int, *parts) -> random.Random:
+    """Random generator derived from the tournament seed, the same in every process"""
+    return random.Random(":".join(str(part) for part in (seed, *parts)))
+
+
+def play_game(task) -> Dict:
+    """Play one seeded game with one strategy and return its statistics"""
+    global _engine
+    strategy_name, game = task
+    seed = _config["seed"]
+
+    # Reuse the worker's engine and board; only the rng and the board contents change
+    if _engine is None:
+        _engine = GameEngine(_config["rows"], _config["cols"], _config["colors"],
+                             rng=game_rng(seed), backend=BACKENDS[_config["backend"]])
+    engine = _engine
+    engine.rng = game_rng(seed, "board", game)
+    engine.reset()
+
+    strategy = _strategies.get(strategy_name)
+    if strategy is None:
+        strategy = _strategies[strategy_name] = load_strategy(strategy_name)
+    # Every strategy sees the same boards for a given game, but draws its own choices
+    rng = game_rng(seed, strategy_name, game)
+
+    moves = 0
+    cleared = 0
+    cascades = 0
+    max_cascade = 0
+    while not engine.game_over and moves < _config["max_moves"]:
+        move = strategy(engine, rng)
+        if move is None:
+            break
+        result = engine.step(move)
+        if not result.valid:
+            break
+        moves += 1
+        cleared += result.cleared
+        cascades += result.cascades
+        max_cascade = max(max_cascade, result.cascades)
+
+    return {
+        "strategy": strategy_name,
+        "game": game,
+        "score": engine.score,
+        "moves": moves,
+        "game_over": engine.game_over,
+        "cleared": cleared,
+        "cascades": cascades,
+        "max_cascade": max_cascade,
+    }
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    index = min(len(values) - 1, max(0, round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Score distribution, game length and cascade statistics for one strategy"""
+    scores = sorted(result["score"] for result in results)
+    moves = [result["moves"] for result in results]
+    total_moves = sum(moves)
+    return {
+        "games": len(results),
+        "score_mean": statistics.mean(scores),
+        "score_stdev": statistics.pstdev(scores),
+        "score_min": scores[0],
+        "score_p10": percentile(scores, 0.1),
+        "score_p50": percentile(scores, 0.5),
+        "score_p90": percentile(scores, 0.9),
+        "score_max": scores[-1],
+        "moves_mean": statistics.mean(moves),
+        "game_over_rate": sum(result["game_over"] for result in results) / len(results),
+        "cleared_per_move": sum(result["cleared"] for result in results) / max(1, total_moves),
+        "cascades_per_move": sum(result["cascades"] for result in results) / max(1, total_moves),
+        "max_cascade": max(result["max_cascade"] for result in results),
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Play seeded games with bot strategies across a process pool")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES),
+                        help="built-in strategy names or module:function (default: all built-ins)")
+    parser.add_argument("--games", type=int, default=100, help="games per strategy")
+    parser.add_argument("--seed", type=int, default=0, help="tournament seed; the same seed reproduces every game")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="worker processes")
+    parser.add_argument("--max-moves", type=int, default=1000, help="stop a game after this many moves")
+    parser.add_argument("--rows", type=int, default=GRID_SIZE)
+    parser.add_argument("--cols", type=int, default=GRID_SIZE)
+    parser.add_argument("--colors", type=int, default=NUM_COLORS, help="number of candy colors")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="list")
+    parser.add_argument("--output", default="tournament.jsonl", help="per-game results, streamed as they finish")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="output format (default: from the file extension)")
+    parser.add_argument("--summary", help="also write the per-strategy summary to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for name in args.strategies:
+        load_strategy(name)
+
+    config = {
+        "seed": args.seed,
+        "rows": args.rows,
+        "cols": args.cols,
+        "colors": args.colors,
+        "backend": args.backend,
+        "max_moves": args.max_moves,
+    }
+    tasks = [(name, game) for name in args.strategies for game in range(args.games)]
+    output_format = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+
+    results: Dict[str, List[Dict]] = {name: [] for name in args.strategies}
+    with open(args.output, "w", newline="") as output, \
+            multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(config,)) as pool:
+        writer = None
+        if output_format == "csv":
+            writer = csv.DictWriter(output, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+
+        # imap keeps task order, so the output file is identical from run to run
+        chunksize = max(1, len(tasks) // (args.workers * 8))
+        for result in pool.imap(play_game, tasks, chunksize=chunksize):
+            if writer is not None:
+                writer.writerow(result)
+            else:
+                output.write(json.dumps(result) + "\n")
+            output.flush()
+            results[result["strategy"]].append(result)
+
+    summary = {name: summarize(games) for name, games in results.items() if games}
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({"config": config, "strategies": summary}, f, indent=2)
+
+    for name, stats in summary.items():
+        print(f"{name:>12}: score {stats['score_mean']:.1f} +/- {stats['score_stdev']:.1f} "
+              f"(p10 {stats['score_p10']}, p50 {stats['score_p50']}, p90 {stats['score_p90']}), "
+              f"{stats['moves_mean']:.1f} moves, {stats['cascades_per_move']:.2f} cascades/move, "
+              f"max cascade {stats['max_cascade']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())